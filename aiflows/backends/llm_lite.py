@@ -1,8 +1,8 @@
-from litellm import completion, embedding
+import os
+from litellm import completion, embedding, acompletion, aembedding
 from typing import Any, List, Dict, Iterable, Union, Optional, Tuple
-import time
 from aiflows.backends.api_info import ApiInfo
-import multiprocessing
+from aiflows.backends.rate_limiter import RateLimiter, get_rate_limiter
 
 
 def merge_delta_to_stream(merged_stream, delta):
@@ -58,23 +58,34 @@ class LiteLLMBackend:
     """This class is a wrapper around the litellm library. It allows to use multiple API keys and to switch between them
     automatically when one is exhausted.
 
+    The calls are rate limited per API key with token buckets: each key has a requests-per-minute budget and optionally
+    a tokens-per-minute budget. Every call is sent with the key that can serve it the soonest, and calls waiting for
+    a key are served in the order in which they arrived.
+
     :param api_infos: A list of ApiInfo objects, each containing the information about one API key
     :type api_infos: List[ApiInfo]
     :param model_name: The name of the model to use. Can be a string or a dictionary from API to model name
     :type model_name: Union[str, Dict[str, str]]
-    :param wait_time_per_key: The minimum time to wait between two calls on the same API key
+    :param wait_time_per_key: The minimum time to wait between two calls on the same API key (used if requests_per_minute is not provided)
     :type wait_time_per_key: int
+    :param requests_per_minute: The number of calls allowed per minute on each API key
+    :type requests_per_minute: float, optional
+    :param tokens_per_minute: The number of tokens allowed per minute on each API key (None for no limit)
+    :type tokens_per_minute: float, optional
+    :param burst_requests: The number of calls that can be sent at once on each API key
+    :type burst_requests: float, optional
+    :param burst_tokens: The number of tokens that can be sent at once on each API key (defaults to tokens_per_minute)
+    :type burst_tokens: float, optional
+    :param rate_limit_state_dir: A directory where the rate limiting state is stored, to share the budgets of the API keys between
+        all the processes of a node using the same directory. Defaults to the FLOW_RATE_LIMIT_DIR environment variable.
+        If None, the budgets are only shared between the threads of the process.
+    :type rate_limit_state_dir: str, optional
     :param embeddings_call: Whether to use the embedding API or the completion API
     :type embeddings_call: bool
     :param kwargs: Additional parameters to pass to the litellm library
     :type kwargs: Any
     """
 
-    # last call time per key must be shared between all instances of the class (mulitple threads and objects can share the same apis keys)
-    __last_call_per_key: Dict[str, float] = {}
-    # ensure that the last call time per key is not modified or read by multiple threads of objects at the same time
-    __read_write_lock: multiprocessing.Lock = multiprocessing.Lock()
-
     def __init__(self, api_infos, model_name, **kwargs):
         """Constructor method"""
         self.model_name = model_name
@@ -89,23 +100,37 @@ class LiteLLMBackend:
             if "embeddings_call" in self.params
             else self.params.get("embeddings_call", False)
         )
+        # by default, one call every wait_time_per_key seconds is allowed on each key
+        requests_per_minute = self.params.pop("requests_per_minute", None)
+        if requests_per_minute is None:
+            requests_per_minute = 60.0 / self.__waittime_per_key if self.__waittime_per_key > 0 else float("inf")
+        self.tokens_per_minute = self.params.pop("tokens_per_minute", None)
+        burst_requests = self.params.pop("burst_requests", 1)
+        burst_tokens = self.params.pop("burst_tokens", None)
+        rate_limit_state_dir = self.params.pop("rate_limit_state_dir", os.getenv("FLOW_RATE_LIMIT_DIR", None))
+
+        # the rate limiter is shared between all instances of the class (mulitple threads and objects can share the same apis keys)
+        # and, if a state directory is provided, between all processes using that directory
+        self.__rate_limiter: RateLimiter = get_rate_limiter(rate_limit_state_dir)
 
         api_infos = api_infos if isinstance(api_infos, list) else [api_infos]
         api_infos = [info if isinstance(info, ApiInfo) else ApiInfo(**info) for info in api_infos]
         LiteLLMBackend._api_information_sanity_check(api_infos)
 
-        # the last_call_per_key of each api key of the instantiated object
-        object_last_call_per_key = {
-            LiteLLMBackend.make_unique_api_info_key(api_info): time.time() - self.__waittime_per_key
-            for api_info in api_infos
-        }
-        # Update the last_call_per_key of the class with the last_call_per_key of the instantiated object (updates only the keys that are not already in the class variable)
-        LiteLLMBackend._prioritized_merge_last_call_per_key(object_last_call_per_key)
-
         # A dictorary containing the api info of the object (key is the backend_used + api_key) value is the api_info object
         # e.g {"openai-1234": ApiInfo(backend_used="openai", api_key="1234", api_base="https://api.openai.com", api_version="v1")}
         self.api_infos = {LiteLLMBackend.make_unique_api_info_key(api_info): api_info for api_info in api_infos}
 
+        # Register the budgets of the keys of the object (the budgets of the keys that are already registered are kept)
+        for api_info_key in self.api_infos:
+            self.__rate_limiter.register_key(
+                api_info_key,
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=self.tokens_per_minute,
+                burst_requests=burst_requests,
+                burst_tokens=burst_tokens,
+            )
+
     @staticmethod
     def make_unique_api_info_key(api_info: ApiInfo):
         """Makes a unique key for the api_info object
@@ -117,44 +142,6 @@ class LiteLLMBackend:
         """
         return str(api_info.backend_used + api_info.api_key)
 
-    @classmethod
-    def _prioritized_merge_last_call_per_key(cls, dict2):
-        """Updates the last_call_per_key of the class with the last_call_per_key of the instantiated object (updates only the keys that are not already in the class variable)
-
-        :param dict2: The last_call_per_key of the instantiated object
-        :type dict2: Dict[str, float]
-        """
-        # Ensures read and write are not done at the same time
-        with cls.__read_write_lock:
-            LiteLLMBackend.__last_call_per_key = {**dict2, **LiteLLMBackend.__last_call_per_key}
-
-    @classmethod
-    def _get_last_call_per_key(cls, keys: Iterable[str] = None):
-        """Gets the last_call_per_key of the class variable. If keys is None, returns the whole dictionary, otherwise returns the values of the keys in the list keys
-
-        :param keys: The keys to return the values of, defaults to None
-        :type keys: List[str], optional
-        :return: The last_call_per_key of the class variable (or the values of the keys in the list keys)
-        :rtype: Dict[str, float]
-        """
-        # Ensures read and write are not done at the same time
-        with cls.__read_write_lock:
-            if keys is None:
-                return cls.__last_call_per_key
-            else:
-                return {key: value for key, value in cls.__last_call_per_key.items() if key in keys}
-
-    @classmethod
-    def _update_time_last_call_per_key(cls, key: str):
-        """Updates the time of last_call_per_key of the class variable for the provided key
-
-        :param key: The key to update the last_call_per_key of
-        :type key: str
-        """
-        # Ensures read and write are not done at the same time
-        with cls.__read_write_lock:
-            cls.__last_call_per_key.update({key: time.time()})
-
     @staticmethod
     def _api_information_sanity_check(api_information: List[ApiInfo]):
         """Sanity check for the api information. It checks that it is not None
@@ -164,31 +151,126 @@ class LiteLLMBackend:
         """
         assert api_information is not None, "Must provide api information!"
 
-    def _choose_next_api_key(self) -> int:
-        """Chooses the next API key to use. It chooses the one that has been used the least recently.
+    def _estimate_num_tokens(self, **kwargs) -> int:
+        """Estimates the number of tokens of a call (roughly 4 characters per token for the prompt, plus the maximum number of generated tokens).
+        It is only used if a tokens-per-minute budget is set, and corrected with the actual usage once the call returns.
 
-        :return: The index of the next API key to use
+        :param kwargs: The parameters of the call
+        :type kwargs: Any
+        :return: The estimated number of tokens
         :rtype: int
         """
-        # Gets the last call per key of the object (but only for the apikeys that are in the class variable)
-        object_last_call_per_key = LiteLLMBackend._get_last_call_per_key(keys=self.api_infos.keys())
+        if self.tokens_per_minute is None:
+            return 0
+
+        merged_params = {**self.params, **kwargs}
+        if self.embeddings_call:
+            num_chars = len(str(merged_params.get("input", "")))
+            return num_chars // 4
+
+        num_chars = sum(len(str(message.get("content", ""))) for message in merged_params.get("messages", []))
+        max_tokens = merged_params.get("max_tokens", None) or 0
+        return num_chars // 4 + max_tokens * merged_params.get("n", 1)
+
+    @staticmethod
+    def _get_total_tokens(response) -> Optional[int]:
+        """Returns the total number of tokens used by a call, if the response reports it.
+
+        :param response: The response from the litellm library
+        :type response: Any
+        :return: The total number of tokens used by the call
+        :rtype: Optional[int]
+        """
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        if isinstance(usage, dict):
+            return usage.get("total_tokens", None)
+        return getattr(usage, "total_tokens", None)
+
+    def _choose_next_api_key(self, num_tokens: int = 0) -> str:
+        """Chooses the next API key to use. It reserves the key that can serve the call the soonest and waits until the call can be sent.
+
+        :param num_tokens: The estimated number of tokens of the call
+        :type num_tokens: int, optional
+        :return: The unique key of the next API key to use
+        :rtype: str
+        """
+        return self.__rate_limiter.acquire(self.api_infos.keys(), num_tokens=num_tokens)
+
+    async def _achoose_next_api_key(self, num_tokens: int = 0) -> str:
+        """Asynchronous counterpart of `_choose_next_api_key`. It waits without blocking the event loop.
+
+        :param num_tokens: The estimated number of tokens of the call
+        :type num_tokens: int, optional
+        :return: The unique key of the next API key to use
+        :rtype: str
+        """
+        return await self.__rate_limiter.aacquire(self.api_infos.keys(), num_tokens=num_tokens)
+
+    def _report_usage(self, api_key_idx: str, estimated_num_tokens: int, response):
+        """Corrects the tokens-per-minute budget of the API key with the actual usage of the call.
+
+        :param api_key_idx: The unique key of the API key used for the call
+        :type api_key_idx: str
+        :param estimated_num_tokens: The estimated number of tokens of the call
+        :type estimated_num_tokens: int
+        :param response: The response from the litellm library
+        :type response: Any
+        """
+        if self.tokens_per_minute is None:
+            return
+
+        total_tokens = self._get_total_tokens(response)
+        if total_tokens is not None:
+            self.__rate_limiter.report_usage(api_key_idx, estimated_num_tokens, total_tokens)
+
+    def _request(self, **kwargs):
+        """Sends the request to the litellm library with the given parameters and returns the raw response.
+
+        :param kwargs: The parameters to pass to the litellm library
+        :type kwargs: Any
+        :return: The raw response from the litellm library
+        :rtype: Any
+        """
+        merged_params = {**self.params, **kwargs}
+        if self.embeddings_call:
+            return embedding(**merged_params)
+        return completion(**merged_params)
 
-        # Retrieve key of api key that was used the least recently
-        api_key_idx = min(object_last_call_per_key, key=object_last_call_per_key.get)
-        # Check how long ago the api key was used
-        last_call_on_key = time.time() - object_last_call_per_key[api_key_idx]
+    async def _arequest(self, **kwargs):
+        """Asynchronous counterpart of `_request`. Streamed responses are fully consumed.
 
-        # Check if we need to wait
-        good_to_go = last_call_on_key > self.__waittime_per_key
+        :param kwargs: The parameters to pass to the litellm library
+        :type kwargs: Any
+        :return: The raw response from the litellm library
+        :rtype: Any
+        """
+        merged_params = {**self.params, **kwargs}
+        if self.embeddings_call:
+            return await aembedding(**merged_params)
+
+        response = await acompletion(**merged_params)
+        if merged_params.get("stream", None):
+            response = [chunk async for chunk in response]
+        return response
 
-        # If we need to wait, wait until we do
-        if not good_to_go:
-            time.sleep(self.__waittime_per_key - last_call_on_key)
-            return self._choose_next_api_key()
+    def _parse_response(self, response, **kwargs) -> List[str]:
+        """Extracts the messages from the raw response of the litellm library.
 
-        # Update the last call time
-        LiteLLMBackend._update_time_last_call_per_key(api_key_idx)
-        return api_key_idx
+        :param response: The raw response from the litellm library
+        :type response: Any
+        :param kwargs: The parameters passed to the litellm library
+        :type kwargs: Any
+        :return: The messages of the response
+        :rtype: List[str]
+        """
+        merged_params = {**self.params, **kwargs}
+        if self.embeddings_call:
+            return response.data
+        if merged_params.get("stream", None):
+            return merge_streams(response, n_chat_completion_choices=kwargs.get("n", 1))
+        return [choice["message"] for choice in response["choices"]]
 
     def _call(self, **kwargs) -> List[str]:
         """
@@ -199,18 +281,7 @@ class LiteLLMBackend:
         :return: The response from the litellm library
         :rtype: List[str]
         """
-
-        merged_params = {**self.params, **kwargs}
-        if self.embeddings_call:
-            response = embedding(**merged_params)
-            messages = response.data
-        else:
-            response = completion(**merged_params)
-            if merged_params.get("stream", None):
-                messages = merge_streams(response, n_chat_completion_choices=kwargs.get("n", 1))
-            else:
-                messages = [choice["message"] for choice in response["choices"]]
-        return messages
+        return self._parse_response(self._request(**kwargs), **kwargs)
 
     def _get_model_and_api_dict(self, api_key_info):
         """Gets the model and api dictionary to pass to the litellm library
@@ -258,11 +329,34 @@ class LiteLLMBackend:
         :return: The response from the litellm library
         :rtype: List[str]
         """
+        estimated_num_tokens = self._estimate_num_tokens(**kwargs)
+        api_key_idx = self._choose_next_api_key(num_tokens=estimated_num_tokens)
+
+        litellm_api_info = self._get_model_and_api_dict(self.api_infos[api_key_idx])
+
+        merged_kwargs = {**kwargs, **litellm_api_info}
+
+        response = self._request(**merged_kwargs)
+        self._report_usage(api_key_idx, estimated_num_tokens, response)
 
-        api_key_info = self.get_key()
+        return self._parse_response(response, **merged_kwargs)
 
-        litellm_api_info = self._get_model_and_api_dict(api_key_info)
+    async def acall(self, **kwargs):
+        """Asynchronous counterpart of `__call__`. The waiting for an API key and the call itself do not block the event loop.
+
+        :param kwargs: The parameters to pass to the litellm library
+        :type kwargs: Any
+        :return: The response from the litellm library
+        :rtype: List[str]
+        """
+        estimated_num_tokens = self._estimate_num_tokens(**kwargs)
+        api_key_idx = await self._achoose_next_api_key(num_tokens=estimated_num_tokens)
+
+        litellm_api_info = self._get_model_and_api_dict(self.api_infos[api_key_idx])
 
         merged_kwargs = {**kwargs, **litellm_api_info}
 
-        return self._call(**merged_kwargs)
+        response = await self._arequest(**merged_kwargs)
+        self._report_usage(api_key_idx, estimated_num_tokens, response)
+
+        return self._parse_response(response, **merged_kwargs)
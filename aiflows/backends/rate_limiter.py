@@ -0,0 +1,288 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+from diskcache import Cache
+
+
+class TokenBucket:
+    """A token bucket that refills continuously at a fixed rate up to its capacity.
+
+    Requests reserve their tokens upfront: the level of the bucket can become negative, in which case the request must
+    wait until the bucket has refilled the debt. Since every request gets a fixed slot when it makes its reservation,
+    the requests are served in the order in which they made their reservation (FIFO).
+
+    :param rate_per_minute: The number of tokens added to the bucket per minute
+    :type rate_per_minute: float
+    :param capacity: The maximum number of tokens in the bucket (i.e. the burst capacity)
+    :type capacity: float
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float):
+        assert rate_per_minute > 0, "The rate of a token bucket must be greater than 0."
+        assert capacity > 0, "The capacity of a token bucket must be greater than 0."
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.level = capacity
+        self.last_refill = None
+
+    def _refill(self, now: float):
+        """Adds the tokens accumulated since the last refill.
+
+        :param now: The current (monotonic) time
+        :type now: float
+        """
+        if self.last_refill is None or self.rate_per_second == float("inf"):
+            # ~~~ first use of the bucket or unlimited rate ~~~
+            self.level = self.capacity
+        else:
+            self.level = min(self.capacity, self.level + (now - self.last_refill) * self.rate_per_second)
+        self.last_refill = now
+
+    def get_wait_time(self, num_tokens: float, now: float) -> float:
+        """Returns the time to wait before `num_tokens` tokens are available, without reserving them.
+
+        :param num_tokens: The number of tokens
+        :type num_tokens: float
+        :param now: The current (monotonic) time
+        :type now: float
+        :return: The time to wait in seconds
+        :rtype: float
+        """
+        self._refill(now)
+        return max(0.0, (num_tokens - self.level) / self.rate_per_second)
+
+    def reserve(self, num_tokens: float, now: float) -> float:
+        """Reserves `num_tokens` tokens and returns the time to wait before they can be used.
+
+        :param num_tokens: The number of tokens to reserve
+        :type num_tokens: float
+        :param now: The current (monotonic) time
+        :type now: float
+        :return: The time to wait in seconds
+        :rtype: float
+        """
+        wait_time = self.get_wait_time(num_tokens, now)
+        self.level -= num_tokens
+        return wait_time
+
+    def refund(self, num_tokens: float):
+        """Gives back tokens to the bucket (a negative number of tokens debits the bucket).
+
+        :param num_tokens: The number of tokens to give back
+        :type num_tokens: float
+        """
+        self.level = min(self.capacity, self.level + num_tokens)
+
+    def get_state(self) -> Tuple[float, Optional[float]]:
+        """Returns the state of the bucket (its level and the time of the last refill).
+
+        :return: The state of the bucket
+        :rtype: Tuple[float, Optional[float]]
+        """
+        return self.level, self.last_refill
+
+    def set_state(self, state: Tuple[float, Optional[float]]):
+        """Sets the state of the bucket (its level and the time of the last refill).
+
+        :param state: The state of the bucket
+        :type state: Tuple[float, Optional[float]]
+        """
+        self.level, self.last_refill = state
+
+
+class RateLimiter:
+    """A rate limiter enforcing a requests-per-minute and, optionally, a tokens-per-minute budget per key.
+    When a request can be served by multiple keys, the key that can serve it the soonest is reserved.
+    Waiting is done outside of the lock, with `time.sleep` (`acquire`) or `asyncio.sleep` (`aacquire`).
+    """
+
+    def __init__(self):
+        self._request_buckets: Dict[str, TokenBucket] = {}
+        self._token_buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _now(self) -> float:
+        """Returns the current time used to refill the buckets."""
+        return time.monotonic()
+
+    @contextmanager
+    def _locked(self, keys: Iterable[str]):
+        """Context manager giving exclusive access to the buckets of the given keys."""
+        with self._lock:
+            yield
+
+    def register_key(
+        self,
+        key: str,
+        requests_per_minute: float,
+        tokens_per_minute: Optional[float] = None,
+        burst_requests: float = 1,
+        burst_tokens: Optional[float] = None,
+    ):
+        """Registers the budgets of a key. If the key is already registered, its budgets are kept.
+
+        :param key: The key
+        :type key: str
+        :param requests_per_minute: The number of requests allowed per minute
+        :type requests_per_minute: float
+        :param tokens_per_minute: The number of tokens allowed per minute (None for no limit)
+        :type tokens_per_minute: float, optional
+        :param burst_requests: The number of requests that can be sent at once
+        :type burst_requests: float, optional
+        :param burst_tokens: The number of tokens that can be sent at once. Defaults to `tokens_per_minute`.
+        :type burst_tokens: float, optional
+        """
+        with self._lock:
+            if key in self._request_buckets:
+                return
+
+            self._request_buckets[key] = TokenBucket(rate_per_minute=requests_per_minute, capacity=burst_requests)
+            if tokens_per_minute is not None:
+                self._token_buckets[key] = TokenBucket(
+                    rate_per_minute=tokens_per_minute,
+                    capacity=tokens_per_minute if burst_tokens is None else burst_tokens,
+                )
+
+    def _get_wait_time(self, key: str, num_tokens: float, now: float) -> float:
+        """Returns the time to wait before a request of `num_tokens` tokens can be sent with the given key."""
+        wait_time = self._request_buckets[key].get_wait_time(1, now)
+        if key in self._token_buckets:
+            wait_time = max(wait_time, self._token_buckets[key].get_wait_time(num_tokens, now))
+        return wait_time
+
+    def reserve(self, keys: Iterable[str], num_tokens: float = 0) -> Tuple[str, float]:
+        """Reserves a request of `num_tokens` tokens on the key that can serve it the soonest.
+
+        :param keys: The candidate keys
+        :type keys: Iterable[str]
+        :param num_tokens: The (estimated) number of tokens of the request
+        :type num_tokens: float, optional
+        :return: The reserved key and the time to wait before sending the request
+        :rtype: Tuple[str, float]
+        """
+        keys = list(keys)
+        with self._locked(keys):
+            now = self._now()
+            key = min(keys, key=lambda k: self._get_wait_time(k, num_tokens, now))
+
+            wait_time = self._request_buckets[key].reserve(1, now)
+            if key in self._token_buckets:
+                wait_time = max(wait_time, self._token_buckets[key].reserve(num_tokens, now))
+
+        return key, wait_time
+
+    def acquire(self, keys: Iterable[str], num_tokens: float = 0) -> str:
+        """Reserves a request on one of the keys and blocks until it can be sent.
+
+        :param keys: The candidate keys
+        :type keys: Iterable[str]
+        :param num_tokens: The (estimated) number of tokens of the request
+        :type num_tokens: float, optional
+        :return: The key to use
+        :rtype: str
+        """
+        key, wait_time = self.reserve(keys, num_tokens)
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return key
+
+    async def aacquire(self, keys: Iterable[str], num_tokens: float = 0) -> str:
+        """Asynchronous counterpart of `acquire`. It waits without blocking the event loop.
+
+        :param keys: The candidate keys
+        :type keys: Iterable[str]
+        :param num_tokens: The (estimated) number of tokens of the request
+        :type num_tokens: float, optional
+        :return: The key to use
+        :rtype: str
+        """
+        key, wait_time = self.reserve(keys, num_tokens)
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+        return key
+
+    def report_usage(self, key: str, estimated_num_tokens: float, num_tokens: float):
+        """Corrects the tokens-per-minute budget of a key once the actual number of tokens of a request is known.
+
+        :param key: The key used for the request
+        :type key: str
+        :param estimated_num_tokens: The number of tokens reserved for the request
+        :type estimated_num_tokens: float
+        :param num_tokens: The actual number of tokens of the request
+        :type num_tokens: float
+        """
+        with self._locked([key]):
+            if key in self._token_buckets:
+                self._token_buckets[key].refund(estimated_num_tokens - num_tokens)
+
+
+class SharedRateLimiter(RateLimiter):
+    """A rate limiter whose bucket states are stored in a diskcache (SQLite) directory, such that all the processes of a node
+    using the same directory share the budgets of the keys. Each reservation reads and writes the bucket states within
+    a single transaction. The keys are hashed before being written to disk.
+
+    :param directory: The directory of the shared state
+    :type directory: str
+    """
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        self._cache = Cache(directory)
+
+    def _now(self) -> float:
+        """Returns the current (wall-clock) time, which is shared between processes."""
+        return time.time()
+
+    @staticmethod
+    def _get_state_key(key: str, bucket_type: str) -> str:
+        """Returns the key under which the state of a bucket is stored."""
+        return f"{bucket_type}-{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+
+    @contextmanager
+    def _locked(self, keys: Iterable[str]):
+        """Context manager giving exclusive access to the buckets of the given keys, across threads and processes.
+        The bucket states are loaded from the shared directory on enter and written back on exit."""
+        with self._lock, self._cache.transact():
+            buckets = [(key, "requests", self._request_buckets[key]) for key in keys]
+            buckets += [(key, "tokens", self._token_buckets[key]) for key in keys if key in self._token_buckets]
+
+            for key, bucket_type, bucket in buckets:
+                state = self._cache.get(self._get_state_key(key, bucket_type), None)
+                if state is not None:
+                    bucket.set_state(state)
+
+            yield
+
+            for key, bucket_type, bucket in buckets:
+                self._cache.set(self._get_state_key(key, bucket_type), bucket.get_state())
+
+
+_rate_limiters: Dict[Optional[str], RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(shared_state_dir: Optional[str] = None) -> RateLimiter:
+    """Returns the rate limiter of the process for the given shared state directory.
+    If no directory is provided, the rate limiter is only shared between the threads of the process.
+
+    :param shared_state_dir: The directory of the state shared between processes, defaults to None
+    :type shared_state_dir: str, optional
+    :return: The rate limiter
+    :rtype: RateLimiter
+    """
+    if shared_state_dir is not None:
+        shared_state_dir = os.path.abspath(shared_state_dir)
+
+    with _rate_limiters_lock:
+        if shared_state_dir not in _rate_limiters:
+            if shared_state_dir is None:
+                _rate_limiters[None] = RateLimiter()
+            else:
+                _rate_limiters[shared_state_dir] = SharedRateLimiter(shared_state_dir)
+        return _rate_limiters[shared_state_dir]
@@ -7,7 +7,8 @@ CompositeFlow is a flow that contains subflows and defines how they are executed
 
 from .abstract import Flow
 from .atomic import AtomicFlow
-from .composite import CompositeFlow
+from .composite import CompositeFlow, LazySubflows
 from .circular import CircularFlow
 from .sequential import SequentialFlow
 from .branching import BranchingFlow
+from .parallel import ParallelFlow
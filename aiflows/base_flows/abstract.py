@@ -4,8 +4,9 @@
 import os
 import sys
 import copy
+import asyncio
 from abc import ABC
-from typing import List, Dict, Any, Union, Optional
+from typing import List, Dict, Any, Union, Optional, Tuple
 
 from omegaconf import OmegaConf
 from ..utils import logging
@@ -18,13 +19,29 @@ from aiflows.messages import (
     UpdateMessage_FullReset,
     OutputMessage,
 )
-from aiflows.utils.general_helpers import recursive_dictionary_update, nested_keys_search, process_config_leafs
+from aiflows.utils.general_helpers import (
+    recursive_dictionary_update,
+    nested_keys_search,
+    process_config_leafs,
+    create_unique_id,
+)
 from aiflows.utils.rich_utils import print_config_tree
-from aiflows.flow_cache import FlowCache, CachingKey, CachingValue, CACHING_PARAMETERS
-from ..utils.general_helpers import try_except_decorator
+from aiflows.flow_cache import (
+    FlowCacheNamespace,
+    CachingKey,
+    CachingValue,
+    CACHING_PARAMETERS,
+    get_flow_cache,
+    canonical_hash,
+)
+from ..utils.general_helpers import try_except_decorator, async_try_except_decorator
+from ..utils.frozen import freeze, thaw
 
 log = logging.get_logger(__name__)
 
+# ~~~ The resolved default configs of the flow classes (with the modification times of the YAML files they were built from) ~~~
+_default_configs: Dict[type, Tuple[Tuple, Dict[str, Any]]] = {}
+
 
 class Flow(ABC):
     """
@@ -51,6 +68,12 @@ class Flow(ABC):
         "keys_to_ignore_for_hash_input_data": [],
         "clear_flow_namespace_on_run_end": True,  # whether to clear the flow namespace after each run
         "enable_cache": False,  # whether to enable cache for this flow
+        # whether the values of the state and of the output messages are frozen instead of deep-copied (opt-in: the frozen
+        # values cannot be mutated in place, e.g. appending to a list of the state raises a TypeError, use `thaw` to edit them)
+        "copy_on_write_state": False,
+        "max_history_messages": None,  # the maximum number of messages kept in the history (None for no limit)
+        "max_history_bytes": None,  # the maximum size (in bytes) of the messages kept in the history (None for no limit)
+        "history_spill_dir": None,  # if provided, all the messages of the history are also appended to a file in this directory
     }
 
     def __init__(
@@ -61,7 +84,7 @@ class Flow(ABC):
         __init__ should not be called directly be a user. Instead, use the classmethod `instantiate_from_config` or `instantiate_from_default_config`
         """
         self.flow_config = flow_config
-        self.cache = FlowCache()
+        self.__config_hash = None
         self._validate_flow_config(flow_config)
 
         self.set_up_flow_state()
@@ -72,6 +95,15 @@ class Flow(ABC):
             )
             print_config_tree(self.flow_config)
 
+    @property
+    def cache(self) -> FlowCacheNamespace:
+        """Returns the view of the process-wide flow cache for this flow class. The cache is only opened on first use.
+
+        :return: The flow cache of the flow class
+        :rtype: FlowCacheNamespace
+        """
+        return get_flow_cache(namespace=self.__class__.__name__)
+
     @property
     def name(self):
         """Returns the name of the flow
@@ -113,32 +145,49 @@ class Flow(ABC):
                 raise ValueError(f"{key} is a required parameter in the flow_config.")
 
     @classmethod
-    def get_config(cls, **overrides):
+    def _get_default_config(cls) -> Tuple[Tuple, Dict[str, Any]]:
         """
-        Returns the default config for the flow, with the overrides applied.
-        The default implementation construct the default config by recursively merging the configs of the base classes.
-
-        :param overrides: The parameters to override in the default config
-        :type overrides: Dict[str, Any], optional
-        :return: The default config with the overrides applied
-        :rtype: Dict[str, Any]
+        Returns the resolved default config of the flow class, constructed by recursively merging the configs of the base classes.
+        The resolved configs are cached per class and rebuilt when one of the YAML files they were built from is modified.
+        If a base class overrides `get_config`, the config of the class is built on the result of its `get_config`, and
+        is not cached (nor are the configs of its subclasses). The returned config is shared and must not be modified.
+
+        :return: The modification times of the YAML files of the class and its base classes (None if the config is not
+            cached), and the resolved default config
+        :rtype: Tuple[Optional[Tuple], Dict[str, Any]]
         """
         if cls == Flow:
-            return copy.deepcopy(cls.__default_flow_config)
+            return (), cls.__default_flow_config
         elif cls == ABC:
-            return {}
+            return (), {}
         elif cls == object:
-            return {}
+            return (), {}
 
-        # ~~~ Recursively retrieve and merge the configs of the base classes to construct the default config ~~~
+        # ~~~ Recursively retrieve the configs of the base classes ~~~
         super_cls = cls.__base__
-        parent_default_config = super_cls.get_config()
+        if super_cls.get_config.__func__ is Flow.get_config.__func__:
+            parent_mtimes, parent_default_config = super_cls._get_default_config()
+        else:
+            # ~~~ the custom get_config of the base class may not be deterministic, its result is not cached ~~~
+            parent_mtimes, parent_default_config = None, super_cls.get_config()
 
         path_to_flow_directory = os.path.dirname(sys.modules[cls.__module__].__file__)
         class_name = cls.__name__
 
         path_to_config = os.path.join(path_to_flow_directory, f"{class_name}.yaml")
-        if os.path.exists(path_to_config):
+        try:
+            mtime = os.stat(path_to_config).st_mtime_ns
+        except OSError:
+            mtime = None
+        mtimes = None if parent_mtimes is None else parent_mtimes + (mtime,)
+
+        cached = _default_configs.get(cls, None)
+        if mtimes is not None and cached is not None and cached[0] == mtimes:
+            return cached
+
+        # ~~~ Merge the config of the class into (a copy of) the config of its base class ~~~
+        parent_default_config = thaw(parent_default_config)
+        if mtime is not None:
             default_config = OmegaConf.to_container(OmegaConf.load(path_to_config), resolve=True)
 
             cls_parent_module = ".".join(cls.__module__.split(".")[:-1])
@@ -156,8 +205,29 @@ class Flow(ABC):
         else:
             config = parent_default_config
             log.debug(f"Flow config not found at {path_to_config}.")
+
+        if mtimes is not None:
+            _default_configs[cls] = (mtimes, config)
+        return mtimes, config
+
+    @classmethod
+    def get_config(cls, **overrides):
+        """
+        Returns the default config for the flow, with the overrides applied.
+        The default implementation construct the default config by recursively merging the configs of the base classes
+        (see `_get_default_config`, the resolved default configs are cached), and applies the overrides to a copy of it.
+
+        :param overrides: The parameters to override in the default config
+        :type overrides: Dict[str, Any], optional
+        :return: The default config with the overrides applied
+        :rtype: Dict[str, Any]
+        """
+        if cls == ABC or cls == object:
+            return {}
+
+        _, default_config = cls._get_default_config()
         # ~~~~ Apply the overrides ~~~~
-        config = recursive_dictionary_update(config, overrides)
+        config = recursive_dictionary_update(thaw(default_config), overrides)
 
         # return cls.config_class(**overrides)
         return config
@@ -185,10 +255,47 @@ class Flow(ABC):
         config = cls.get_config(**overrides)
         return cls.instantiate_from_config(config)
 
+    def clone(self) -> "Flow":
+        """Returns a clone of the flow: a new instance of the same class with a copy of the config and a fresh state and
+        history. Cloning a flow is much cheaper than instantiating it again from its config, e.g. to get one flow per worker.
+
+        The other attributes set at instantiation (e.g. the interfaces or the backend) are shared with the clone, except
+        for the attributes that are plain dictionaries, lists or sets, which are shallowly copied (their elements are
+        shared). Subclasses with other mutable per-instance attributes (e.g. a nested list filled during the run, or an
+        object holding the state of a run) must override this method to copy them (see `CompositeFlow.clone`).
+
+        :return: The clone of the flow
+        :rtype: aiflows.flow.Flow
+        """
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        for attribute, value in self.__dict__.items():
+            if type(value) in (dict, list, set):
+                clone.__dict__[attribute] = copy.copy(value)
+        clone.flow_config = thaw(self.flow_config)
+        # ~~~ the history of the original flow is not closed by the clone ~~~
+        clone.history = None
+        clone.set_up_flow_state()
+        return clone
+
     def set_up_flow_state(self):
         """Sets up the flow state. This method is called when the flow is instantiated, and when the flow is reset."""
         self.flow_state = {}
-        self.history = FlowHistory()
+
+        # ~~~ the spill file of the previous history (if any) is closed, the new history spills to a new file ~~~
+        if getattr(self, "history", None) is not None:
+            self.history.close()
+
+        spill_path = None
+        if self.flow_config["history_spill_dir"] is not None:
+            spill_path = os.path.join(
+                self.flow_config["history_spill_dir"], f"{self.flow_config['name']}-{create_unique_id()}.jsonl"
+            )
+        self.history = FlowHistory(
+            max_messages=self.flow_config["max_history_messages"],
+            max_bytes=self.flow_config["max_history_bytes"],
+            spill_path=spill_path,
+        )
 
     def reset(self, full_reset: bool, recursive: bool, src_flow: Optional[Union["Flow", str]] = "Launcher"):
         """
@@ -204,7 +311,9 @@ class Flow(ABC):
             src_flow = src_flow.flow_config["name"]
 
         if recursive and hasattr(self, "subflows"):
-            for _, flow in self.subflows.items():
+            # ~~~ The subflows that are not instantiated yet (see LazySubflows) have nothing to reset ~~~
+            subflows = getattr(self.subflows, "instantiated", self.subflows)
+            for _, flow in subflows.items():
                 flow.reset(full_reset=full_reset, recursive=True)
 
         if full_reset:
@@ -253,8 +362,13 @@ class Flow(ABC):
                 if value is None or value == self.flow_state[key]:
                     continue
 
+            if self.flow_config["copy_on_write_state"]:
+                # ~~~ frozen values are shared instead of copied, the (deep) copies of the state are then O(1) ~~~
+                value = freeze(value)
+                self.flow_state[key] = value
+            else:
+                self.flow_state[key] = copy.deepcopy(value)
             updates[key] = value
-            self.flow_state[key] = copy.deepcopy(value)
 
         if len(updates) != 0:
             state_update_message = UpdateMessage_Generic(
@@ -275,6 +389,7 @@ class Flow(ABC):
         """Used by the caching mechanism to skip computation that has already been done and stored in the cache"""
         self.flow_config = state["flow_config"]
         self.flow_state = state["flow_state"]
+        self.__config_hash = None
 
     def __repr__(self):
         """Generates the string that will be used by the hashing function"""
@@ -291,8 +406,32 @@ class Flow(ABC):
         hash_dict = {"flow_config": config_hashing_params, "flow_state": state_hashing_params}
         return repr(hash_dict)
 
-    # def get_hash_string(self):
-    #     raise NotImplementedError()
+    def get_config_hash(self) -> str:
+        """Returns the hash of the config of the flow (ignoring the keys in flow_config["keys_to_ignore_for_hash_flow_config"]),
+        used in the caching keys. It is computed once, the config is not expected to change after the instantiation.
+
+        :return: The hash of the config
+        :rtype: str
+        """
+        config_hash = getattr(self, "_Flow__config_hash", None)
+        if config_hash is None:
+            config_hashing_params = {
+                k: v
+                for k, v in self.flow_config.items()
+                if k not in self.flow_config["keys_to_ignore_for_hash_flow_config"]
+            }
+            config_hash = canonical_hash(config_hashing_params)
+            self.__config_hash = config_hash
+        return config_hash
+
+    def get_state_hashing_params(self) -> Dict[str, Any]:
+        """Returns the part of the state used in the caching keys (ignoring the keys in flow_config["keys_to_ignore_for_hash_flow_state"]).
+
+        :return: The state hashing parameters
+        :rtype: Dict[str, Any]
+        """
+        keys_to_ignore = self.flow_config["keys_to_ignore_for_hash_flow_state"]
+        return {k: v for k, v in self.flow_state.items() if k not in keys_to_ignore}
 
     def get_interface_description(self):
         """Returns the input and output interface description of the flow."""
@@ -306,7 +445,10 @@ class Flow(ABC):
         :return: The message that was logged
         :rtype: Message
         """
-        log.debug(message.to_string())
+        # ~~~ The message is only rendered if the debug level is enabled ~~~
+        log.debug("%s", logging.LazyString(message.to_string))
+        for trace_sink in logging.get_trace_sinks():
+            trace_sink(self, message)
         return self.history.add_message(message)
 
     def _fetch_state_attributes_by_keys(self, keys: Union[List[str], None]):
@@ -379,7 +521,10 @@ class Flow(ABC):
         :return: The packaged output message
         :rtype: OutputMessage
         """
-        output_data = copy.deepcopy(response)
+        if self.flow_config["copy_on_write_state"]:
+            output_data = {key: freeze(value) for key, value in response.items()}
+        else:
+            output_data = copy.deepcopy(response)
 
         return OutputMessage(
             created_by=self.flow_config["name"],
@@ -401,14 +546,31 @@ class Flow(ABC):
         """
         raise NotImplementedError
 
-    def __get_from_cache(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Gets the response from the cache if it exists. If it does not exist, runs the flow and caches the response.
+    async def arun(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Asynchronous counterpart of `run`. The default implementation executes the synchronous `run` in a worker thread
+        (with `asyncio.to_thread`), such that flows that only implement `run` can still be awaited.
+
+        Note that the atomic flows of the library do not implement a native `arun`: an atomic flow awaited on the event loop
+        still occupies a thread of the loop's default executor while it runs, so the number of concurrent atomic runs is
+        capped by the size of that executor (`min(32, os.cpu_count() + 4)` threads unless the loop's default executor is
+        replaced, as done by the `AsyncFlowLauncher`). Flows that perform I/O (e.g. API calls) should override this method
+        with a native coroutine (e.g. awaiting `LiteLLMBackend.acall` instead of calling the backend) to lift the cap.
 
         :param input_data: The input data to run the flow on
         :type input_data: Dict[str, Any]
         :return: The response of the flow
         :rtype: Dict[str, Any]
         """
+        return await asyncio.to_thread(self.run, input_data)
+
+    def __get_cache_key_hash(self, input_data: Dict[str, Any]) -> str:
+        """Returns the hash of the caching key of the flow for the given input data.
+
+        :param input_data: The input data to run the flow on
+        :type input_data: Dict[str, Any]
+        :return: The hash of the caching key
+        :rtype: str
+        """
         assert self.flow_config["enable_cache"] and CACHING_PARAMETERS.do_caching
 
         if not self.SUPPORTS_CACHING:
@@ -416,49 +578,126 @@ class Flow(ABC):
                 f"Flow {self.flow_config['name']} does not support caching, but flow_config['enable_cache'] is True"
             )
 
-        # ~~~ get the hash string ~~~
         keys_to_ignore_for_hash = self.flow_config["keys_to_ignore_for_hash_input_data"]
         input_data_to_hash = {k: v for k, v in input_data.items() if k not in keys_to_ignore_for_hash}
-        cache_key_hash = CachingKey(self, input_data_to_hash, keys_to_ignore_for_hash).hash_string()
-        # ~~~ get from cache ~~~
-        response = None
-        cached_value: CachingValue = self.cache.get(cache_key_hash)
-        if cached_value is not None:
-            # Retrieve output from cache
-            response = cached_value.output_results
-
-            # Restore the flow to the state it was in when the output was created
-            self.__setstate__(cached_value.full_state)
-
-            # Restore the history messages
-            for message in cached_value.history_messages_created:
-                message._reset_message_id()
-                self._log_message(message)
+        return CachingKey(self, input_data_to_hash, keys_to_ignore_for_hash).hash_string()
 
-            log.debug(
-                f"Retrieved from cache: {self.__class__.__name__} "
-                f"-- (input_data.keys()={list(input_data_to_hash.keys())}, "
-                f"keys_to_ignore_for_hash={keys_to_ignore_for_hash})"
-            )
-            log.debug(f"Retrieved from cache: {str(cached_value)}")
+    def __restore_from_cache(self, cached_value: CachingValue) -> Dict[str, Any]:
+        """Restores the flow to the state it was in when the cached value was created and returns the cached response.
 
-        else:
-            # Call the original function
-            history_len_pre_execution = len(self.history)
+        :param cached_value: The cached value
+        :type cached_value: CachingValue
+        :return: The cached response of the flow
+        :rtype: Dict[str, Any]
+        """
+        # Retrieve output from cache
+        response = cached_value.output_results
+
+        # Restore the flow to the state it was in when the output was created
+        self.__setstate__(cached_value.full_state)
+
+        # Restore the history messages
+        for message in cached_value.history_messages_created:
+            message._reset_message_id()
+            self._log_message(message)
+
+        log.debug(f"Retrieved from cache: {self.__class__.__name__}")
+        log.debug("Retrieved from cache: %s", logging.LazyString(cached_value.__str__))
+
+        return response
+
+    def __write_to_cache(self, cache_key_hash: str, response: Dict[str, Any], history_len_pre_execution: int):
+        """Caches the response of the flow together with its state and the history messages created during the execution.
+
+        :param cache_key_hash: The hash of the caching key
+        :type cache_key_hash: str
+        :param response: The response of the flow
+        :type response: Dict[str, Any]
+        :param history_len_pre_execution: The number of messages added to the history before the execution
+        :type history_len_pre_execution: int
+        """
+        # Retrieve the messages created during the execution (the ones still kept in memory by the history)
+        num_created_messages = self.history.num_messages_added - history_len_pre_execution
+        new_history_messages = self.history.get_last_n_messages(num_created_messages)
 
-            # Execute the call
+        value_to_cache = CachingValue(
+            output_results=response, full_state=self.__getstate__(), history_messages_created=new_history_messages
+        )
+
+        self.cache.set(cache_key_hash, value_to_cache)
+        log.debug(f"Cached key: f{cache_key_hash}")
+
+    def __get_from_cache(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Gets the response from the cache if it exists. If it does not exist, runs the flow and caches the response.
+
+        :param input_data: The input data to run the flow on
+        :type input_data: Dict[str, Any]
+        :return: The response of the flow
+        :rtype: Dict[str, Any]
+        """
+        cache_key_hash = self.__get_cache_key_hash(input_data)
+
+        # ~~~ Single-flight: if another call is computing the same key, wait for it and read its result from the cache ~~~
+        while True:
+            cached_value: CachingValue = self.cache.get(cache_key_hash)
+            if cached_value is not None:
+                return self.__restore_from_cache(cached_value)
+            if not CACHING_PARAMETERS.single_flight:
+                break
+
+            flight, is_leader = self.cache.start_flight(cache_key_hash)
+            if is_leader:
+                break
+            flight.join()
+
+        try:
+            # ~~~ The key may have been cached between the cache lookup and the start of the flight ~~~
+            cached_value = self.cache.get(cache_key_hash) if CACHING_PARAMETERS.single_flight else None
+            if cached_value is not None:
+                return self.__restore_from_cache(cached_value)
+
+            history_len_pre_execution = self.history.num_messages_added
             response = self.run(input_data)
+            self.__write_to_cache(cache_key_hash, response, history_len_pre_execution)
+        finally:
+            if CACHING_PARAMETERS.single_flight:
+                self.cache.end_flight(cache_key_hash)
 
-            # Retrieve the messages created during the execution
-            num_created_messages = len(self.history) - history_len_pre_execution
-            new_history_messages = self.history.get_last_n_messages(num_created_messages)
+        return response
 
-            value_to_cache = CachingValue(
-                output_results=response, full_state=self.__getstate__(), history_messages_created=new_history_messages
-            )
+    async def __aget_from_cache(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Asynchronous counterpart of `__get_from_cache`. On a cache miss, the flow is executed with `arun`.
 
-            self.cache.set(cache_key_hash, value_to_cache)
-            log.debug(f"Cached key: f{cache_key_hash}")
+        :param input_data: The input data to run the flow on
+        :type input_data: Dict[str, Any]
+        :return: The response of the flow
+        :rtype: Dict[str, Any]
+        """
+        cache_key_hash = self.__get_cache_key_hash(input_data)
+
+        while True:
+            cached_value: CachingValue = self.cache.get(cache_key_hash)
+            if cached_value is not None:
+                return self.__restore_from_cache(cached_value)
+            if not CACHING_PARAMETERS.single_flight:
+                break
+
+            flight, is_leader = self.cache.start_flight(cache_key_hash)
+            if is_leader:
+                break
+            await flight.ajoin()
+
+        try:
+            cached_value = self.cache.get(cache_key_hash) if CACHING_PARAMETERS.single_flight else None
+            if cached_value is not None:
+                return self.__restore_from_cache(cached_value)
+
+            history_len_pre_execution = self.history.num_messages_added
+            response = await self.arun(input_data)
+            self.__write_to_cache(cache_key_hash, response, history_len_pre_execution)
+        finally:
+            if CACHING_PARAMETERS.single_flight:
+                self.cache.end_flight(cache_key_hash)
 
         return response
 
@@ -491,6 +730,36 @@ class Flow(ABC):
 
         return output_message
 
+    @async_try_except_decorator
+    async def acall(self, input_message: InputMessage):
+        """Asynchronous counterpart of `__call__`. It calls the flow on the given input message, executing its logic with `arun`.
+        The history, caching and reset behaviour are the same as in `__call__`.
+
+        :param input_message: The input message to run the flow on
+        :type input_message: InputMessage
+        :return: The output message of the flow
+        :rtype: OutputMessage
+        """
+        # ~~~ check and log input ~~~
+        self._log_message(input_message)
+
+        # ~~~ Execute the logic of the flow ~~~
+        if not self.flow_config["enable_cache"] or not CACHING_PARAMETERS.do_caching:
+            response = await self.arun(input_message.data)
+        else:
+            response = await self.__aget_from_cache(input_message.data)
+
+        # ~~~ Package output message ~~~
+        output_message = self._package_output_message(
+            input_message=input_message,
+            response=response,
+            raw_response=None,
+        )
+
+        self._post_call_hook()
+
+        return output_message
+
     def _post_call_hook(self):
         """Removes all attributes from the namespace that are not in self.KEYS_TO_IGNORE_WHEN_RESETTING_NAMESPACE"""
         if self.flow_config["clear_flow_namespace_on_run_end"]:
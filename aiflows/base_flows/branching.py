@@ -28,6 +28,42 @@ class BranchingFlow(CompositeFlow):
         :return: The output data dictionary
         :rtype: Dict[str, Any]
         """
+        branch_flow, input_message = self._package_branch_input_message(input_data)
+
+        output_message = branch_flow(input_message)
+
+        self._log_message(output_message)
+
+        return {"branch_output_data": output_message.data["output_data"]}
+
+    async def arun(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Asynchronous counterpart of `run`. The selected branch is called with `acall`.
+
+        :param input_data: The input data dictionary
+        :type input_data: Dict[str, Any]
+        :return: The output data dictionary
+        :rtype: Dict[str, Any]
+        """
+        if type(self).run is not BranchingFlow.run:
+            # ~~~ a subclass customized the synchronous logic, it is executed as is ~~~
+            return await super().arun(input_data)
+
+        branch_flow, input_message = self._package_branch_input_message(input_data)
+
+        output_message = await branch_flow.acall(input_message)
+
+        self._log_message(output_message)
+
+        return {"branch_output_data": output_message.data["output_data"]}
+
+    def _package_branch_input_message(self, input_data: Dict[str, Any]):
+        """Selects the subflow to execute and packages its input message.
+
+        :param input_data: The input data dictionary
+        :type input_data: Dict[str, Any]
+        :return: The subflow to execute and its input message
+        :rtype: Tuple[Flow, InputMessage]
+        """
         branch = input_data["branch"]
         branch_input_data = input_data["branch_input_data"]
 
@@ -37,11 +73,7 @@ class BranchingFlow(CompositeFlow):
 
         input_message = self._package_input_message(payload=branch_input_data, dst_flow=branch_flow)
 
-        output_message = branch_flow(input_message)
-
-        self._log_message(output_message)
-
-        return {"branch_output_data": output_message.data["output_data"]}
+        return branch_flow, input_message
 
     @classmethod
     def type(cls):
@@ -1,10 +1,15 @@
-from typing import List, Dict, Any, Union
+import asyncio
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Union, Optional, Set, Tuple
 
 import hydra
 
 import aiflows.interfaces
 from aiflows.base_flows import CompositeFlow, Flow
 from aiflows.data_transformations.abstract import DataTransformation
+from aiflows.interfaces import KeyInterface
+from aiflows.messages import OutputMessage
 
 from ..utils import logging
 
@@ -18,23 +23,48 @@ class TopologyNode:
     :type goal: str
     :param input_interface: The input interface of the node's flow
     :type input_interface: aiflows.interfaces.InputInterface
-    :param flow: The flow of the node
+    :param flow: The flow of the node (None if it is looked up by name in `subflows`)
     :type flow: aiflows.base_flows.Flow
     :param output_interface: The output interface of the node's flow
     :type output_interface: List[aiflows.data_transformations.DataTransformation]
     :param reset: Whether to reset the node's flow
     :type reset: bool
+    :param flow_name: The name of the node's flow (defaults to the name of `flow`)
+    :type flow_name: str, optional
+    :param subflows: The subflows in which the node's flow is looked up on first access, if `flow` is None
+        (with `lazy_subflows`, the flow is only instantiated when the node is first executed)
+    :type subflows: Mapping[str, aiflows.base_flows.Flow], optional
     """
 
     def __init__(
-        self, goal, input_interface, flow: Flow, output_interface: List[DataTransformation], reset: bool
+        self,
+        goal,
+        input_interface,
+        flow: Optional[Flow],
+        output_interface: List[DataTransformation],
+        reset: bool,
+        flow_name: Optional[str] = None,
+        subflows: Optional[Mapping] = None,
     ) -> None:
         self.goal = goal
         self.input_interface = input_interface
-        self.flow = flow
+        self._flow = flow
+        self.flow_name = flow.name if flow_name is None else flow_name
+        self._subflows = subflows
         self.output_interface = output_interface
         self.reset = reset
 
+    @property
+    def flow(self) -> Flow:
+        """The flow of the node (looked up in the subflows on first access)."""
+        if self._flow is None:
+            self._flow = self._subflows[self.flow_name]
+        return self._flow
+
+    @flow.setter
+    def flow(self, flow: Flow):
+        self._flow = flow
+
 
 class CircularFlow(CompositeFlow):
     """This class represents a circular flow. It is a composite flow that runs its subflows in a circular fashion.
@@ -43,6 +73,9 @@ class CircularFlow(CompositeFlow):
                         - 'max_rounds' (int): The maximum number of rounds to run the circular flow
                         - 'early_exit_key' (str): The key in the flow state that indicates the end of the interaction
                         - 'topology' (list[Dict[str, Any]]): The topology of the circular flow (the dictionary describes the topology of one node, see TopologyNode for details)
+                        - 'dag_mode' (bool): If True, within a round, the nodes that do not depend on each other run concurrently (see `_set_up_dag_dependencies`).
+                        The keys of the flow state read and written by a node are inferred from its interfaces, or declared with the 'reads' and 'writes' keys of the node in the topology. Default: False
+                        - 'max_workers' (int): The maximum number of threads running the subflows concurrently in DAG mode with `run` (None for one thread per node). Default: None
                         - The keys required by CompositeFlow (subflows_config)
     :type flow_config: Dict[str, Any]
     :param subflows: A list of subflows. This is necessary when instantiating the flow programmatically.
@@ -55,7 +88,13 @@ class CircularFlow(CompositeFlow):
 
     REQUIRED_KEYS_CONFIG = ["max_rounds", "early_exit_key", "topology"]
 
-    __default_flow_config = {"max_rounds": 3, "early_exit_key": "EARLY_EXIT", "topology": []}
+    __default_flow_config = {
+        "max_rounds": 3,
+        "early_exit_key": "EARLY_EXIT",
+        "topology": [],
+        "dag_mode": False,
+        "max_workers": None,
+    }
 
     __input_msg_payload_builder_registry = {}
     __output_msg_payload_processor_registry = {}
@@ -99,11 +138,19 @@ class CircularFlow(CompositeFlow):
         flow_config: Dict[str, Any],
         subflows: List[Flow],
     ):
+        # ~~~ The futures of the nodes still running when a round of the DAG mode ended (their outputs are discarded) ~~~
+        self._discarded_dag_futures: List[Future] = []
         super().__init__(flow_config=flow_config, subflows=subflows)
         if len(self.subflows) <= 0:
             raise ValueError(f"Circular flow needs at least one subflow, currently has 0")
         self.topology = self.__set_up_topology()
 
+        # ~~~ The dependencies between the nodes of the topology (None until they are set up). They are inferred from the
+        # flows of the nodes, so with lazy subflows they are set up on the first run instead of at instantiation ~~~
+        self._dag_dependencies = None
+        if self.flow_config.get("dag_mode", False) and not self.flow_config.get("lazy_subflows", False):
+            self._dag_dependencies = self._set_up_dag_dependencies()
+
     def _early_exit(self):
         """Checks whether the early exit condition is met.
 
@@ -136,7 +183,7 @@ class CircularFlow(CompositeFlow):
             if flow_name not in self.subflows:
                 raise ValueError(f"flow {flow_name} is not in subflow_configs")
 
-            flow = self.subflows[flow_name]
+            # ~~~ The flow is looked up on first access, such that lazy subflows are instantiated when first executed ~~~
             reset = topo_config.get("reset", False)
             input_interface = topo_config.get("input_interface", None)
             if input_interface is not None:
@@ -171,14 +218,47 @@ class CircularFlow(CompositeFlow):
                 TopologyNode(
                     goal=topo_config["goal"],
                     input_interface=input_interface,
-                    flow=flow,
+                    flow=None,
                     output_interface=output_interface,
                     reset=reset,
+                    flow_name=flow_name,
+                    subflows=self.subflows,
                 )
             )
 
         return ret
 
+    def clone(self) -> "CircularFlow":
+        """Returns a clone of the flow (see `Flow.clone`). The topology of the clone calls the clones of the subflows,
+        the interfaces are shared.
+
+        :return: The clone of the flow
+        :rtype: CircularFlow
+        """
+        clone = super().clone()
+
+        clone.topology = [
+            TopologyNode(
+                goal=node.goal,
+                input_interface=node.input_interface,
+                flow=None,
+                output_interface=node.output_interface,
+                reset=node.reset,
+                flow_name=node.flow_name,
+                subflows=clone.subflows,
+            )
+            for node in self.topology
+        ]
+        clone._discarded_dag_futures = []
+        return clone
+
+    def reset(self, full_reset: bool, recursive: bool, src_flow: Optional[Union[Flow, str]] = "Launcher"):
+        """Resets the flow (see `Flow.reset`). If `recursive` is True, it first waits for the subflows whose outputs were
+        discarded by an early exit in DAG mode to complete."""
+        if recursive:
+            self._wait_for_discarded_dag_nodes()
+        super().reset(full_reset=full_reset, recursive=recursive, src_flow=src_flow)
+
     def run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Runs the circular flow. It runs its subflows in a circular fashion (following the topology).
 
@@ -194,7 +274,39 @@ class CircularFlow(CompositeFlow):
         if max_rounds is None:
             log.info(f"Running {self.flow_config['name']} without `max_rounds` until the early exit condition is met.")
 
-        self._sequential_run(max_rounds=max_rounds)
+        if self.flow_config.get("dag_mode", False):
+            self._dag_run(max_rounds=max_rounds)
+        else:
+            self._sequential_run(max_rounds=max_rounds)
+
+        output = self._get_output_from_state()
+
+        return output
+
+    async def arun(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Asynchronous counterpart of `run`. The subflows are awaited one after the other (following the topology),
+        so that the circular flow does not block a thread while its subflows are running.
+
+        :param input_data: The input data dictionary
+        :type input_data: Dict[str, Any]
+        :return: The output data dictionary
+        :rtype: Dict[str, Any]
+        """
+        if type(self).run is not CircularFlow.run:
+            # ~~~ a subclass customized the synchronous logic, it is executed as is ~~~
+            return await super().arun(input_data)
+
+        # ~~~ sets the input_data in the flow_state dict ~~~
+        self._state_update_dict(update_data=input_data)
+
+        max_rounds = self.flow_config.get("max_rounds", 1)
+        if max_rounds is None:
+            log.info(f"Running {self.flow_config['name']} without `max_rounds` until the early exit condition is met.")
+
+        if self.flow_config.get("dag_mode", False):
+            await self._adag_run(max_rounds=max_rounds)
+        else:
+            await self._asequential_run(max_rounds=max_rounds)
 
         output = self._get_output_from_state()
 
@@ -231,25 +343,296 @@ class CircularFlow(CompositeFlow):
         while max_rounds is None or curr_round < max_rounds:
             curr_round += 1
             for node in self.topology:
-                input_interface = node.input_interface
-                current_flow = node.flow
-                output_interface = node.output_interface
-
                 output_message, output_data = self._call_flow_from_state(
                     goal=node.goal,
-                    input_interface=input_interface,
-                    flow=current_flow,
-                    output_interface=output_interface,
+                    input_interface=node.input_interface,
+                    flow=node.flow,
+                    output_interface=node.output_interface,
                 )
 
-                self._state_update_dict(update_data=output_data)
+                if self._on_node_completed(node=node, output_data=output_data):
+                    return
+
+        self._on_reach_max_rounds()
 
-                # ~~~ Check for end of interaction
-                if self._early_exit():
-                    log.info(f"[{self.flow_config['name']}] End of interaction detected")
+    async def _asequential_run(self, max_rounds: Union[int, None]):
+        """Asynchronous counterpart of `_sequential_run`. The subflows are called with `acall`.
+
+        :param max_rounds: The maximum number of rounds to run the circular flow
+        :type max_rounds: Union[int, None]
+        """
+        curr_round = 0
+        while max_rounds is None or curr_round < max_rounds:
+            curr_round += 1
+            for node in self.topology:
+                output_message, output_data = await self._acall_flow_from_state(
+                    goal=node.goal,
+                    input_interface=node.input_interface,
+                    flow=node.flow,
+                    output_interface=node.output_interface,
+                )
+
+                if self._on_node_completed(node=node, output_data=output_data):
                     return
 
-                if node.reset:
-                    current_flow.reset(full_reset=True, recursive=True, src_flow=self)
+        self._on_reach_max_rounds()
+
+    def _get_node_keys(self, node_idx: int) -> Tuple[Optional[Set[str]], Optional[Set[str]]]:
+        """Returns the keys of the flow state read and written by a node of the topology. They are declared with the 'reads'
+        and 'writes' keys of the node in the topology, or inferred from the interfaces of the node (see `KeyInterface.get_read_keys`
+        and `KeyInterface.get_output_keys`) and from the output interface of its flow.
+
+        :param node_idx: The index of the node in the topology
+        :type node_idx: int
+        :return: The keys read and the keys written by the node (None if any key may be read, resp. written)
+        :rtype: Tuple[Optional[Set[str]], Optional[Set[str]]]
+        """
+        topo_config = self.flow_config["topology"][node_idx]
+        node = self.topology[node_idx]
+
+        reads = topo_config.get("reads", None)
+        if reads is None and isinstance(node.input_interface, KeyInterface):
+            reads = node.input_interface.get_read_keys(dst_flow=node.flow)
+
+        writes = topo_config.get("writes", None)
+        if writes is None:
+            flow_output_keys = node.flow.flow_config.get("output_interface", None)
+            flow_output_keys = None if flow_output_keys is None else set(flow_output_keys)
+            if node.output_interface is None:
+                writes = flow_output_keys
+            elif isinstance(node.output_interface, KeyInterface):
+                writes = node.output_interface.get_output_keys(flow_output_keys, dst_flow=self)
+
+        return (None if reads is None else set(reads)), (None if writes is None else set(writes))
+
+    @staticmethod
+    def _keys_overlap(keys: Optional[Set[str]], other_keys: Optional[Set[str]]) -> bool:
+        """Returns whether two sets of keys (None meaning any key) overlap."""
+        if keys is None:
+            return other_keys is None or len(other_keys) > 0
+        if other_keys is None:
+            return len(keys) > 0
+        return not keys.isdisjoint(other_keys)
+
+    def _set_up_dag_dependencies(self) -> List[Set[int]]:
+        """Sets up the dependencies between the nodes of the topology for the DAG mode. A node depends on a previous node
+        of the topology if it reads a key written by the previous node, if it writes a key read or written by the previous node,
+        or if both nodes call the same flow. Within a round, a node is called as soon as all the nodes it depends on are completed,
+        so the final flow state of a round is the same as with the sequential run (if the keys of the nodes are correct).
+
+        :return: The indices of the nodes that each node depends on
+        :rtype: List[Set[int]]
+        """
+        self._dag_node_keys = [self._get_node_keys(node_idx) for node_idx in range(len(self.topology))]
+
+        dependencies = []
+        for node_idx, (reads, writes) in enumerate(self._dag_node_keys):
+            node_dependencies = set()
+            for prev_idx, (prev_reads, prev_writes) in enumerate(self._dag_node_keys[:node_idx]):
+                if (
+                    self.topology[prev_idx].flow_name == self.topology[node_idx].flow_name
+                    or self._keys_overlap(prev_writes, reads)
+                    or self._keys_overlap(prev_writes, writes)
+                    or self._keys_overlap(prev_reads, writes)
+                ):
+                    node_dependencies.add(prev_idx)
+
+            log.debug(
+                f"[{self.flow_config['name']}] Node {node_idx} ({self.topology[node_idx].goal}) reads {reads}, "
+                f"writes {writes} and depends on the nodes {sorted(node_dependencies)}"
+            )
+            dependencies.append(node_dependencies)
+
+        return dependencies
+
+    def _pop_ready_nodes(self, pending: Set[int], merged: Set[int]) -> List[int]:
+        """Removes from the pending nodes and returns the nodes whose dependencies are all merged (in the order of the topology).
+
+        :param pending: The nodes of the round that were not started yet
+        :type pending: Set[int]
+        :param merged: The nodes of the round whose outputs are merged into the flow state
+        :type merged: Set[int]
+        :return: The nodes to start
+        :rtype: List[int]
+        """
+        ready = sorted(node_idx for node_idx in pending if self._dag_dependencies[node_idx] <= merged)
+        pending.difference_update(ready)
+        return ready
+
+    def _on_dag_node_completed(self, node_idx: int, output_message: OutputMessage) -> bool:
+        """Processes the output message of a node completed in DAG mode and updates the flow state (see `_on_node_completed`).
+
+        :param node_idx: The index of the node in the topology
+        :type node_idx: int
+        :param output_message: The output message of the node's flow
+        :type output_message: OutputMessage
+        :return: Whether the early exit condition is met
+        :rtype: bool
+        """
+        node = self.topology[node_idx]
+        output_data = self._process_output_message(
+            goal=node.goal, output_message=output_message, flow=node.flow, output_interface=node.output_interface
+        )
+
+        writes = self._dag_node_keys[node_idx][1]
+        if writes is not None and not writes.issuperset(output_data.keys()):
+            log.warning(
+                f"[{self.flow_config['name']}] Node {node_idx} ({node.goal}) wrote the keys "
+                f"{sorted(set(output_data.keys()) - writes)} that were not declared (or inferred), the DAG mode may not "
+                f"respect the order of the topology. Declare them with the 'writes' key of the node."
+            )
+
+        return self._on_node_completed(node=node, output_data=output_data)
+
+    def _dag_run(self, max_rounds: Union[int, None]):
+        """Runs the circular flow in DAG mode. Within a round, each node is called as soon as the nodes it depends on are merged
+        (see `_set_up_dag_dependencies`), and the nodes that are ready at the same time run concurrently on a thread pool.
+        The outputs are merged into the flow state (in the calling thread) in the order of the topology, as in the sequential run:
+        the output of a completed node is buffered until the nodes before it are merged.
+        It stops when the maximum number of rounds is reached or the early exit condition is met.
+
+        :param max_rounds: The maximum number of rounds to run the circular flow
+        :type max_rounds: Union[int, None]
+        """
+        self._wait_for_discarded_dag_nodes()
+        if self._dag_dependencies is None:
+            self._dag_dependencies = self._set_up_dag_dependencies()
+
+        max_workers = self.flow_config.get("max_workers", None) or len(self.topology)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            curr_round = 0
+            while max_rounds is None or curr_round < max_rounds:
+                curr_round += 1
+                if self._run_dag_round(executor):
+                    return
+        finally:
+            # ~~~ the nodes whose outputs are discarded are not waited for (see `_wait_for_discarded_dag_nodes`) ~~~
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self._on_reach_max_rounds()
+
+    def _wait_for_discarded_dag_nodes(self):
+        """Waits for the nodes still running when a round of the DAG mode ended (e.g. the nodes after the node that met the
+        early exit condition), such that their subflows are not used concurrently by the next run or reset."""
+        if len(self._discarded_dag_futures) > 0:
+            wait(self._discarded_dag_futures)
+            self._discarded_dag_futures = []
+
+    def _run_dag_round(self, executor: ThreadPoolExecutor) -> bool:
+        """Runs one round of the DAG mode (see `_dag_run`). As in the sequential run, when a node meets the early exit condition,
+        the outputs of the nodes after it in the topology are discarded (the nodes that are still running are not waited for).
+
+        :param executor: The thread pool running the subflows
+        :type executor: ThreadPoolExecutor
+        :return: Whether the early exit condition is met
+        :rtype: bool
+        """
+        pending = set(range(len(self.topology)))
+        merged = set()
+        running: Dict[Future, int] = {}
+        completed: Dict[int, Future] = {}
+
+        try:
+            while True:
+                for node_idx in self._pop_ready_nodes(pending, merged):
+                    node = self.topology[node_idx]
+                    input_message = self._package_input_message_from_state(
+                        goal=node.goal, input_interface=node.input_interface, flow=node.flow
+                    )
+                    running[executor.submit(node.flow, input_message)] = node_idx
+
+                if len(merged) == len(self.topology):
+                    return False
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    completed[running.pop(future)] = future
+
+                # ~~~ Merge the outputs in the order of the topology (the errors are raised in that order too) ~~~
+                while len(merged) in completed:
+                    node_idx = len(merged)
+                    if self._on_dag_node_completed(node_idx, completed.pop(node_idx).result()):
+                        return True
+                    merged.add(node_idx)
+        finally:
+            self._discarded_dag_futures.extend(running)
+
+    async def _adag_run(self, max_rounds: Union[int, None]):
+        """Asynchronous counterpart of `_dag_run`. The nodes that are ready at the same time are awaited concurrently (with `acall`).
+
+        :param max_rounds: The maximum number of rounds to run the circular flow
+        :type max_rounds: Union[int, None]
+        """
+        self._wait_for_discarded_dag_nodes()
+        if self._dag_dependencies is None:
+            self._dag_dependencies = self._set_up_dag_dependencies()
+
+        curr_round = 0
+        while max_rounds is None or curr_round < max_rounds:
+            curr_round += 1
+            if await self._arun_dag_round():
+                return
 
         self._on_reach_max_rounds()
+
+    async def _arun_dag_round(self) -> bool:
+        """Asynchronous counterpart of `_run_dag_round`. The nodes whose outputs are discarded are cancelled.
+
+        :return: Whether the early exit condition is met
+        :rtype: bool
+        """
+        pending = set(range(len(self.topology)))
+        merged = set()
+        running: Dict[asyncio.Task, int] = {}
+        completed: Dict[int, asyncio.Task] = {}
+
+        try:
+            while True:
+                for node_idx in self._pop_ready_nodes(pending, merged):
+                    node = self.topology[node_idx]
+                    input_message = self._package_input_message_from_state(
+                        goal=node.goal, input_interface=node.input_interface, flow=node.flow
+                    )
+                    running[asyncio.ensure_future(node.flow.acall(input_message))] = node_idx
+
+                if len(merged) == len(self.topology):
+                    return False
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    completed[running.pop(task)] = task
+
+                # ~~~ Merge the outputs in the order of the topology (the errors are raised in that order too) ~~~
+                while len(merged) in completed:
+                    node_idx = len(merged)
+                    if self._on_dag_node_completed(node_idx, completed.pop(node_idx).result()):
+                        return True
+                    merged.add(node_idx)
+        finally:
+            for task in running:
+                task.cancel()
+            if len(running) > 0:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    def _on_node_completed(self, node: TopologyNode, output_data: Dict[str, Any]) -> bool:
+        """Updates the flow state with the output data of a node and resets the node's flow if required.
+
+        :param node: The node that was executed
+        :type node: TopologyNode
+        :param output_data: The output data of the node
+        :type output_data: Dict[str, Any]
+        :return: Whether the early exit condition is met
+        :rtype: bool
+        """
+        self._state_update_dict(update_data=output_data)
+
+        # ~~~ Check for end of interaction
+        if self._early_exit():
+            log.info(f"[{self.flow_config['name']}] End of interaction detected")
+            return True
+
+        if node.reset:
+            node.flow.reset(full_reset=True, recursive=True, src_flow=self)
+
+        return False
@@ -1,6 +1,8 @@
 import copy
+import threading
 from abc import ABC
-from typing import List, Dict, Optional, Any
+from collections.abc import Mapping
+from typing import List, Dict, Optional, Any, Callable
 
 import hydra
 
@@ -11,6 +13,69 @@ from ..utils import logging
 log = logging.get_logger(__name__)
 
 
+class LazySubflows(Mapping):
+    """The subflows of a composite flow, each instantiated from its config on first access (see the `lazy_subflows`
+    parameter of CompositeFlow).
+
+    :param subflows_config: A dictionary of subflows configurations. The keys are the names of the subflows and the values are the configurations of the subflows.
+    :type subflows_config: Dict[str, Any]
+    :param instantiate_subflow: A function instantiating a subflow given its name and its configuration
+    :type instantiate_subflow: Callable[[str, Dict[str, Any]], Flow]
+    """
+
+    def __init__(self, subflows_config: Dict[str, Any], instantiate_subflow: Callable[[str, Dict[str, Any]], Flow]):
+        self.subflows_config = subflows_config
+        self.instantiate_subflow = instantiate_subflow
+        # ~~~ The subflows instantiated so far ~~~
+        self.instantiated: Dict[str, Flow] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, subflow_name: str) -> Flow:
+        subflow = self.instantiated.get(subflow_name, None)
+        if subflow is not None:
+            return subflow
+
+        if subflow_name not in self.subflows_config:
+            raise KeyError(subflow_name)
+
+        with self._lock:
+            subflow = self.instantiated.get(subflow_name, None)
+            if subflow is None:
+                log.debug(f"Instantiating the subflow {subflow_name} on first access.")
+                subflow = self.instantiate_subflow(subflow_name, self.subflows_config[subflow_name])
+                self.instantiated[subflow_name] = subflow
+        return subflow
+
+    def __contains__(self, subflow_name: str) -> bool:
+        return subflow_name in self.subflows_config
+
+    def __iter__(self):
+        return iter(self.subflows_config)
+
+    def __len__(self):
+        return len(self.subflows_config)
+
+    def clone(self) -> "LazySubflows":
+        """Returns a copy of the mapping in which the instantiated subflows are cloned (see `Flow.clone`), and the others
+        are still instantiated on first access.
+
+        :return: The copy of the mapping
+        :rtype: LazySubflows
+        """
+        clone = LazySubflows(self.subflows_config, self.instantiate_subflow)
+        clone.instantiated = {subflow_name: subflow.clone() for subflow_name, subflow in self.instantiated.items()}
+        return clone
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
 class CompositeFlow(Flow, ABC):
     """This class implements a composite flow. It is a flow that consists of multiple sub-flows.
     It is the a parent class for BranchingFlow, SequentialFlow and CircularFlow. Note that the run method of a CompositeFlow is not implemented.
@@ -18,6 +83,8 @@ class CompositeFlow(Flow, ABC):
     :param flow_config: The configuration of the flow. It must usually contain the following keys:
         - "subflows_config" (Dict[str,Any]): A dictionary of subflows configurations.The keys are the names of the subflows and the values are the configurations of the subflows.
         This is necessary when instantiating the flow from a config file.
+        - "lazy_subflows" (bool): If True, each subflow is only instantiated when it is first accessed (see LazySubflows),
+        such that the subflows that are never used (e.g. branches that are never taken) are never instantiated. Default: False
         - The parameters required by the constructor of the parent class Flow
     :type flow_config: Dict[str, Any]
     :param subflows: A list of subflows. This is necessary when instantiating the flow programmatically.
@@ -26,6 +93,10 @@ class CompositeFlow(Flow, ABC):
 
     REQUIRED_KEYS_CONFIG = ["subflows_config"]
 
+    __default_flow_config = {
+        "lazy_subflows": False,  # whether the subflows are instantiated on first access instead of at instantiation
+    }
+
     subflows: Dict[str, Flow]
 
     def __init__(
@@ -56,6 +127,47 @@ class CompositeFlow(Flow, ABC):
             flow_config=flow_config,
         )
 
+    def _package_input_message_from_state(self, goal: str, input_interface, flow):
+        """A helper function that packages the input message of a given flow by extracting the input data from the state of the current flow.
+
+        :param goal: The goal of the flow's call
+        :type goal: str
+        :param input_interface: The input interface of the flow
+        :type input_interface: Callable
+        :param flow: The flow to call
+        :type flow: Flow
+        :return: The input message
+        :rtype: InputMessage
+        """
+        if input_interface is not None:
+            payload = input_interface(goal=f"[Input] {goal}", data_dict=self.flow_state, src_flow=self, dst_flow=flow)
+
+        return self._package_input_message(payload=payload, dst_flow=flow)
+
+    def _process_output_message(self, goal: str, output_message, flow, output_interface):
+        """A helper function that logs the output message of a given flow to history and processes its output data.
+
+        :param goal: The goal of the flow's call
+        :type goal: str
+        :param output_message: The output message of the flow
+        :type output_message: OutputMessage
+        :param flow: The flow that was called
+        :type flow: Flow
+        :param output_interface: The output interface of the flow
+        :type output_interface: Callable
+        :return: The output data
+        :rtype: Dict[str, Any]
+        """
+        # ~~~ Logs the output message to history ~~~
+        self._log_message(output_message)
+
+        # ~~~ Process the output ~~~
+        output_data = copy.deepcopy(output_message.data["output_data"])
+        if output_interface is not None:
+            output_data = output_interface(goal=f"[Output] {goal}", data_dict=output_data, src_flow=flow, dst_flow=self)
+
+        return output_data
+
     def _call_flow_from_state(
         self,
         goal: str,
@@ -77,22 +189,46 @@ class CompositeFlow(Flow, ABC):
         :rtype: Tuple[OutputMessage, Dict[str, Any]]
         """
         # ~~~ Prepare the data for the call ~~~
-
-        if input_interface is not None:
-            payload = input_interface(goal=f"[Input] {goal}", data_dict=self.flow_state, src_flow=self, dst_flow=flow)
-
-        input_message = self._package_input_message(payload=payload, dst_flow=flow)
+        input_message = self._package_input_message_from_state(goal=goal, input_interface=input_interface, flow=flow)
 
         # ~~~ Execute the call ~~~
         output_message = flow(input_message)
 
-        # ~~~ Logs the output message to history ~~~
-        self._log_message(output_message)
+        output_data = self._process_output_message(
+            goal=goal, output_message=output_message, flow=flow, output_interface=output_interface
+        )
 
-        # ~~~ Process the output ~~~
-        output_data = copy.deepcopy(output_message.data["output_data"])
-        if output_interface is not None:
-            output_data = output_interface(goal=f"[Output] {goal}", data_dict=output_data, src_flow=flow, dst_flow=self)
+        return output_message, output_data
+
+    async def _acall_flow_from_state(
+        self,
+        goal: str,
+        input_interface,
+        flow,
+        output_interface,
+    ):
+        """Asynchronous counterpart of `_call_flow_from_state`. The given flow is called with `acall`.
+
+        :param goal: The goal of the flow's call
+        :type goal: str
+        :param input_interface: The input interface of the flow
+        :type input_interface: Callable
+        :param flow: The flow to call
+        :type flow: Flow
+        :param output_interface: The output interface of the flow
+        :type output_interface: Callable
+        :return: The output message and the output data
+        :rtype: Tuple[OutputMessage, Dict[str, Any]]
+        """
+        # ~~~ Prepare the data for the call ~~~
+        input_message = self._package_input_message_from_state(goal=goal, input_interface=input_interface, flow=flow)
+
+        # ~~~ Execute the call ~~~
+        output_message = await flow.acall(input_message)
+
+        output_data = self._process_output_message(
+            goal=goal, output_message=output_message, flow=flow, output_interface=output_interface
+        )
 
         return output_message, output_data
 
@@ -106,9 +242,30 @@ class CompositeFlow(Flow, ABC):
         """
         return self.subflows.get(subflow_name, None)
 
+    @classmethod
+    def _instantiate_subflow(cls, subflow_name: str, subflow_config: Dict[str, Any]) -> Flow:
+        """Instantiates a subflow from its configuration.
+
+        :param subflow_name: The name of the subflow
+        :type subflow_name: str
+        :param subflow_config: The configuration of the subflow
+        :type subflow_config: Dict[str, Any]
+        :return: The subflow
+        :rtype: Flow
+        """
+        assert "_target_" in subflow_config
+        if subflow_config["_target_"].startswith("."):
+            cls_parent_module = ".".join(cls.__module__.split(".")[:-1])
+            subflow_config["_target_"] = cls_parent_module + subflow_config["_target_"]
+
+        flow_obj = hydra.utils.instantiate(subflow_config, _convert_="partial", _recursive_=False)
+        flow_obj.flow_config["name"] = subflow_name
+        return flow_obj
+
     @classmethod
     def _set_up_subflows(cls, config):
-        """Instantiates the subflows from their configurations.
+        """Instantiates the subflows from their configurations. If `lazy_subflows` is True in the configuration,
+        the subflows are only instantiated on first access.
 
         :param config: The configuration of the flow. It must usually contain the following keys:
             - "subflows_config" (Dict[str,Any]): A dictionary of subflows configurations.The keys are the names of the subflows and the values are the configurations of the subflows.
@@ -117,18 +274,14 @@ class CompositeFlow(Flow, ABC):
         :return: A dictionary of subflows. The keys are the names of the subflows and the values are the subflows.
         :rtype: Dict[str, Flow]
         """
-        subflows = dict()
         subflows_config = config["subflows_config"]
 
-        for subflow_name, subflow_config in subflows_config.items():
-            assert "_target_" in subflow_config
-            if subflow_config["_target_"].startswith("."):
-                cls_parent_module = ".".join(cls.__module__.split(".")[:-1])
-                subflow_config["_target_"] = cls_parent_module + subflow_config["_target_"]
+        if config.get("lazy_subflows", False):
+            return LazySubflows(subflows_config, cls._instantiate_subflow)
 
-            flow_obj = hydra.utils.instantiate(subflow_config, _convert_="partial", _recursive_=False)
-            flow_obj.flow_config["name"] = subflow_name
-            subflows[subflow_name] = flow_obj
+        subflows = dict()
+        for subflow_name, subflow_config in subflows_config.items():
+            subflows[subflow_name] = cls._instantiate_subflow(subflow_name, subflow_config)
 
         return subflows
 
@@ -148,6 +301,19 @@ class CompositeFlow(Flow, ABC):
 
         return cls(**kwargs)
 
+    def clone(self) -> "CompositeFlow":
+        """Returns a clone of the flow (see `Flow.clone`). The (instantiated) subflows are cloned recursively.
+
+        :return: The clone of the flow
+        :rtype: CompositeFlow
+        """
+        clone = super().clone()
+        if isinstance(self.subflows, LazySubflows):
+            clone.subflows = self.subflows.clone()
+        else:
+            clone.subflows = {subflow_name: subflow.clone() for subflow_name, subflow in self.subflows.items()}
+        return clone
+
     def _to_string(self, indent_level=0):
         """Generates a string representation of the flow
 
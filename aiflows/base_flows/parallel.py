@@ -0,0 +1,272 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+from aiflows.base_flows import CircularFlow, Flow
+from aiflows.messages import InputMessage, OutputMessage
+from aiflows.utils.general_helpers import validate_flow_config
+from ..utils import logging
+
+log = logging.get_logger(__name__)
+
+
+class ParallelFlow(CircularFlow):
+    """This class implements a parallel flow. It is a flow that consists of multiple independent sub-flows that are executed concurrently.
+    It is a child class of CircularFlow, with the same topology, but all the nodes of the topology are executed at once (once):
+    their input messages are built from the same flow state, the subflows run concurrently (on a thread pool with `run`,
+    on the event loop with `arun`), and their outputs are merged into the flow state in the order of the topology once all
+    of them are completed (so the merge is deterministic: when two subflows output the same key, the last one in the topology wins).
+
+    :param flow_config: The configuration of the flow. It must usually contain the following keys:
+        - "subflows_config" (Dict[str,Any]): A dictionary of subflows configurations.The keys are the names of the subflows and the values are the configurations of the subflows.
+        This is necessary when instantiating the flow from a config file.
+        - "max_workers" (int): The maximum number of threads running the subflows with `run` (None for one thread per subflow). Default: None
+        - "timeout" (float): The maximum time (in seconds) a subflow can take, measured from the start of the parallel run
+        (None for no timeout). It can be overridden per node with the "timeout" key of the node in the topology. Default: None
+        - "failure_policy" (str): What to do when a subflow fails or times out: "raise" raises the error (once all the subflows are
+        completed), "skip" logs the error and merges the outputs of the other subflows. It can be overridden per node with the
+        "failure_policy" key of the node in the topology. Default: "raise"
+        - "failed_branches_key" (str): If provided, the errors of the skipped subflows (a dictionary mapping the name of the subflow
+        to its error) are written to the flow state under this key. Default: None
+        - The parameters required by the constructor of the parent class Flow
+    :type flow_config: Dict[str, Any]
+
+    Note that a thread cannot be interrupted: with `run`, a subflow that times out keeps running in its thread (its output is
+    discarded). Until it completes, the parallel flow cannot be run nor recursively reset (a RuntimeError is raised), and
+    once it completes the subflow is fully reset before the next run. With `arun`, a subflow that times out is cancelled, which
+    stops the subflows with a native `arun` but not the ones executed in a worker thread (see `Flow.arun`).
+    :param subflows: A list of subflows. This is necessary when instantiating the flow programmatically.
+    :type subflows: List[Flow]
+    """
+
+    FAILURE_POLICIES = ["raise", "skip"]
+
+    __default_flow_config = {
+        "max_rounds": 1,
+        "max_workers": None,
+        "timeout": None,
+        "failure_policy": "raise",
+        "failed_branches_key": None,
+    }
+
+    def __init__(
+        self,
+        flow_config: Dict[str, Any],
+        subflows: List[Flow],
+    ):
+        # ~~~ The futures of the subflows that timed out while running with `run` (by node index) ~~~
+        self._abandoned_nodes: Dict[int, Future] = {}
+        super().__init__(flow_config=flow_config, subflows=subflows)
+
+        flow_names = [node.flow_name for node in self.topology]
+        if len(set(flow_names)) != len(flow_names):
+            raise ValueError(
+                f"Each subflow can appear only once in the topology of the parallel flow {self.flow_config['name']}"
+            )
+
+    @classmethod
+    def type(cls):
+        """Returns the type of the flow."""
+        return "parallel"
+
+    @classmethod
+    def _validate_flow_config(cls, kwargs):
+        """Validates the flow config. It raises an error if the flow config is invalid. (i.e. it's invalid if a failure policy is unknown)"""
+        validate_flow_config(cls, kwargs)
+
+        failure_policies = [kwargs.get("failure_policy", "raise")]
+        failure_policies += [node["failure_policy"] for node in kwargs.get("topology", []) if "failure_policy" in node]
+        for failure_policy in failure_policies:
+            assert (
+                failure_policy in cls.FAILURE_POLICIES
+            ), f"Unknown failure policy {failure_policy}, should be one of {cls.FAILURE_POLICIES}."
+
+    def clone(self) -> "ParallelFlow":
+        """Returns a clone of the flow (see `CircularFlow.clone`). The subflows of the clone are not abandoned.
+
+        :return: The clone of the flow
+        :rtype: ParallelFlow
+        """
+        clone = super().clone()
+        clone._abandoned_nodes = {}
+        return clone
+
+    def reset(self, full_reset: bool, recursive: bool, src_flow: Optional[Union[Flow, str]] = "Launcher"):
+        """Resets the flow (see `Flow.reset`). If `recursive` is True, it raises a RuntimeError if a subflow that timed out
+        is still running."""
+        if recursive:
+            self._release_abandoned_nodes()
+        super().reset(full_reset=full_reset, recursive=recursive, src_flow=src_flow)
+
+    def _release_abandoned_nodes(self):
+        """Fully resets the subflows that timed out in a previous run (with `run`) and have completed since then.
+
+        :raises RuntimeError: If one of these subflows is still running (it cannot be used until it completes)
+        """
+        for node_idx, future in self._abandoned_nodes.items():
+            if not future.done():
+                raise RuntimeError(
+                    f"[{self.flow_config['name']}] Subflow {self.topology[node_idx].flow.name} timed out in a previous "
+                    f"run and is still running, the flow cannot be used until it completes."
+                )
+
+        # ~~~ The state of these subflows is the one left by the abandoned call ~~~
+        for node_idx in self._abandoned_nodes:
+            self.topology[node_idx].flow.reset(full_reset=True, recursive=True)
+        self._abandoned_nodes = {}
+
+    def _get_node_parameter(self, node_idx: int, key: str) -> Any:
+        """Returns a parameter of a node of the topology (e.g. its timeout), defaulting to the parameter of the flow."""
+        return self.flow_config["topology"][node_idx].get(key, self.flow_config.get(key, None))
+
+    def _package_input_messages(self) -> List[InputMessage]:
+        """Packages the input messages of all the nodes of the topology from the (same) flow state.
+
+        :return: The input messages (in the order of the topology)
+        :rtype: List[InputMessage]
+        """
+        return [
+            self._package_input_message_from_state(goal=node.goal, input_interface=node.input_interface, flow=node.flow)
+            for node in self.topology
+        ]
+
+    def run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Runs the parallel flow. The subflows are executed concurrently on a thread pool.
+
+        :param input_data: The input data dictionary
+        :type input_data: Dict[str, Any]
+        :return: The output data dictionary
+        :rtype: Dict[str, Any]
+        """
+        self._release_abandoned_nodes()
+
+        # ~~~ sets the input_data in the flow_state dict ~~~
+        self._state_update_dict(update_data=input_data)
+
+        input_messages = self._package_input_messages()
+
+        max_workers = self.flow_config["max_workers"] or len(self.topology)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        start_time = time.monotonic()
+        try:
+            futures = [
+                executor.submit(node.flow, input_message) for node, input_message in zip(self.topology, input_messages)
+            ]
+            results = [self._wait_for_node(node_idx, future, start_time) for node_idx, future in enumerate(futures)]
+        finally:
+            # ~~~ the subflows that timed out are not waited for ~~~
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self._merge_results(results)
+
+        return self._get_output_from_state()
+
+    def _wait_for_node(
+        self, node_idx: int, future: Future, start_time: float
+    ) -> Tuple[Optional[OutputMessage], Optional[Exception]]:
+        """Waits for the output message of a node (executed on the thread pool) until its timeout.
+
+        :param node_idx: The index of the node in the topology
+        :type node_idx: int
+        :param future: The future of the call of the node's flow
+        :type future: Future
+        :param start_time: The (monotonic) time at which the parallel run started
+        :type start_time: float
+        :return: The output message of the node and the error that occurred (if any)
+        :rtype: Tuple[Optional[OutputMessage], Optional[Exception]]
+        """
+        timeout = self._get_node_parameter(node_idx, "timeout")
+        if timeout is not None:
+            timeout = max(0.0, start_time + timeout - time.monotonic())
+
+        try:
+            return future.result(timeout=timeout), None
+        except FutureTimeoutError:
+            if not future.cancel():
+                # ~~~ the subflow is running and cannot be interrupted ~~~
+                self._abandoned_nodes[node_idx] = future
+            return None, TimeoutError(f"Subflow {self.topology[node_idx].flow.name} timed out.")
+        except Exception as e:
+            return None, e
+
+    async def arun(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Asynchronous counterpart of `run`. The subflows are awaited concurrently (with `acall`) on the event loop.
+
+        :param input_data: The input data dictionary
+        :type input_data: Dict[str, Any]
+        :return: The output data dictionary
+        :rtype: Dict[str, Any]
+        """
+        if type(self).run is not ParallelFlow.run:
+            # ~~~ a subclass customized the synchronous logic, it is executed as is ~~~
+            return await super().arun(input_data)
+
+        self._release_abandoned_nodes()
+
+        # ~~~ sets the input_data in the flow_state dict ~~~
+        self._state_update_dict(update_data=input_data)
+
+        input_messages = self._package_input_messages()
+
+        results = await asyncio.gather(
+            *[self._acall_node(node_idx, input_message) for node_idx, input_message in enumerate(input_messages)]
+        )
+
+        self._merge_results(results)
+
+        return self._get_output_from_state()
+
+    async def _acall_node(
+        self, node_idx: int, input_message: InputMessage
+    ) -> Tuple[Optional[OutputMessage], Optional[Exception]]:
+        """Calls the flow of a node (with `acall`), cancelling it after its timeout.
+
+        :param node_idx: The index of the node in the topology
+        :type node_idx: int
+        :param input_message: The input message of the node
+        :type input_message: InputMessage
+        :return: The output message of the node and the error that occurred (if any)
+        :rtype: Tuple[Optional[OutputMessage], Optional[Exception]]
+        """
+        node = self.topology[node_idx]
+        try:
+            output_message = await asyncio.wait_for(
+                node.flow.acall(input_message), timeout=self._get_node_parameter(node_idx, "timeout")
+            )
+            return output_message, None
+        except asyncio.TimeoutError:
+            return None, TimeoutError(f"Subflow {node.flow.name} timed out.")
+        except Exception as e:
+            return None, e
+
+    def _merge_results(self, results: List[Tuple[Optional[OutputMessage], Optional[Exception]]]):
+        """Merges the outputs of the nodes into the flow state, in the order of the topology, and applies the failure policies.
+
+        :param results: The output message and the error of each node of the topology
+        :type results: List[Tuple[Optional[OutputMessage], Optional[Exception]]]
+        """
+        # ~~~ Apply the failure policies ~~~
+        failed_branches = {}
+        for node_idx, (node, (_, error)) in enumerate(zip(self.topology, results)):
+            if error is None:
+                continue
+            if self._get_node_parameter(node_idx, "failure_policy") == "raise":
+                raise error
+            log.error(f"[{self.flow_config['name']}] Subflow {node.flow.name} failed and is skipped: {error}")
+            failed_branches[node.flow.name] = str(error)
+
+        if self.flow_config["failed_branches_key"] is not None:
+            self._state_update_dict(update_data={self.flow_config["failed_branches_key"]: failed_branches})
+
+        # ~~~ Merge the outputs ~~~
+        for node, (output_message, error) in zip(self.topology, results):
+            if error is not None:
+                continue
+
+            output_data = self._process_output_message(
+                goal=node.goal, output_message=output_message, flow=node.flow, output_interface=node.output_interface
+            )
+            if self._on_node_completed(node=node, output_data=output_data):
+                return
@@ -1,3 +1,4 @@
+from .abstract import DataTransformation, rows_to_columns, columns_to_rows
 from .key_rename import KeyRename
 from .key_copy import KeyCopy
 from .key_set import KeySet
@@ -1,5 +1,41 @@
 from abc import ABC
-from typing import Dict, Any
+from collections.abc import Mapping
+from typing import Dict, Any, List, Union
+
+from aiflows.utils.frozen import thaw
+
+# ~~~ A batch of data dictionaries: a list of rows (data dictionaries) or columns (a dictionary of lists) ~~~
+Batch = Union[List[Dict[str, Any]], Dict[str, List[Any]]]
+
+
+def rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Converts a list of data dictionaries (with the same keys) to a dictionary of columns.
+
+    :param rows: The data dictionaries
+    :type rows: List[Dict[str, Any]]
+    :return: The columns
+    :rtype: Dict[str, List[Any]]
+    """
+    if len(rows) == 0:
+        return {}
+    return {key: [row[key] for row in rows] for key in rows[0].keys()}
+
+
+def columns_to_rows(columns: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Converts a dictionary of columns (of the same length) to a list of data dictionaries.
+
+    :param columns: The columns
+    :type columns: Dict[str, List[Any]]
+    :return: The data dictionaries
+    :rtype: List[Dict[str, Any]]
+    """
+    keys = list(columns.keys())
+    return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+
+def get_num_rows(columns: Dict[str, List[Any]]) -> int:
+    """Returns the number of rows of a dictionary of columns."""
+    return len(next(iter(columns.values()))) if len(columns) > 0 else 0
 
 
 class DataTransformation(ABC):
@@ -23,3 +59,28 @@ class DataTransformation(ABC):
         :rtype: Dict[str, Any]
         """
         raise NotImplementedError
+
+    def apply_batch(self, batch: Batch, **kwargs) -> Batch:
+        r"""Applies the transformation to a batch of data dictionaries, given as a list of rows (which, as with `__call__`,
+        may be modified in place) or as columns (a dictionary of lists, which is not modified). The batch is returned
+        in the same format.
+
+        :param batch: The batch to apply the transformation to
+        :type batch: Union[List[Dict[str, Any]], Dict[str, List[Any]]]
+        :param \**kwargs: Arbitrary keyword arguments
+        :return: The transformed batch
+        :rtype: Union[List[Dict[str, Any]], Dict[str, List[Any]]]
+        """
+        if isinstance(batch, Mapping):
+            return self._apply_to_columns(dict(batch), **kwargs)
+        return self._apply_to_rows(batch, **kwargs)
+
+    def _apply_to_rows(self, data_dicts: List[Dict[str, Any]], **kwargs) -> List[Dict[str, Any]]:
+        """Applies the transformation to a list of data dictionaries."""
+        return [self(data_dict=data_dict, **kwargs) for data_dict in data_dicts]
+
+    def _apply_to_columns(self, columns: Dict[str, List[Any]], **kwargs) -> Dict[str, List[Any]]:
+        """Applies the transformation to a (shallow copy of a) dictionary of columns. Transformations with a bulk
+        implementation override this method, the default implementation applies the transformation row by row
+        (on a mutable deep copy of the rows, since the transformation may modify them in place)."""
+        return rows_to_columns(self._apply_to_rows(thaw(columns_to_rows(columns)), **kwargs))
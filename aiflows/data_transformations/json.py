@@ -1,5 +1,5 @@
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 
 from .abstract import DataTransformation
 
@@ -33,6 +33,12 @@ class Json2Obj(DataTransformation):
 
         return data_dict
 
+    def _apply_to_columns(self, columns: Dict[str, List[Any]], **kwargs) -> Dict[str, List[Any]]:
+        """Parses the column row by row (each row must be a valid JSON document on its own)."""
+        loads = json.loads
+        columns[self.output_key] = [loads(json_string) for json_string in columns[self.input_key]]
+        return columns
+
 
 class Obj2Json(DataTransformation):
     """This class converts a Python object to a JSON string.
@@ -61,3 +67,9 @@ class Obj2Json(DataTransformation):
         data_dict[self.output_key] = json.dumps(data_dict[self.input_key])
 
         return data_dict
+
+    def _apply_to_columns(self, columns: Dict[str, List[Any]], **kwargs) -> Dict[str, List[Any]]:
+        """Serializes the column."""
+        dumps = json.dumps
+        columns[self.output_key] = [dumps(obj) for obj in columns[self.input_key]]
+        return columns
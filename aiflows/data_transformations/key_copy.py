@@ -1,5 +1,5 @@
 import copy
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 from aiflows.data_transformations.abstract import DataTransformation
 from aiflows.utils.general_helpers import flatten_dict, unflatten_dict
@@ -39,3 +39,20 @@ class KeyCopy(DataTransformation):
             data_dict = unflatten_dict(data_dict)
 
         return data_dict
+
+    def _apply_to_columns(self, columns: Dict[str, List[Any]], **kwargs) -> Dict[str, List[Any]]:
+        """Copies the columns. With a flattened data dictionary, only leaves can be copied, so the columns containing
+        dictionaries (and the nested keys) are processed row by row."""
+        if self.flatten_data_dict and any(
+            "." in old_key
+            or "." in new_key
+            or old_key in columns
+            and any(isinstance(value, dict) for value in columns[old_key])
+            for old_key, new_key in self.old_key2new_key.items()
+        ):
+            return super()._apply_to_columns(columns, **kwargs)
+
+        for old_key, new_key in self.old_key2new_key.items():
+            if old_key in columns:
+                columns[new_key] = copy.deepcopy(columns[old_key])
+        return columns
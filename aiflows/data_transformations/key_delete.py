@@ -41,3 +41,16 @@ class KeyDelete(DataTransformation):
             data_dict = unflatten_dict(data_dict)
 
         return data_dict
+
+    def _apply_to_columns(self, columns: Dict[str, List[Any]], **kwargs) -> Dict[str, List[Any]]:
+        """Deletes the columns. With a flattened data dictionary, only leaves can be deleted, so the columns containing
+        dictionaries (and the nested keys) are processed row by row."""
+        if self.flatten_data_dict and any(
+            "." in key or key in columns and any(isinstance(value, dict) for value in columns[key])
+            for key in self.keys_to_delete
+        ):
+            return super()._apply_to_columns(columns, **kwargs)
+
+        for key in self.keys_to_delete:
+            columns.pop(key, None)
+        return columns
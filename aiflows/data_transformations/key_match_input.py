@@ -1,4 +1,4 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 from aiflows.data_transformations.abstract import DataTransformation
 
@@ -24,3 +24,8 @@ class KeyMatchInput(DataTransformation):
         data_dict = {key: data_dict[key] for key in input_keys}
 
         return data_dict
+
+    def _apply_to_columns(self, columns: Dict[str, List[Any]], **kwargs) -> Dict[str, List[Any]]:
+        """Selects the columns required by the destination flow."""
+        input_keys = kwargs["dst_flow"].get_interface_description()["input"]
+        return {key: columns[key] for key in input_keys}
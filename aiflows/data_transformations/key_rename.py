@@ -1,4 +1,4 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 from aiflows.data_transformations.abstract import DataTransformation
 from aiflows.utils.general_helpers import nested_keys_search, nested_keys_update, nested_keys_pop
@@ -46,3 +46,15 @@ class KeyRename(DataTransformation):
                     data_dict[new_key] = data_dict.pop(old_key)
 
         return data_dict
+
+    def _apply_to_columns(self, columns: Dict[str, List[Any]], **kwargs) -> Dict[str, List[Any]]:
+        """Renames the columns (nested keys are renamed row by row)."""
+        if self.nested_keys and any(
+            "." in key for key in [*self.old_key2new_key.keys(), *self.old_key2new_key.values()]
+        ):
+            return super()._apply_to_columns(columns, **kwargs)
+
+        for old_key, new_key in self.old_key2new_key.items():
+            if old_key != new_key and old_key in columns:
+                columns[new_key] = columns.pop(old_key)
+        return columns
@@ -44,3 +44,13 @@ class KeySelect(DataTransformation):
                 data_dict_to_return[key] = data_dict[key]
 
         return data_dict_to_return
+
+    def _apply_to_columns(self, columns: Dict[str, List[Any]], **kwargs) -> Dict[str, List[Any]]:
+        """Selects the columns (nested keys are selected row by row)."""
+        if self.nested_keys and any("." in key for key in self.keys_to_select):
+            return super()._apply_to_columns(columns, **kwargs)
+
+        for key in self.keys_to_select:
+            if key not in columns:
+                raise KeyError(f"Key {key} not found in the columns {list(columns.keys())}")
+        return {key: columns[key] for key in self.keys_to_select}
@@ -1,6 +1,6 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 
-from aiflows.data_transformations.abstract import DataTransformation
+from aiflows.data_transformations.abstract import DataTransformation, get_num_rows
 from aiflows.utils.general_helpers import flatten_dict, unflatten_dict
 from aiflows.utils.logging import get_logger
 
@@ -40,3 +40,13 @@ class KeySet(DataTransformation):
             data_dict = unflatten_dict(data_dict)
 
         return data_dict
+
+    def _apply_to_columns(self, columns: Dict[str, List[Any]], **kwargs) -> Dict[str, List[Any]]:
+        """Sets the columns (nested keys are set row by row)."""
+        if self.flatten_data_dict and any("." in key for key in self.key2value.keys()):
+            return super()._apply_to_columns(columns, **kwargs)
+
+        num_rows = get_num_rows(columns)
+        for key, value in self.key2value.items():
+            columns[key] = [value] * num_rows
+        return columns
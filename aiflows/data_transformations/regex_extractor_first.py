@@ -1,6 +1,6 @@
 import re
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple, Union
 
 from aiflows.data_transformations.abstract import DataTransformation
 
@@ -12,6 +12,9 @@ log = logging.get_logger(__name__)
 class RegexFirstOccurrenceExtractor(DataTransformation):
     """This class extracts the first occurrence of a regex from a given input key and saves it to the output key.
 
+    The regex and the fallback regexes are compiled once, at construction. The search can be restricted to the first
+    and/or the last characters of the text (e.g. when the answer is expected at the end of a long completion).
+
     :param regex: The regex to search for
     :type regex: str
     :param output_key: The output key to save the transformed data to
@@ -22,10 +25,18 @@ class RegexFirstOccurrenceExtractor(DataTransformation):
     :type strip: bool, optional
     :param input_key: The input key to apply the transformation to
     :type input_key: str
-    :param regex_fallback: A regex to use if the first regex was not found
-    :type regex_fallback: str, optional
+    :param regex_fallback: A regex (or a list of regexes, tried in order) to use if the first regex was not found
+    :type regex_fallback: Union[str, List[str]], optional
     :param match_group: The match group to return
     :type match_group: int, optional
+    :param head_chars: If provided, only the first `head_chars` characters of the text are searched
+    :type head_chars: int, optional
+    :param tail_chars: If provided, only the last `tail_chars` characters of the text are searched
+        (if `head_chars` is also provided, the head is searched before the tail)
+    :type tail_chars: int, optional
+    :param matched_regex_key: If provided, the index of the regex that was found (0 for the regex, i for the i-th fallback
+        regex, None if no regex was found) is saved to this key
+    :type matched_regex_key: str, optional
     """
 
     def __init__(
@@ -35,16 +46,28 @@ class RegexFirstOccurrenceExtractor(DataTransformation):
         assert_unique: bool,
         strip: bool,
         input_key: str,
-        regex_fallback: str = None,
+        regex_fallback: Union[str, List[str]] = None,
         match_group: int = 0,
+        head_chars: Optional[int] = None,
+        tail_chars: Optional[int] = None,
+        matched_regex_key: Optional[str] = None,
     ):
         super().__init__(output_key=output_key)
         self.input_key = input_key
         self.regex = regex
+        if isinstance(regex_fallback, str):
+            regex_fallback = [regex_fallback]
         self.regex_fallback = regex_fallback
         self.strip = strip
         self.assert_unique = assert_unique
         self.match_group = match_group
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.matched_regex_key = matched_regex_key
+
+        # ~~~ The regex followed by the fallback regexes, by decreasing priority ~~~
+        self._regexes = [regex] + list(regex_fallback or [])
+        self._patterns = [re.compile(r) for r in self._regexes]
 
     def __call__(self, data_dict: Dict[str, Any], **kwargs) -> Dict[str, Any]:
         """Applies the transformation to the given data dictionary. It extracts the first occurrence of a regex from a given input key and saves it to the output key.
@@ -55,39 +78,71 @@ class RegexFirstOccurrenceExtractor(DataTransformation):
         :rtype: Dict[str, Any]
         """
 
-        txt = self._search(data_dict[self.input_key], self.regex)
+        regex_idx, txt = self._extract(data_dict[self.input_key])
+        data_dict[self.output_key] = txt
+        if self.matched_regex_key is not None:
+            data_dict[self.matched_regex_key] = regex_idx
+        return data_dict
 
-        if txt is None and self.regex_fallback:
-            if isinstance(self.regex_fallback, str):
-                self.regex_fallback = [self.regex_fallback]
+    def _apply_to_columns(self, columns: Dict[str, List[Any]], **kwargs) -> Dict[str, List[Any]]:
+        """Extracts the first occurrence of the regex from every text of the column."""
+        results = [self._extract(text) for text in columns[self.input_key]]
+        columns[self.output_key] = [txt for _, txt in results]
+        if self.matched_regex_key is not None:
+            columns[self.matched_regex_key] = [regex_idx for regex_idx, _ in results]
+        return columns
+
+    def _get_search_windows(self, text: str) -> List[Tuple[int, int]]:
+        """Returns the (start, end) windows of the text to search in."""
+        if self.head_chars is None and self.tail_chars is None:
+            return [(0, len(text))]
+
+        windows = []
+        if self.head_chars is not None:
+            windows.append((0, min(self.head_chars, len(text))))
+        if self.tail_chars is not None:
+            tail_start = max(0, len(text) - self.tail_chars)
+            if len(windows) > 0 and tail_start <= windows[0][1]:
+                # ~~~ the head and the tail overlap, the whole text is searched ~~~
+                return [(0, len(text))]
+            windows.append((tail_start, len(text)))
+        return windows
+
+    def _extract(self, text: str) -> Tuple[Optional[int], Optional[str]]:
+        """Extracts the first occurrence of the regex (or of the first successful fallback regex) from a text.
+
+        :param text: The text to search in
+        :type text: str
+        :return: The index of the regex that was found and its (stripped) first occurrence (None, None if no regex was found)
+        :rtype: Tuple[Optional[int], Optional[str]]
+        """
+        windows = self._get_search_windows(text)
 
-            for fallback_regex in self.regex_fallback:
-                txt = self._search(data_dict[self.input_key], fallback_regex)
-                if txt is not None:
-                    log.info(f"Regex {self.regex} was not found, but {fallback_regex} was successful.")
+        for regex_idx, pattern in enumerate(self._patterns):
+            for start, end in windows:
+                match = pattern.search(text, start, end)
+                if match:
                     break
+            else:
+                continue
 
-        if txt is not None and self.strip:
-            txt = txt.strip()
+            # ~~~ A match whose group did not participate (e.g. an optional group) counts as not found ~~~
+            txt = self._get_match_group(match, self._regexes[regex_idx])
+            if txt is None:
+                continue
 
-        data_dict[self.output_key] = txt
-        return data_dict
+            if regex_idx > 0:
+                log.info(f"Regex {self.regex} was not found, but {self._regexes[regex_idx]} was successful.")
 
-    def _search(self, message, regex):
-        """Searches for a regex in a message and returns the first match.
+            if self.strip:
+                txt = txt.strip()
+            return regex_idx, txt
 
-        :param message: The message to search in
-        :type message: str
-        :param regex: The regex to search for
-        :type regex: str
-        :return: The first match
-        :rtype: str
-        """
-        match = re.search(regex, message)
-        if match:
-            if self.assert_unique:
-                num_matches = len(match.groups())
-                assert num_matches == 1, f"Regex {regex} expected to have only one group, found {num_matches}"
-            return match.group(self.match_group)
-        else:
-            return None
+        return None, None
+
+    def _get_match_group(self, match: re.Match, regex: str) -> str:
+        """Returns the `match_group` group of a match of the given regex."""
+        if self.assert_unique:
+            num_matches = len(match.groups())
+            assert num_matches == 1, f"Regex {regex} expected to have only one group, found {num_matches}"
+        return match.group(self.match_group)
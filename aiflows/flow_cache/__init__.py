@@ -1 +1,10 @@
-from .flow_cache import FlowCache, CachingKey, CachingValue, CACHING_PARAMETERS, clear_cache
+from .flow_cache import (
+    FlowCache,
+    FlowCacheNamespace,
+    CachingKey,
+    CachingValue,
+    CACHING_PARAMETERS,
+    clear_cache,
+    get_flow_cache,
+    canonical_hash,
+)
@@ -1,9 +1,18 @@
 import os
+import json
+import time
+import atexit
+import asyncio
+import pickle
 import hashlib
 import threading
+import weakref
+from queue import Queue
+from collections import OrderedDict
+from collections.abc import Mapping, Set
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Any
-from diskcache import Index
+from typing import Dict, List, Optional, Any, Tuple, Union
+from diskcache import Cache
 from aiflows.utils import logging
 
 log = logging.get_logger(__name__)
@@ -19,12 +28,45 @@ class CACHING_PARAMETERS:
     :type do_caching: bool, optional
     :param cache_dir: The cache directory
     :type cache_dir: str, optional
+    :param max_memory_cache_bytes: The maximum size (in bytes) of the in-memory cache tier placed in front of the disk cache (0 disables it)
+    :type max_memory_cache_bytes: int, optional
+    :param write_behind: Whether the writes to the disk cache are done in a background thread (write-behind) instead of synchronously (write-through)
+    :type write_behind: bool, optional
+    :param max_cache_bytes: The maximum size (in bytes) of the disk cache
+    :type max_cache_bytes: int, optional
+    :param eviction_policy: The policy used to evict entries when the size limit (max_cache_bytes) is reached
+        ("least-recently-used", "least-frequently-used", "least-recently-stored" or "none"). The entry count limits
+        (max_cached_entries and flow_class_quotas) evict the entries following the same policy (unless it is "none"). The order
+        of the entries is tracked by the process: the entries stored before the cache is opened (e.g. by a previous run) start
+        in the order in which they were stored, with no hits
+    :type eviction_policy: str, optional
+    :param ttl: The time to live (in seconds) of the cached entries (None for no expiration)
+    :type ttl: float, optional
+    :param flow_class_quotas: The maximum number of cached entries per flow class (e.g. {"ChatAtomicFlow": 1000})
+    :type flow_class_quotas: Dict[str, int], optional
+    :param compaction_interval: The interval (in seconds) at which a background task removes the expired entries and enforces
+        the limits of the disk cache (None to disable the background task)
+    :type compaction_interval: float, optional
+    :param hash_function: The hashlib algorithm used to hash the caching keys (e.g. "sha256" or the faster "blake2b")
+    :type hash_function: str, optional
+    :param single_flight: Whether concurrent calls of a flow with the same caching key wait for the first call to complete
+        and reuse its result, instead of all running the flow
+    :type single_flight: bool, optional
     """
 
     # Global parameters that can be set before starting the outer-flow
     max_cached_entries: int = 10000
     do_caching: bool = True
     cache_dir: str = None
+    max_memory_cache_bytes: int = 64 * 1024 * 1024
+    write_behind: bool = False
+    max_cache_bytes: int = 2**30
+    eviction_policy: str = "least-recently-used"
+    ttl: Optional[float] = None
+    flow_class_quotas: Optional[Dict[str, int]] = None
+    compaction_interval: Optional[float] = None
+    hash_function: str = "sha256"
+    single_flight: bool = True
 
 
 CACHING_PARAMETERS.do_caching = os.getenv("FLOW_DISABLE_CACHE", "false").lower() == "false"
@@ -64,7 +106,12 @@ class CachingKey:
     keys_to_ignore_for_hash: List[str]
 
     def hash_string(self) -> str:
-        return _custom_hash(self.flow, self.input_data, self.keys_to_ignore_for_hash)
+        return canonical_hash(
+            self.flow.get_config_hash(),
+            self.flow.get_state_hashing_params(),
+            self.input_data,
+            self.keys_to_ignore_for_hash,
+        )
 
 
 def get_cache_dir() -> str:
@@ -81,32 +128,400 @@ def get_cache_dir() -> str:
     return os.path.abspath(os.path.join(current_dir, ".flow_cache"))
 
 
-def _custom_hash(*all_args):
-    """Returns a custom hash for the given arguments.
+def _to_canonical_json_value(obj: Any) -> Any:
+    """Converts an object that is not natively JSON serializable to a canonical JSON serializable value
+    (used as the `default` of `json.dumps`).
+
+    :param obj: The object
+    :type obj: Any
+    :return: The JSON serializable value
+    :rtype: Any
+    """
+    if isinstance(obj, (bytes, bytearray)):
+        return {"__bytes__": obj.hex()}
+    if isinstance(obj, Mapping):
+        return _with_canonical_keys(obj)
+    if isinstance(obj, Set):
+        return {"__set__": sorted(canonical_dumps(element) for element in obj)}
+    if isinstance(obj, (list, tuple)) or hasattr(obj, "__iter__") and hasattr(obj, "__len__"):
+        return _with_canonical_keys(list(obj))
+    if hasattr(obj, "to_dict"):
+        return _with_canonical_keys(obj.to_dict())
+    return {"__repr__": f"{type(obj).__qualname__}:{repr(obj)}"}
+
+
+def _with_canonical_keys(obj: Any) -> Any:
+    """Recursively converts the dictionaries whose keys are not all strings to sorted lists of (key, value) pairs, tagged
+    such that they are not confused with the dictionaries whose keys are strings (json would turn the key 1 into "1").
+
+    :param obj: The object
+    :type obj: Any
+    :return: The converted object
+    :rtype: Any
+    """
+    if isinstance(obj, Mapping):
+        if all(isinstance(key, str) for key in obj.keys()):
+            return {key: _with_canonical_keys(value) for key, value in obj.items()}
+        items = [(canonical_dumps(key), _with_canonical_keys(value)) for key, value in obj.items()]
+        return {"__items__": sorted(items, key=lambda item: item[0])}
+    if isinstance(obj, (list, tuple)):
+        return [_with_canonical_keys(element) for element in obj]
+    return obj
+
+
+# ~~~ The containers that json serializes natively ~~~
+_CONTAINER_TYPES = (dict, list, tuple)
+
+
+def _has_non_string_keys(obj: Any) -> bool:
+    """Returns whether the container contains a dictionary whose keys are not all strings.
+
+    :param obj: The container (a dictionary, a list or a tuple)
+    :type obj: Union[dict, list, tuple]
+    :return: Whether the object contains a dictionary whose keys are not all strings
+    :rtype: bool
+    """
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if not isinstance(key, str):
+                return True
+            if isinstance(value, _CONTAINER_TYPES) and _has_non_string_keys(value):
+                return True
+        return False
+
+    for element in obj:
+        if isinstance(element, _CONTAINER_TYPES) and _has_non_string_keys(element):
+            return True
+    return False
+
+
+def canonical_dumps(obj: Any) -> str:
+    """Returns a canonical serialization of the given object: logically equal objects give the same string,
+    independently of the order of the keys of their dictionaries. Floats are serialized with their shortest round-trip
+    representation and bytes with their hexadecimal representation.
+
+    :param obj: The object
+    :type obj: Any
+    :return: The canonical serialization
+    :rtype: str
+    """
+    # ~~~ the keys that are not strings are tagged (json would serialize {1: x} and {"1": x} identically) ~~~
+    if isinstance(obj, _CONTAINER_TYPES) and _has_non_string_keys(obj):
+        obj = _with_canonical_keys(obj)
+
+    return json.dumps(
+        obj,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=_to_canonical_json_value,
+    )
+
+
+def canonical_hash(*all_args) -> str:
+    """Returns the hash (computed with CACHING_PARAMETERS.hash_function) of the canonical serialization of the given arguments.
 
     :param \*all_args: The arguments
     :type \*all_args: Any
-    :return: The custom hash
+    :return: The hash
     :rtype: str
     """
-    _repr_args = []
-    for arg in all_args:
-        _repr_args.append(repr(arg))
-    return hashlib.sha256(repr(_repr_args).encode("utf-8")).hexdigest()
+    hasher = hashlib.new(CACHING_PARAMETERS.hash_function)
+    hasher.update(canonical_dumps(all_args).encode("utf-8", "surrogatepass"))
+    return hasher.hexdigest()
 
 
-class FlowCache:
-    """This class is the flow cache.
+class LRUMemoryCache:
+    """This class is an in-memory least-recently-used cache bounded by the total size (in bytes) of its entries.
+    The entries are stored pickled, such that every hit returns a fresh copy of the cached value (as the disk cache does).
+    It is not thread-safe, the caller is responsible for the locking.
+
+    :param max_bytes: The maximum total size (in bytes) of the entries
+    :type max_bytes: int
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the pickled value for the given key (and marks it as the most recently used), or None if it is not cached.
+
+        :param key: The key
+        :type key: str
+        :return: The pickled value
+        :rtype: Optional[bytes]
+        """
+        entry = self._entries.get(key, None)
+        if entry is None:
+            return None
+
+        data, expire_time = entry
+        if expire_time is not None and expire_time < time.time():
+            self.pop(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return data
+
+    def set(self, key: str, data: bytes, expire_time: Optional[float] = None):
+        """Sets the pickled value for the given key and evicts the least recently used entries if the cache is full.
+        Values larger than the cache are not stored.
+
+        :param key: The key
+        :type key: str
+        :param data: The pickled value
+        :type data: bytes
+        :param expire_time: The time (as returned by time.time()) at which the entry expires, defaults to None
+        :type expire_time: float, optional
+        """
+        self.pop(key)
+        if len(data) > self.max_bytes:
+            return
+
+        self._entries[key] = (data, expire_time)
+        self.num_bytes += len(data)
+        while self.num_bytes > self.max_bytes:
+            _, (evicted_data, _) = self._entries.popitem(last=False)
+            self.num_bytes -= len(evicted_data)
+
+    def pop(self, key: str) -> Optional[bytes]:
+        """Removes the given key from the cache.
+
+        :param key: The key
+        :type key: str
+        :return: The pickled value that was removed
+        :rtype: Optional[bytes]
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+
+        data, _ = entry
+        self.num_bytes -= len(data)
+        return data
+
+    def clear(self):
+        """Removes all the entries from the cache."""
+        self._entries.clear()
+        self.num_bytes = 0
+
+    def keys(self) -> List[str]:
+        """Returns the cached keys (from the least to the most recently used)."""
+        return list(self._entries.keys())
+
+    def __len__(self):
+        """Returns the number of cached entries."""
+        return len(self._entries)
+
+
+class EvictionOrder:
+    """This class tracks the order in which the entries of the disk cache are evicted when an entry count limit is reached,
+    following the eviction policy of the disk cache ("least-recently-used", "least-frequently-used" or "least-recently-stored").
+    The keys are grouped by number of hits (a single group unless the policy is "least-frequently-used") and every group
+    is ordered from the next key to evict to the last one. It is not thread-safe, the caller is responsible for the locking.
+
+    :param eviction_policy: The eviction policy
+    :type eviction_policy: str
+    """
+
+    def __init__(self, eviction_policy: str):
+        self.eviction_policy = eviction_policy
+        self._num_hits: Dict[str, int] = {}
+        self._groups: Dict[int, OrderedDict] = {}
 
-    :param index: The index
-    :type index: Index
-    :param \__lock: The lock
-    :type \__lock: threading.Lock
+    def _insert(self, key: str, num_hits: int):
+        """Inserts the key as the last one to evict among the keys with the same number of hits."""
+        self._num_hits[key] = num_hits
+        self._groups.setdefault(num_hits, OrderedDict())[key] = None
+
+    def on_stored(self, key: str):
+        """Registers that a value has been stored for the given key (as diskcache does, the number of hits is reset).
+
+        :param key: The key
+        :type key: str
+        """
+        self.remove(key)
+        self._insert(key, 0)
+
+    def on_hit(self, key: str):
+        """Registers a hit of the given key (ignored if the key is not tracked).
+
+        :param key: The key
+        :type key: str
+        """
+        num_hits = self._num_hits.get(key, None)
+        if num_hits is None or self.eviction_policy == "least-recently-stored":
+            return
+
+        if self.eviction_policy == "least-frequently-used":
+            self.remove(key)
+            self._insert(key, num_hits + 1)
+        else:
+            self._groups[num_hits].move_to_end(key)
+
+    def remove(self, key: str):
+        """Stops tracking the given key.
+
+        :param key: The key
+        :type key: str
+        """
+        num_hits = self._num_hits.pop(key, None)
+        if num_hits is None:
+            return
+
+        group = self._groups[num_hits]
+        del group[key]
+        if len(group) == 0:
+            del self._groups[num_hits]
+
+    def next_key(self) -> str:
+        """Returns the next key to evict (the order must not be empty)."""
+        return next(iter(self._groups[min(self._groups)]))
+
+    def keys(self) -> List[str]:
+        """Returns the tracked keys."""
+        return list(self._num_hits.keys())
+
+    def __len__(self):
+        """Returns the number of tracked keys."""
+        return len(self._num_hits)
+
+
+class Flight:
+    """A computation in progress of the value of a caching key. The callers that need the same key while it is being
+    computed join the flight (from a thread with `join`, from an asyncio task with `ajoin`) and read the value from the
+    cache once the flight has landed.
     """
 
     def __init__(self):
-        self._index = Index(get_cache_dir())
-        self.__lock = threading.Lock()
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def land(self):
+        """Marks the computation as completed (successfully or not) and wakes up the waiting callers."""
+        with self._lock:
+            self._event.set()
+            async_waiters, self._async_waiters = self._async_waiters, []
+
+        for loop, future in async_waiters:
+            loop.call_soon_threadsafe(_set_future_done, future)
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until the computation is completed.
+
+        :param timeout: The maximum time to wait (in seconds), defaults to None
+        :type timeout: float, optional
+        :return: Whether the computation is completed
+        :rtype: bool
+        """
+        return self._event.wait(timeout)
+
+    async def ajoin(self):
+        """Asynchronous counterpart of `join`. It waits without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._async_waiters.append((loop, future))
+        await future
+
+
+def _set_future_done(future: asyncio.Future):
+    """Sets the result of the future, unless it has been cancelled."""
+    if not future.done():
+        future.set_result(None)
+
+
+# ~~~ All the FlowCache objects of the process (used to flush the pending writes at exit and to clear the memory tiers) ~~~
+_flow_caches = weakref.WeakSet()
+
+# ~~~ The background compaction threads (one per cache directory) ~~~
+_compaction_threads: Dict[str, threading.Thread] = {}
+_compaction_threads_lock = threading.Lock()
+
+
+def _start_background_compaction(flow_cache: "FlowCache"):
+    """Starts the background compaction of the directory of the given cache, if it is enabled and not already running.
+
+    :param flow_cache: The flow cache
+    :type flow_cache: FlowCache
+    """
+    interval = CACHING_PARAMETERS.compaction_interval
+    if interval is None:
+        return
+
+    with _compaction_threads_lock:
+        if flow_cache.cache_dir in _compaction_threads:
+            return
+
+        thread = threading.Thread(target=_compaction_loop, args=(flow_cache, interval), daemon=True)
+        _compaction_threads[flow_cache.cache_dir] = thread
+        thread.start()
+
+
+def _compaction_loop(flow_cache: "FlowCache", interval: float):
+    """Periodically compacts the disk cache.
+
+    :param flow_cache: The flow cache
+    :type flow_cache: FlowCache
+    :param interval: The interval (in seconds) between two compactions
+    :type interval: float
+    """
+    while True:
+        time.sleep(interval)
+        try:
+            flow_cache.compact()
+        except Exception as e:
+            log.exception(e)
+
+
+class FlowCache:
+    """This class is the flow cache. It has two tiers: an in-memory LRU cache (bounded by CACHING_PARAMETERS.max_memory_cache_bytes)
+    in front of the disk cache. The writes to the disk cache are synchronous (write-through), or done in a background thread
+    if CACHING_PARAMETERS.write_behind is True.
+
+    The disk cache is bounded by CACHING_PARAMETERS.max_cached_entries, CACHING_PARAMETERS.max_cache_bytes and the optional
+    per-flow-class quotas (CACHING_PARAMETERS.flow_class_quotas). When a limit is reached, entries are evicted following
+    CACHING_PARAMETERS.eviction_policy (see `CACHING_PARAMETERS`), they also expire after CACHING_PARAMETERS.ttl seconds.
+    The entries evicted from the disk cache are also removed from the in-memory tier.
+
+    Use `get_flow_cache` to get the cache of the process instead of instantiating this class directly.
+
+    :param cache_dir: The cache directory, defaults to the directory returned by `get_cache_dir`
+    :type cache_dir: str, optional
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        if cache_dir is None:
+            cache_dir = get_cache_dir()
+        self.cache_dir = cache_dir
+        self.eviction_policy = CACHING_PARAMETERS.eviction_policy
+        self.max_cached_entries = CACHING_PARAMETERS.max_cached_entries
+        self.flow_class_quotas = CACHING_PARAMETERS.flow_class_quotas or {}
+        self.ttl = CACHING_PARAMETERS.ttl
+        self._disk_cache = Cache(
+            cache_dir,
+            eviction_policy=self.eviction_policy,
+            size_limit=CACHING_PARAMETERS.max_cache_bytes,
+        )
+        self.__lock = threading.RLock()
+        # ~~~ The eviction order of the entries of the disk cache, and of the entries of each flow class with a quota
+        # (tracked in-process to enforce the entry count limits, loaded from the disk cache on first use) ~~~
+        self._eviction_order: Optional[EvictionOrder] = None
+        self._quota_eviction_orders: Dict[str, EvictionOrder] = {}
+        self._memory_cache = LRUMemoryCache(max_bytes=CACHING_PARAMETERS.max_memory_cache_bytes)
+        self.write_behind = CACHING_PARAMETERS.write_behind
+        # ~~~ Pickled values (and their tags) waiting to be written to the disk cache (write-behind) ~~~
+        self._pending_writes: Dict[str, Tuple[bytes, Optional[str]]] = {}
+        self._write_queue: Optional[Queue] = None
+        # ~~~ The keys whose value is being computed (single-flight) ~~~
+        self._flights: Dict[str, Flight] = {}
+        _flow_caches.add(self)
+        _start_background_compaction(self)
 
     def get(self, key: str) -> Optional[CachingValue]:
         """Returns the cached value for the given key.
@@ -117,18 +532,235 @@ class FlowCache:
         :rtype: Optional[CachingValue]
         """
         with self.__lock:
-            return self._index.get(key, None)
-
-    def set(self, key: str, value: CachingValue):
+            data = self._memory_cache.get(key)
+            if data is None and key in self._pending_writes:
+                data, _ = self._pending_writes[key]
+            if data is not None:
+                self._on_entry_hit(key)
+                return pickle.loads(data)
+
+            value, expire_time = self._disk_cache.get(key, default=None, expire_time=True)
+            if value is not None:
+                self._on_entry_hit(key)
+                if self._memory_cache.max_bytes > 0:
+                    self._memory_cache.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expire_time)
+            return value
+
+    def set(self, key: str, value: CachingValue, tag: Optional[str] = None):
         """Sets the cached value for the given key.
 
         :param key: The key
         :type key: str
         :param value: The cached value
         :type value: CachingValue
+        :param tag: The tag of the entry (the name of the flow class), used to enforce the per-flow-class quotas
+        :type tag: str, optional
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.__lock:
+            if self._memory_cache.max_bytes > 0:
+                expire_time = None if self.ttl is None else time.time() + self.ttl
+                self._memory_cache.set(key, data, expire_time)
+
+            if not self.write_behind:
+                self._write_to_disk(key, value, tag)
+                return
+
+            self._pending_writes[key] = (data, tag)
+            self._get_write_queue().put(key)
+
+    def start_flight(self, key: str) -> Tuple[Flight, bool]:
+        """Registers the computation of the value of the given key. If the value is already being computed, the flight
+        of that computation is returned instead.
+
+        :param key: The key
+        :type key: str
+        :return: The flight and whether the caller is responsible for the computation (and for landing the flight with `end_flight`)
+        :rtype: Tuple[Flight, bool]
         """
         with self.__lock:
-            self._index[key] = value
+            flight = self._flights.get(key, None)
+            if flight is not None:
+                return flight, False
+
+            flight = Flight()
+            self._flights[key] = flight
+            return flight, True
+
+    def end_flight(self, key: str):
+        """Lands the flight of the given key, the waiting callers then read the value from the cache.
+
+        :param key: The key
+        :type key: str
+        """
+        with self.__lock:
+            flight = self._flights.pop(key, None)
+        if flight is not None:
+            flight.land()
+
+    def _write_to_disk(self, key: str, value: CachingValue, tag: Optional[str]):
+        """Writes the value to the disk cache and evicts entries if the entry count limits are exceeded.
+
+        :param key: The key
+        :type key: str
+        :param value: The cached value
+        :type value: CachingValue
+        :param tag: The tag of the entry (the name of the flow class)
+        :type tag: str, optional
+        """
+        is_new_entry = key not in self._disk_cache
+        num_entries = len(self._disk_cache)
+        self._disk_cache.set(key, value, expire=self.ttl, tag=tag)
+
+        with self.__lock:
+            if len(self._disk_cache) < num_entries + is_new_entry:
+                # ~~~ diskcache culled entries to respect the size limit ~~~
+                self._on_entries_culled()
+
+            for eviction_order in self._get_eviction_orders(key):
+                eviction_order.on_stored(key)
+            self._enforce_entry_limits(tags=[tag] if tag is not None else [])
+
+    def _tracks_eviction_order(self) -> bool:
+        """Returns whether the eviction order of the entries is tracked (i.e. whether an entry count limit is enforced)."""
+        return self.eviction_policy != "none" and (
+            self.max_cached_entries is not None or len(self.flow_class_quotas) > 0
+        )
+
+    def _load_eviction_orders(self):
+        """Loads the eviction orders from the disk cache (diskcache iterates over the keys in the order in which they were first stored)."""
+        self._eviction_order = EvictionOrder(self.eviction_policy)
+        self._quota_eviction_orders = {tag: EvictionOrder(self.eviction_policy) for tag in self.flow_class_quotas}
+        for key in self._disk_cache:
+            for eviction_order in self._get_eviction_orders(key):
+                eviction_order.on_stored(key)
+
+    def _get_eviction_orders(self, key: str) -> List[EvictionOrder]:
+        """Returns the eviction orders tracking the given key: the one of the disk cache and, if the flow class of the key
+        has a quota, the one of the flow class. The eviction orders are loaded on first use.
+
+        :param key: The key
+        :type key: str
+        :return: The eviction orders
+        :rtype: List[EvictionOrder]
+        """
+        if not self._tracks_eviction_order():
+            return []
+        if self._eviction_order is None:
+            self._load_eviction_orders()
+
+        quota_eviction_order = self._quota_eviction_orders.get(key.split(":", 1)[0], None)
+        if quota_eviction_order is None:
+            return [self._eviction_order]
+        return [self._eviction_order, quota_eviction_order]
+
+    def _on_entry_hit(self, key: str):
+        """Registers a hit of the given key in the eviction orders."""
+        for eviction_order in self._get_eviction_orders(key):
+            eviction_order.on_hit(key)
+
+    def _on_entries_evicted(self, keys: List[str]):
+        """Removes the keys evicted from the disk cache from the in-memory tier and from the eviction orders.
+
+        :param keys: The evicted keys
+        :type keys: List[str]
+        """
+        for key in keys:
+            self._memory_cache.pop(key)
+            for eviction_order in self._get_eviction_orders(key):
+                eviction_order.remove(key)
+
+    def _on_entries_culled(self):
+        """Removes the entries that are no longer in the disk cache (i.e. culled or expired by diskcache) from the
+        in-memory tier. They are removed from the eviction orders when they are reached (or by `compact`)."""
+        for key in self._memory_cache.keys():
+            if key not in self._pending_writes and key not in self._disk_cache:
+                self._memory_cache.pop(key)
+
+    def _evict_next_entry(self, eviction_order: EvictionOrder):
+        """Evicts the next entry of the given eviction order from the disk cache.
+
+        :param eviction_order: The eviction order
+        :type eviction_order: EvictionOrder
+        """
+        key = eviction_order.next_key()
+        self._disk_cache.delete(key)
+        self._on_entries_evicted([key])
+
+    def _enforce_entry_limits(self, tags: List[str]):
+        """Evicts entries from the disk cache, following the eviction policy, until the global entry count limit and the
+        quotas of the given flow classes are respected.
+
+        :param tags: The flow classes whose quotas are enforced
+        :type tags: List[str]
+        """
+        if not self._tracks_eviction_order():
+            return
+        if self._eviction_order is None:
+            self._load_eviction_orders()
+
+        if self.max_cached_entries is not None:
+            while len(self._disk_cache) > self.max_cached_entries:
+                if len(self._eviction_order) == 0:
+                    # ~~~ The remaining entries were stored by another process sharing the cache directory ~~~
+                    self._load_eviction_orders()
+                    if len(self._eviction_order) == 0:
+                        break
+                self._evict_next_entry(self._eviction_order)
+
+        for tag in tags:
+            quota = self.flow_class_quotas.get(tag, None)
+            if quota is not None:
+                quota_eviction_order = self._quota_eviction_orders[tag]
+                while len(quota_eviction_order) > quota:
+                    self._evict_next_entry(quota_eviction_order)
+
+    def compact(self):
+        """Removes the expired entries from the disk cache and evicts entries until all the limits are respected."""
+        self._disk_cache.cull()
+        with self.__lock:
+            self._on_entries_culled()
+            if self._eviction_order is not None:
+                # ~~~ Stop tracking the culled entries ~~~
+                for key in self._eviction_order.keys():
+                    if key not in self._disk_cache:
+                        self._on_entries_evicted([key])
+            self._enforce_entry_limits(tags=list(self.flow_class_quotas.keys()))
+
+    def _get_write_queue(self) -> Queue:
+        """Returns the queue of the keys to write to the disk cache, starting the background writer on first use."""
+        if self._write_queue is None:
+            self._write_queue = Queue()
+            threading.Thread(target=self._write_pending, args=(self._write_queue,), daemon=True).start()
+        return self._write_queue
+
+    def _write_pending(self, write_queue: Queue):
+        """Background writer: writes the pending values to the disk cache.
+
+        :param write_queue: The queue of the keys to write
+        :type write_queue: Queue
+        """
+        while True:
+            key = write_queue.get()
+            try:
+                with self.__lock:
+                    pending_write = self._pending_writes.get(key, None)
+                if pending_write is not None:
+                    # ~~~ the value stays readable from the pending writes until it is on disk ~~~
+                    data, tag = pending_write
+                    self._write_to_disk(key, pickle.loads(data), tag)
+                    with self.__lock:
+                        if self._pending_writes.get(key, None) is pending_write:
+                            del self._pending_writes[key]
+            except Exception as e:
+                log.exception(e)
+            finally:
+                write_queue.task_done()
+
+    def flush(self):
+        """Blocks until all the pending writes are written to the disk cache."""
+        if self._write_queue is not None:
+            self._write_queue.join()
 
     def pop(self, key: str):
         """Pops the cached value for the given key.
@@ -137,16 +769,141 @@ class FlowCache:
         :type key: str
         """
         with self.__lock:
-            return self._index.pop(key)
+            self._memory_cache.pop(key)
+            pending_write = self._pending_writes.pop(key, None)
+            value = self._disk_cache.pop(key, None)
+            if value is not None:
+                self._on_entries_evicted([key])
+            if pending_write is not None:
+                return pickle.loads(pending_write[0])
+            return value
+
+    def clear_memory(self):
+        """Clears the in-memory tier and drops the pending writes."""
+        with self.__lock:
+            self._memory_cache.clear()
+            self._pending_writes.clear()
+
+    def clear(self):
+        """Clears the in-memory tier, drops the pending writes and clears the disk cache."""
+        with self.__lock:
+            self.clear_memory()
+            self._disk_cache.clear()
+            self._eviction_order = None
+            self._quota_eviction_orders = {}
 
     def __len__(self):
         """Returns the number of cached entries."""
         with self.__lock:
-            return len(self._index)
+            return len(self._disk_cache) + sum(1 for key in self._pending_writes if key not in self._disk_cache)
+
+
+class FlowCacheNamespace:
+    """A view of a FlowCache restricted to a namespace (the name of a flow class). The keys are prefixed with the namespace,
+    which is also the tag used to enforce the per-flow-class quotas.
+
+    :param flow_cache: The flow cache
+    :type flow_cache: FlowCache
+    :param namespace: The namespace
+    :type namespace: str
+    """
+
+    def __init__(self, flow_cache: FlowCache, namespace: str):
+        self.flow_cache = flow_cache
+        self.namespace = namespace
+
+    def _get_key(self, key: str) -> str:
+        """Returns the key of the flow cache corresponding to the given key of the namespace."""
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[CachingValue]:
+        """Returns the cached value for the given key.
+
+        :param key: The key
+        :type key: str
+        :return: The cached value
+        :rtype: Optional[CachingValue]
+        """
+        return self.flow_cache.get(self._get_key(key))
+
+    def set(self, key: str, value: CachingValue):
+        """Sets the cached value for the given key.
+
+        :param key: The key
+        :type key: str
+        :param value: The cached value
+        :type value: CachingValue
+        """
+        self.flow_cache.set(self._get_key(key), value, tag=self.namespace)
+
+    def pop(self, key: str):
+        """Pops the cached value for the given key.
+
+        :param key: The key
+        :type key: str
+        """
+        return self.flow_cache.pop(self._get_key(key))
+
+    def start_flight(self, key: str) -> Tuple[Flight, bool]:
+        """Registers the computation of the value of the given key (see `FlowCache.start_flight`).
+
+        :param key: The key
+        :type key: str
+        :return: The flight and whether the caller is responsible for the computation
+        :rtype: Tuple[Flight, bool]
+        """
+        return self.flow_cache.start_flight(self._get_key(key))
+
+    def end_flight(self, key: str):
+        """Lands the flight of the given key (see `FlowCache.end_flight`).
+
+        :param key: The key
+        :type key: str
+        """
+        self.flow_cache.end_flight(self._get_key(key))
+
+
+# ~~~ The FlowCache objects of the process, one per cache directory, opened on first use ~~~
+_flow_cache_registry: Dict[str, FlowCache] = {}
+_flow_cache_registry_lock = threading.Lock()
+
+
+def get_flow_cache(namespace: Optional[str] = None) -> Union[FlowCache, FlowCacheNamespace]:
+    """Returns the cache of the process for the current cache directory. The cache is opened on first use and shared by all the flows.
+
+    :param namespace: If provided, a view of the cache restricted to this namespace (i.e. flow class) is returned
+    :type namespace: str, optional
+    :return: The flow cache
+    :rtype: Union[FlowCache, FlowCacheNamespace]
+    """
+    cache_dir = get_cache_dir()
+    with _flow_cache_registry_lock:
+        flow_cache = _flow_cache_registry.get(cache_dir, None)
+        if flow_cache is None:
+            flow_cache = FlowCache(cache_dir)
+            _flow_cache_registry[cache_dir] = flow_cache
+
+    if namespace is None:
+        return flow_cache
+    return FlowCacheNamespace(flow_cache, namespace)
+
+
+@atexit.register
+def _flush_flow_caches():
+    """Writes the pending writes of all the FlowCache objects to the disk cache before exiting."""
+    for flow_cache in list(_flow_caches):
+        flow_cache.flush()
 
 
 def clear_cache():
     """Clears the cache."""
     cache_dir = get_cache_dir()
-    cache = Index(cache_dir)
-    cache.clear()
+    for flow_cache in list(_flow_caches):
+        if flow_cache.cache_dir == cache_dir:
+            flow_cache.clear()
+        else:
+            flow_cache.clear_memory()
+
+    # ~~~ The settings of the cache directory (e.g. its eviction policy) are kept ~~~
+    with Cache(cache_dir) as cache:
+        cache.clear()
@@ -1,2 +1,3 @@
 from .abstract import BaseLauncher, MultiThreadedAPILauncher
 from .flow_API_launcher import FlowLauncher
+from .async_flow_launcher import AsyncFlowLauncher
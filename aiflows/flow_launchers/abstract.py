@@ -1,12 +1,12 @@
 import os
 import time
 from queue import Queue
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, wait, FIRST_COMPLETED
 
 from abc import ABC
 
 from aiflows.utils import general_helpers
-from typing import Any, List, Dict, Optional, Iterable
+from typing import Any, List, Dict, Optional, Iterable, Iterator, Union
 
 from aiflows.utils import logging
 
@@ -93,16 +93,28 @@ class MultiThreadedAPILauncher(BaseLauncher, ABC):
     :type wait_time_per_key: int, optional
     :param single_threaded: A boolean indicating whether to run the multithreading or not.
     :type single_threaded: bool, optional
+    :param max_in_flight_samples: The maximum number of samples submitted to the workers at the same time. If set, the samples are pulled
+        from the dataloader lazily (streaming mode), which keeps the memory flat regardless of the size of the dataloader.
+        If None, the whole dataloader is submitted upfront.
+    :type max_in_flight_samples: int, optional
+    :param resume: A boolean indicating whether to skip the samples that already have a prediction in the output files of a previous run
+        (the predictions are indexed by sample id).
+    :type resume: bool, optional
+    :param retry_failed_samples: A boolean indicating whether to rerun, when resuming, the samples whose previous predictions failed.
+    :type retry_failed_samples: bool, optional
     """
 
     def __init__(self, **kwargs):
         self.n_workers = kwargs.get("n_workers", 1)
+        self.max_in_flight_samples = kwargs.get("max_in_flight_samples", None)
+        self.resume = kwargs.get("resume", False)
+        self.retry_failed_samples = kwargs.get("retry_failed_samples", False)
 
         self.debug = kwargs.get("debug", False)
         self.single_threaded = kwargs.get("single_threaded", False)
         self.output_dir = kwargs.get("output_dir", None)
         # you must specify how many api keys you're using otherwise it defaults to one (affects n_workers used during multithreading)
-        predictions_dir = general_helpers.get_predictions_dir_path(self.output_dir)
+        self.predictions_dir = general_helpers.get_predictions_dir_path(self.output_dir)
         if self.single_threaded:
             self.n_workers = 1
 
@@ -111,10 +123,97 @@ class MultiThreadedAPILauncher(BaseLauncher, ABC):
         for i in range(self.n_workers):
             _resource_IDs.put(i)
 
-            predictions_file = os.path.join(predictions_dir, "predictions_{}.jsonl".format(i))
+            predictions_file = os.path.join(self.predictions_dir, "predictions_{}.jsonl".format(i))
             self.paths_to_output_files.append(predictions_file)
         self._resource_IDs = _resource_IDs
-        self.existing_predictions_file = os.path.join(predictions_dir, "predictions_existing.jsonl")
+        self.existing_predictions_file = os.path.join(self.predictions_dir, "predictions_existing.jsonl")
+
+        if self.max_in_flight_samples is not None:
+            assert self.max_in_flight_samples > 0, "The maximum number of in-flight samples must be greater than 0."
+
+    @staticmethod
+    def _get_num_datapoints(dataloader: Iterable) -> Union[int, str]:
+        """Returns the number of datapoints in the dataloader, or "?" if the dataloader does not have a known length (e.g. a generator).
+
+        :param dataloader: An iterable of dictionaries containing the data for each sample to run inference on.
+        :type dataloader: Iterable
+        :return: The number of datapoints in the dataloader
+        :rtype: Union[int, str]
+        """
+        try:
+            return len(dataloader)
+        except TypeError:
+            return "?"
+
+    def _get_ids_to_skip(self) -> set:
+        """Indexes the predictions existing in the output directory and returns the ids of the samples that should not be rerun.
+        If `retry_failed_samples` is True, the samples whose predictions all failed are not skipped.
+
+        :return: The ids of the samples to skip
+        :rtype: set
+        """
+        outputs_status = general_helpers.read_outputs_status(self.predictions_dir)
+
+        ids_to_skip = {_id for _id, succeeded in outputs_status.items() if succeeded or not self.retry_failed_samples}
+        log.info(
+            "Resuming from {}: {} samples with existing predictions ({} failed, retry_failed_samples={}).".format(
+                self.predictions_dir,
+                len(outputs_status),
+                sum(1 for succeeded in outputs_status.values() if not succeeded),
+                self.retry_failed_samples,
+            )
+        )
+        return ids_to_skip
+
+    def _filter_completed_samples(self, dataloader: Iterable[dict]) -> Iterable[dict]:
+        """Lazily filters out the samples of the dataloader that were already predicted in a previous run (only if `resume` is True).
+
+        :param dataloader: An iterable of dictionaries containing the data for each sample to run inference on.
+        :type dataloader: Iterable[dict]
+        :return: An iterable over the samples to run inference on.
+        :rtype: Iterable[dict]
+        """
+        if not self.resume:
+            return dataloader
+
+        ids_to_skip = self._get_ids_to_skip()
+        if len(ids_to_skip) == 0:
+            return dataloader
+
+        return (sample for sample in dataloader if sample["id"] not in ids_to_skip)
+
+    def _iterate_completed_futures(self, executor: ThreadPoolExecutor, dataloader: Iterable[dict]) -> Iterator[Future]:
+        """Submits the samples of the dataloader to the executor and yields the futures as they complete.
+        In streaming mode (i.e. if `max_in_flight_samples` is set), the samples are pulled lazily from the dataloader
+        and at most `max_in_flight_samples` futures are pending at any time.
+
+        :param executor: The executor to submit the samples to.
+        :type executor: ThreadPoolExecutor
+        :param dataloader: An iterable of dictionaries containing the data for each sample to run inference on.
+        :type dataloader: Iterable[dict]
+        :return: An iterator over the completed futures
+        :rtype: Iterator[Future]
+        """
+        if self.max_in_flight_samples is None:
+            futures = [executor.submit(self.predict, batch=[sample]) for sample in dataloader]
+            yield from as_completed(futures)
+            return
+
+        samples = iter(dataloader)
+        in_flight = set()
+        dataloader_exhausted = False
+        while True:
+            while not dataloader_exhausted and len(in_flight) < self.max_in_flight_samples:
+                try:
+                    in_flight.add(executor.submit(self.predict, batch=[next(samples)]))
+                except StopIteration:
+                    dataloader_exhausted = True
+
+            if len(in_flight) == 0:
+                return
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            yield from done
 
     def predict_dataloader(self, dataloader: Iterable[dict], flows_with_interfaces: List[Dict[str, Any]]) -> None:
         """
@@ -126,7 +225,8 @@ class MultiThreadedAPILauncher(BaseLauncher, ABC):
         """
         self.flows = flows_with_interfaces
 
-        num_datapoints = len(dataloader)
+        dataloader = self._filter_completed_samples(dataloader)
+        num_datapoints = self._get_num_datapoints(dataloader)
         num_failures = 0
 
         if self.debug or self.single_threaded:
@@ -145,12 +245,7 @@ class MultiThreadedAPILauncher(BaseLauncher, ABC):
             c = 0
 
             with ThreadPoolExecutor(max_workers=self.n_workers) as executor:
-                futures = []
-
-                for sample in dataloader:
-                    futures.append(executor.submit(self.predict, batch=[sample]))
-
-                for future in as_completed(futures):
+                for future in self._iterate_completed_futures(executor, dataloader):
                     c = c + 1
                     log.info("~~~~~~~~~~~~ Progress: {}/{} batches finished ~~~~~~~~~~~~~".format(c, num_datapoints))
                     try:
@@ -162,4 +257,4 @@ class MultiThreadedAPILauncher(BaseLauncher, ABC):
                         os._exit(1)
 
         if num_failures > 0:
-            log.error("Number of failures: {} (out of {})".format(num_failures, num_datapoints))
+            log.error("Number of failures: {} (out of {})".format(num_failures, c))
@@ -0,0 +1,308 @@
+import os
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import Any, List, Dict, Optional, Iterable, Tuple, AsyncIterator
+
+from aiflows.base_flows import Flow
+from aiflows.flow_launchers.flow_API_launcher import FlowLauncher
+from aiflows.interfaces.abstract import Interface
+from aiflows.utils import logging
+
+log = logging.get_logger(__name__)
+
+
+class AsyncFlowLauncher(FlowLauncher):
+    """Flow Launcher that runs inference on a dataloader with an asyncio scheduler instead of a thread pool.
+    Every sample is executed as an asyncio task calling the flow with `acall`, so that the number of in-flight samples
+    is not bound to the number of OS threads. The output files are the same as the ones written by the `FlowLauncher`.
+
+    Each in-flight sample still requires its own flow instance (a flow holds the state of the run), the flows passed in
+    `flows_with_interfaces` are used as a pool which is grown lazily, up to `max_concurrency` flows, by cloning the first
+    flow (see `Flow.clone`). The flow at position `i` of the pool writes its outputs to the output file of the worker
+    `i % n_workers`. Flows without a native `arun` (e.g. the atomic flows) still run in a worker thread each
+    (see `Flow.arun`): the default executor of the loop is sized to `max_concurrency` threads.
+
+    :param max_concurrency: The maximum number of samples in flight at the same time. Defaults to `n_workers`.
+    :type max_concurrency: int, optional
+    :param ordered: Whether the results are streamed in the order of the dataloader (True) or as soon as they are completed (False)
+    :type ordered: bool, optional
+    :param \**kwargs: Additional keyword arguments to instantiate the `FlowLauncher` class.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, ordered: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.max_concurrency = self.n_workers if max_concurrency is None else max_concurrency
+        if self.debug or self.single_threaded:
+            self.max_concurrency = 1
+        self.ordered = ordered
+        assert self.max_concurrency > 0, "The maximum concurrency must be greater than 0."
+
+    @classmethod
+    async def apredict_sample(
+        cls,
+        flow: Flow,
+        sample: Dict,
+        input_interface: Interface = None,
+        output_interface: Interface = None,
+        fault_tolerant_mode: bool = False,
+        n_batch_retries: int = 1,
+        wait_time_between_retries: int = 1,
+    ) -> Tuple[Dict]:
+        """Asynchronous counterpart of `predict_sample`. It runs inference on a single sample with a given flow using `acall`.
+
+        :flow: The flow to run inference with.
+        :type flow: Flow
+        :sample: The sample to run inference on.
+        :type sample: Dict
+        :input_interface: The input interface of the flow. Default: None
+        :type input_interface: Optional[Interface]
+        :output_interface: The output interface of the flow. Default: None
+        :type output_interface: Optional[Interface]
+        :fault_tolerant_mode: whether to crash if an error occurs during the inference for a given sample. Default: False
+        :type fault_tolerant_mode: Optional[bool]
+        :n_batch_retries: the number of times to retry the batch if an error occurs (only used if `fault_tolerant_mode` is True). Default: 1
+        :type n_batch_retries: Optional[int]
+        :wait_time_between_retries: the number of seconds to wait before retrying the batch (only used if `fault_tolerant_mode` is True). Default: 1
+        :type wait_time_between_retries: Optional[int]
+        :return: A tuple containing the output message, the output data, and the error (if any).
+        :rtype: Tuple[Dict]
+        """
+        input_data_dict = cls._get_input_data(flow, sample, input_interface)
+
+        output_message, output_data, _error = None, None, None
+        for _attempt_idx in range(1, cls._get_n_attempts(fault_tolerant_mode, n_batch_retries) + 1):
+            try:
+                output_message = await flow.acall(cls._build_input_message(flow, input_data_dict))
+                output_data = cls._get_output_data(flow, output_message, output_interface)
+                return output_message, output_data, None
+            except Exception as e:
+                _error = cls._on_attempt_failed(e, sample, _attempt_idx, fault_tolerant_mode, wait_time_between_retries)
+                await asyncio.sleep(wait_time_between_retries)
+
+        return output_message, output_data, _error
+
+    @classmethod
+    async def apredict_batch(
+        cls,
+        flow: Flow,
+        batch: List[dict],
+        input_interface: Optional[Interface] = None,
+        output_interface: Optional[Interface] = None,
+        path_to_output_file: Optional[str] = None,
+        keys_to_write: Optional[List[str]] = None,
+        n_independent_samples: int = 1,
+        fault_tolerant_mode: bool = False,
+        n_batch_retries: int = 1,
+        wait_time_between_retries: int = 1,
+    ):
+        """Asynchronous counterpart of `predict_batch`. It runs inference on the given batch for a given flow.
+
+        :param flow: The flow to run inference with.
+        :type flow: Flow
+        :param batch: The batch to run inference for.
+        :type batch: List[dict]
+        :param input_interface: The input interface of the flow. Default: None
+        :type input_interface: Optional[Interface]
+        :param output_interface: The output interface of the flow. Default: None
+        :type output_interface: Optional[Interface]
+        :param path_to_output_file: A path to a file to write the outputs to. Default: None
+        :type path_to_output_file: Optional[str]
+        :param keys_to_write: A list of keys to write to file. Default: None
+        :type keys_to_write: Optional[List[str]]
+        :param n_independent_samples: the number of times to independently repeat the same inference for a given sample. Default: 1
+        :type n_independent_samples: Optional[int]
+        :return: The batch with the inference outputs added to it.
+        :rtype: List[dict]
+        """
+        inference_outputs = []
+        human_readable_outputs = []
+        for sample in batch:
+            for _sample_idx in range(n_independent_samples):
+                log.info("Running inference for ID (sample {}): {}".format(_sample_idx, sample["id"]))
+
+                output_message, output_data, _error = await cls.apredict_sample(
+                    flow=flow,
+                    sample=sample,
+                    input_interface=input_interface,
+                    output_interface=output_interface,
+                    fault_tolerant_mode=fault_tolerant_mode,
+                    n_batch_retries=n_batch_retries,
+                    wait_time_between_retries=wait_time_between_retries,
+                )
+
+                inference_outputs.append(output_message)
+
+                human_readable_outputs.append(output_data)
+
+                if _error is not None:
+                    # Break if one of the independent samples failed
+                    break
+                flow.reset(full_reset=True, recursive=True)  # Reset the flow to its initial state
+
+            cls._set_sample_outputs(sample, inference_outputs, human_readable_outputs, _error)
+
+        if path_to_output_file is not None:
+            cls.write_batch_output(batch, path_to_output_file=path_to_output_file, keys_to_write=keys_to_write)
+
+        return batch
+
+    async def apredict(self, batch: List[dict]) -> List[dict]:
+        """Asynchronous counterpart of `predict`. It checks out a flow from the pool, runs inference for the given batch with it,
+        and returns the flow to the pool.
+
+        :param batch: The batch to run inference for.
+        :type batch: List[dict]
+        :return: The batch with the inference outputs added to it.
+        :rtype: List[dict]
+        """
+        assert len(batch) == 1, "The Flow API model does not support batch sizes greater than 1."
+        _resource_id = await self._check_out_flow()
+        try:
+            flows_with_interfaces = self.flows[_resource_id]
+
+            batch = await self.apredict_batch(
+                flow=flows_with_interfaces["flow"],
+                input_interface=flows_with_interfaces["input_interface"],
+                output_interface=flows_with_interfaces["output_interface"],
+                batch=batch,
+                path_to_output_file=self.paths_to_output_files[_resource_id % len(self.paths_to_output_files)],
+                keys_to_write=["id", "inference_outputs", "human_readable_outputs", "error"],
+                n_independent_samples=self.n_independent_samples,
+                fault_tolerant_mode=self.fault_tolerant_mode,
+                n_batch_retries=self.n_batch_retries,
+                wait_time_between_retries=self.wait_time_between_retries,
+            )
+        finally:
+            self._async_resource_IDs.put_nowait(_resource_id)
+
+        return batch
+
+    def submit(self, sample: Dict) -> asyncio.Task:
+        """Schedules the inference for a single sample on the running event loop and returns its future.
+        It must be called after the flow pool has been set up (i.e. from within `apredict_dataloader`).
+
+        :param sample: The sample to run inference on.
+        :type sample: Dict
+        :return: The future holding the sample with the inference outputs added to it.
+        :rtype: asyncio.Task
+        """
+        return asyncio.ensure_future(self._apredict_single(sample))
+
+    async def _apredict_single(self, sample: Dict) -> Dict:
+        """Runs inference for a single sample and returns it with the inference outputs added to it."""
+        return (await self.apredict(batch=[sample]))[0]
+
+    def _set_up_flow_pool(self, flows_with_interfaces: List[Dict[str, Any]]):
+        """Sets up the pool of flows used by the in-flight samples. Must be called from within the event loop.
+
+        :param flows_with_interfaces: A list of dictionaries containing a flow instance, and an input and output interface.
+        :type flows_with_interfaces: List[Dict[str, Any]]
+        """
+        assert len(flows_with_interfaces) > 0, "At least one flow must be provided."
+        self.flows = list(flows_with_interfaces)
+        self._async_resource_IDs = asyncio.Queue()
+        for i in range(len(self.flows)):
+            self._async_resource_IDs.put_nowait(i)
+
+    async def _check_out_flow(self) -> int:
+        """Checks out a flow from the pool and returns its index. If all the flows are in use and the pool holds less than
+        `max_concurrency` flows, a new flow is cloned from the first one instead of waiting for a flow to be returned.
+
+        :return: The index of the checked out flow in the pool.
+        :rtype: int
+        """
+        if self._async_resource_IDs.empty() and len(self.flows) < self.max_concurrency:
+            # ~~~ The outputs of the new flow are written to the output file of the worker `_resource_id % n_workers`.
+            # The writes are synchronous and run on the event loop thread, so they never interleave in a file ~~~
+            self.flows.append({**self.flows[0], "flow": self.flows[0]["flow"].clone()})
+            return len(self.flows) - 1
+
+        return await self._async_resource_IDs.get()
+
+    async def apredict_dataloader(
+        self, dataloader: Iterable[dict], flows_with_interfaces: List[Dict[str, Any]], ordered: Optional[bool] = None
+    ) -> AsyncIterator[Dict]:
+        """Runs inference for the data provided in the dataloader and streams the completed samples.
+        The samples are pulled from the dataloader lazily, such that at most `max_concurrency` samples are in flight.
+        It writes the results to output files selected from the output_dir attributes.
+
+        :param dataloader: An iterable of dictionaries containing the data for each sample to run inference on.
+        :type dataloader: Iterable[dict]
+        :param flows_with_interfaces: A list of dictionaries containing a flow instance, and an input and output interface.
+        :type flows_with_interfaces: List[Dict[str, Any]]
+        :param ordered: Whether to stream the samples in the order of the dataloader. Defaults to the `ordered` attribute.
+        :type ordered: bool, optional
+        :return: An asynchronous iterator over the samples with the inference outputs added to them.
+        :rtype: AsyncIterator[Dict]
+        """
+        ordered = self.ordered if ordered is None else ordered
+        self._set_up_flow_pool(flows_with_interfaces)
+
+        samples = iter(dataloader)
+        in_flight = deque()
+        dataloader_exhausted = False
+
+        try:
+            while True:
+                # ~~~ Schedule new samples until the concurrency limit is reached ~~~
+                while not dataloader_exhausted and len(in_flight) < self.max_concurrency:
+                    try:
+                        in_flight.append(self.submit(next(samples)))
+                    except StopIteration:
+                        dataloader_exhausted = True
+
+                if len(in_flight) == 0:
+                    break
+
+                # ~~~ Stream the completed samples ~~~
+                if ordered:
+                    yield await in_flight.popleft()
+                else:
+                    done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        in_flight.remove(future)
+                        yield future.result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    async def _apredict_dataloader(self, dataloader: Iterable[dict], flows_with_interfaces: List[Dict[str, Any]]):
+        """Consumes `apredict_dataloader`, logs the progress and counts the failures."""
+        dataloader = self._filter_completed_samples(dataloader)
+        num_datapoints = self._get_num_datapoints(dataloader)
+
+        num_failures = 0
+        c = 0
+        async for sample in self.apredict_dataloader(dataloader, flows_with_interfaces):
+            c += 1
+            log.info("~~~~~~~~~~~~ Progress: {}/{} batches finished ~~~~~~~~~~~~~".format(c, num_datapoints))
+            if sample["error"] is not None:
+                num_failures += 1
+
+        if num_failures > 0:
+            log.error("Number of failures: {} (out of {})".format(num_failures, c))
+
+    async def _arun_dataloader(self, dataloader: Iterable[dict], flows_with_interfaces: List[Dict[str, Any]]):
+        """Runs `_apredict_dataloader` with a default executor large enough for `max_concurrency` samples in flight.
+        (The flows without a native `arun` are executed in the default executor of the loop, see `Flow.arun`)"""
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="AsyncFlowLauncher")
+        asyncio.get_running_loop().set_default_executor(executor)
+        await self._apredict_dataloader(dataloader, flows_with_interfaces)
+
+    def predict_dataloader(self, dataloader: Iterable[dict], flows_with_interfaces: List[Dict[str, Any]]) -> None:
+        """
+        Runs inference for the data provided in the dataloader on an asyncio event loop.
+        It writes the results to output files selected from the output_dir attributes.
+
+        :param dataloader: An iterable of dictionaries containing the data for each sample to run inference on.
+        :param flows_with_interfaces(List[Dict]): A list of dictionaries containing a flow instance, and an input and output interface.
+        """
+        log.info("Running in asynchronous mode with at most {} samples in flight.".format(self.max_concurrency))
+
+        try:
+            asyncio.run(self._arun_dataloader(dataloader, flows_with_interfaces))
+        except Exception as e:
+            log.exception("")  # logs the exception
+            os._exit(1)
@@ -49,7 +49,93 @@ class FlowLauncher(MultiThreadedAPILauncher):
         assert self.n_independent_samples > 0, "The number of independent samples must be greater than 0."
 
     @staticmethod
+    def clone_flow_with_interfaces(flow_with_interfaces: Dict[str, Any], n_clones: int) -> List[Dict[str, Any]]:
+        """Static method that builds the flows with interfaces of a worker pool from a single prototype. The flow is cloned
+        (see `Flow.clone`), such that each worker gets its own state and history, and the interfaces are shared.
+
+        :param flow_with_interfaces: A dictionary containing the prototype flow and the input and output interfaces to use.
+        :type flow_with_interfaces: Dict[str, Any]
+        :param n_clones: The number of flows with interfaces to build (e.g. the number of workers).
+        :type n_clones: int
+        :return: The list of flows with interfaces (the first one contains the prototype flow).
+        :rtype: List[Dict[str, Any]]
+        """
+        assert n_clones > 0, "The number of clones must be greater than 0."
+        prototype = flow_with_interfaces["flow"]
+
+        flows_with_interfaces = [flow_with_interfaces]
+        for _ in range(n_clones - 1):
+            flows_with_interfaces.append({**flow_with_interfaces, "flow": prototype.clone()})
+
+        return flows_with_interfaces
+
+    @staticmethod
+    def _get_input_data(flow: Flow, sample: Dict, input_interface: Optional[Interface] = None) -> Dict[str, Any]:
+        """Applies the input interface (if any) to a sample, returning the input data of the flow."""
+        if input_interface is None:
+            return sample
+
+        return input_interface(
+            goal="[Input] Run Flow from the Launcher.", data_dict=sample, src_flow=None, dst_flow=flow
+        )
+
+    @staticmethod
+    def _build_input_message(flow: Flow, input_data_dict: Dict[str, Any]) -> InputMessage:
+        """Builds the input message sent by the launcher to the flow. The data is copied, such that the flow cannot
+        modify the sample (the input interface shares the values of the sample with its output)."""
+        return InputMessage.build(data_dict=deepcopy(input_data_dict), src_flow="Launcher", dst_flow=flow.name)
+
+    @staticmethod
+    def _get_output_data(flow: Flow, output_message, output_interface: Optional[Interface] = None) -> Dict[str, Any]:
+        """Extracts (a copy of) the output data from the output message of the flow and applies the output interface (if any)."""
+        output_data = deepcopy(output_message.data["output_data"])
+
+        if output_interface is None:
+            return output_data
+
+        return output_interface(
+            goal="[Output] Run Flow from the Launcher.", data_dict=output_data, src_flow=flow, dst_flow=None
+        )
+
+    @staticmethod
+    def _get_n_attempts(fault_tolerant_mode: bool, n_batch_retries: int) -> int:
+        """Returns the number of attempts to run a sample (should be >1 only if fault_tolerant_mode is True)."""
+        return n_batch_retries if fault_tolerant_mode else 1
+
+    @staticmethod
+    def _on_attempt_failed(
+        error: Exception, sample: Dict, attempt_idx: int, fault_tolerant_mode: bool, wait_time_between_retries: int
+    ) -> str:
+        """Handles an error raised by an attempt to run a sample: it is raised if `fault_tolerant_mode` is False, otherwise
+        it is logged and returned (as a string) such that the caller can wait and retry.
+
+        :return: The error to record for the sample
+        :rtype: str
+        """
+        if not fault_tolerant_mode:
+            raise error
+
+        log.error(
+            f"[Problem `{sample['id']}`] "
+            f"Error {attempt_idx} in running the flow: {error}. "
+            f"Retrying in {wait_time_between_retries} seconds..."
+        )
+        return str(error)
+
+    @staticmethod
+    def _set_sample_outputs(
+        sample: Dict, inference_outputs: List, human_readable_outputs: List, error: Optional[str]
+    ) -> None:
+        """Adds the outputs of the inference (and its error, if any) to the sample."""
+        sample["inference_outputs"] = inference_outputs
+
+        sample["human_readable_outputs"] = human_readable_outputs
+
+        sample["error"] = error
+
+    @classmethod
     def predict_sample(
+        cls,
         flow: Flow,
         sample: Dict,
         input_interface: Interface = None,
@@ -58,7 +144,7 @@ class FlowLauncher(MultiThreadedAPILauncher):
         n_batch_retries: int = 1,
         wait_time_between_retries: int = 1,
     ) -> Tuple[Dict]:
-        """Static method that runs inference on a single sample with a given flow.
+        """Class method that runs inference on a single sample with a given flow.
 
         :flow: The flow to run inference with.
         :type flow: Flow
@@ -77,46 +163,17 @@ class FlowLauncher(MultiThreadedAPILauncher):
         :return: A tuple containing the output message, the output data, and the error (if any).
         :rtype: Tuple[Dict]
         """
+        input_data_dict = cls._get_input_data(flow, sample, input_interface)
 
-        if input_interface is not None:
-            input_data_dict = input_interface(
-                goal="[Input] Run Flow from the Launcher.", data_dict=sample, src_flow=None, dst_flow=flow
-            )
-        else:
-            input_data_dict = sample
-
-        _error = None
-
-        _attempt_idx = 1
-
-        # Should be >1 only if fault_tolerant_mode is True
-        n_batch_retries = 1 if not fault_tolerant_mode else n_batch_retries
-
-        while _attempt_idx <= n_batch_retries:
-            _error = None
+        output_message, output_data, _error = None, None, None
+        for _attempt_idx in range(1, cls._get_n_attempts(fault_tolerant_mode, n_batch_retries) + 1):
             try:
-                input_message = InputMessage.build(data_dict=input_data_dict, src_flow="Launcher", dst_flow=flow.name)
-
-                output_message = flow(input_message)
-                output_data = output_message.data["output_data"]
-
-                if output_interface is not None:
-                    output_data = output_interface(
-                        goal="[Output] Run Flow from the Launcher.", data_dict=output_data, src_flow=flow, dst_flow=None
-                    )
-                break
+                output_message = flow(cls._build_input_message(flow, input_data_dict))
+                output_data = cls._get_output_data(flow, output_message, output_interface)
+                return output_message, output_data, None
             except Exception as e:
-                if fault_tolerant_mode:
-                    log.error(
-                        f"[Problem `{sample['id']}`] "
-                        f"Error {_attempt_idx} in running the flow: {e}. "
-                        f"Retrying in {wait_time_between_retries} seconds..."
-                    )
-                    _attempt_idx += 1
-                    time.sleep(wait_time_between_retries)
-                    _error = str(e)
-                else:
-                    raise e
+                _error = cls._on_attempt_failed(e, sample, _attempt_idx, fault_tolerant_mode, wait_time_between_retries)
+                time.sleep(wait_time_between_retries)
 
         return output_message, output_data, _error
 
@@ -212,11 +269,7 @@ class FlowLauncher(MultiThreadedAPILauncher):
                     break
                 flow.reset(full_reset=True, recursive=True)  # Reset the flow to its initial state
 
-            sample["inference_outputs"] = inference_outputs
-
-            sample["human_readable_outputs"] = human_readable_outputs
-
-            sample["error"] = _error
+            cls._set_sample_outputs(sample, inference_outputs, human_readable_outputs, _error)
 
         if path_to_output_file is not None:
             cls.write_batch_output(batch, path_to_output_file=path_to_output_file, keys_to_write=keys_to_write)
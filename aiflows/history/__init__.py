@@ -1 +1 @@
-from .flow_history import FlowHistory
+from .flow_history import FlowHistory, HistorySnapshot
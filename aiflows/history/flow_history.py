@@ -1,18 +1,61 @@
+import os
+import json
+import pickle
+import warnings
 from copy import deepcopy
-from typing import List, Dict
-from aiflows.messages import Message
+from collections import deque
+from collections.abc import Sequence
+from itertools import islice
+from typing import List, Dict, Optional, Iterator, Deque, Any, Iterable
+from aiflows.messages import Message, OutputMessage
 
 
 class FlowHistory:
     """
     Represents a history of messages.
 
-    Attributes:
-        messages (List[Messages]): A list of the messages comprising the history of a flow.
+    The history can be bounded by a retention policy: when it holds more than `max_messages` messages, or when the
+    (pickled) size of its messages exceeds `max_bytes`, the oldest messages are evicted (ring buffer). The messages are
+    indexed by id, type and creator. If `spill_path` is provided, every message is also appended (in its `to_dict` format)
+    to this JSON lines file, such that the full trace survives the eviction of the messages from memory. The history
+    referenced by an output message is not embedded in the spill file, the message records its length instead (the
+    referenced messages are the previous lines of the file).
+
+    :param max_messages: The maximum number of messages kept in memory (None for no limit)
+    :type max_messages: int, optional
+    :param max_bytes: The maximum total size (in bytes) of the messages kept in memory (None for no limit)
+    :type max_bytes: int, optional
+    :param spill_path: The path of the file to which all the messages are appended (None to disable it)
+    :type spill_path: str, optional
     """
 
-    def __init__(self):
-        self.messages: List[Message] = []
+    def __init__(self, max_messages: Optional[int] = None, max_bytes: Optional[int] = None, spill_path: str = None):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+
+        self._messages: Deque[Message] = deque()
+        self._message_sizes: Deque[int] = deque()
+        self.num_bytes = 0
+        # ~~~ The number of messages evicted so far (the position of a message is its index in the full history) ~~~
+        self.num_evicted = 0
+
+        self._by_id: Dict[str, Message] = {}
+        self._positions_by_type: Dict[str, Deque[int]] = {}
+        self._positions_by_creator: Dict[str, Deque[int]] = {}
+
+        self._spill_file = None
+
+    @property
+    def messages(self) -> "HistoryMessages":
+        """The messages kept in memory (from the oldest to the most recent), as a list-like view (no copy is made).
+        Use `add_message` to add a message (`messages.append` is deprecated)."""
+        return HistoryMessages(self)
+
+    @property
+    def num_messages_added(self) -> int:
+        """The number of messages added to the history (including the evicted ones)."""
+        return self.num_evicted + len(self._messages)
 
     def add_message(self, message: Message) -> None:
         """
@@ -21,7 +64,88 @@ class FlowHistory:
         :param message: The message to add.
         :type message: Message
         """
-        self.messages.append(deepcopy(message))
+        message = deepcopy(message)
+        position = self.num_evicted + len(self._messages)
+
+        self._messages.append(message)
+        self._by_id[message.message_id] = message
+        self._positions_by_type.setdefault(message.message_type, deque()).append(position)
+        self._positions_by_creator.setdefault(message.created_by, deque()).append(position)
+
+        if self.max_bytes is not None:
+            size = len(pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL))
+            self._message_sizes.append(size)
+            self.num_bytes += size
+
+        if self.spill_path is not None:
+            self._spill(message)
+
+        self._enforce_retention_policy()
+
+    def _enforce_retention_policy(self):
+        """Evicts the oldest messages until the history respects its retention policy. The last message is always kept."""
+        while len(self._messages) > 1 and (
+            (self.max_messages is not None and len(self._messages) > self.max_messages)
+            or (self.max_bytes is not None and self.num_bytes > self.max_bytes)
+        ):
+            message = self._messages.popleft()
+            if self.max_bytes is not None:
+                self.num_bytes -= self._message_sizes.popleft()
+
+            if self._by_id.get(message.message_id, None) is message:
+                del self._by_id[message.message_id]
+            # ~~~ The evicted message is the oldest one, so its position is the first of its indexes ~~~
+            self._pop_oldest_position(self._positions_by_type, message.message_type)
+            self._pop_oldest_position(self._positions_by_creator, message.created_by)
+            self.num_evicted += 1
+
+    @staticmethod
+    def _pop_oldest_position(index: Dict[str, Deque[int]], key: str):
+        positions = index[key]
+        positions.popleft()
+        if len(positions) == 0:
+            del index[key]
+
+    def _spill(self, message: Message):
+        """Appends the message to the spill file.
+
+        :param message: The message to append.
+        :type message: Message
+        """
+        if self._spill_file is None:
+            spill_dir = os.path.dirname(self.spill_path)
+            if spill_dir:
+                os.makedirs(spill_dir, exist_ok=True)
+            self._spill_file = open(self.spill_path, "a", buffering=1)
+
+        if isinstance(message, OutputMessage):
+            message_dict = message.to_dict(include_history=False)
+        else:
+            message_dict = message.to_dict()
+        self._spill_file.write(json.dumps(message_dict, default=str) + "\n")
+
+    def close(self):
+        """Closes the spill file (it is reopened if other messages are added)."""
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def iter_spilled_messages(self) -> Iterator[Dict]:
+        """
+        Iterates over all the messages appended to the spill file (including the evicted ones), in their `to_dict` format.
+
+        :return: An iterator over the spilled messages.
+        :rtype: Iterator[Dict]
+        """
+        if self.spill_path is None or not os.path.exists(self.spill_path):
+            return
+
+        if self._spill_file is not None:
+            self._spill_file.flush()
+
+        with open(self.spill_path, "r") as f:
+            for line in f:
+                yield json.loads(line)
 
     def get_last_n_messages(self, n: int) -> List[Message]:
         """
@@ -32,7 +156,73 @@ class FlowHistory:
         :return: The list representation of the last n messages in the history.
         :rtype: List[Message]
         """
-        return [m for m in self.messages[-n:]]
+        if n <= 0:
+            return []
+        return list(islice(reversed(self._messages), n))[::-1]
+
+    def get_messages_in_range(self, start: int, stop: int) -> List[Message]:
+        """
+        Returns the messages (kept in memory) whose position in the history is in [start, stop).
+
+        :param start: The position of the first message.
+        :type start: int
+        :param stop: The position after the last message.
+        :type stop: int
+        :return: The messages in the range.
+        :rtype: List[Message]
+        """
+        start = max(start, self.num_evicted) - self.num_evicted
+        stop = min(stop, self.num_messages_added) - self.num_evicted
+        if stop <= start:
+            return []
+        return list(islice(self._messages, start, stop))
+
+    def snapshot(self) -> "HistorySnapshot":
+        """
+        Returns a lazy reference to the messages currently in the history.
+
+        :return: The snapshot of the history.
+        :rtype: HistorySnapshot
+        """
+        return HistorySnapshot(self, self.num_messages_added)
+
+    def get_message_by_id(self, message_id: str) -> Optional[Message]:
+        """
+        Returns the message with the given id, if it is kept in memory.
+
+        :param message_id: The id of the message.
+        :type message_id: str
+        :return: The message.
+        :rtype: Optional[Message]
+        """
+        return self._by_id.get(message_id, None)
+
+    def _get_messages_at(self, positions: Optional[Deque[int]]) -> List[Message]:
+        if positions is None:
+            return []
+        return [self._messages[position - self.num_evicted] for position in positions]
+
+    def get_messages_by_type(self, message_type: str) -> List[Message]:
+        """
+        Returns the messages (kept in memory) of the given type.
+
+        :param message_type: The type of the messages (the name of the message class, e.g. "OutputMessage").
+        :type message_type: str
+        :return: The messages of the given type.
+        :rtype: List[Message]
+        """
+        return self._get_messages_at(self._positions_by_type.get(message_type, None))
+
+    def get_messages_created_by(self, created_by: str) -> List[Message]:
+        """
+        Returns the messages (kept in memory) created by the given flow.
+
+        :param created_by: The name of the flow.
+        :type created_by: str
+        :return: The messages created by the given flow.
+        :rtype: List[Message]
+        """
+        return self._get_messages_at(self._positions_by_creator.get(created_by, None))
 
     def to_string(self) -> str:
         """
@@ -41,7 +231,7 @@ class FlowHistory:
         :return: The string representation of the history.
         :rtype: str
         """
-        text = "\n".join([message.to_string() for message in self.messages])
+        text = "\n".join([message.to_string() for message in self._messages])
         return text
 
     def to_list(self) -> List[Dict]:
@@ -51,10 +241,16 @@ class FlowHistory:
         :return: The list representation of the history.
         :rtype: List[Dict]
         """
-        return [m.to_dict() for m in self.messages]
+        return [m.to_dict() for m in self._messages]
 
     # def to_dict(self):
-    #     return {"history": [m.to_dict() for m in self.messages]}
+    #     return {"history": [m.to_dict() for m in self._messages]}
+
+    def __getstate__(self):
+        """The spill file is not copied (it is reopened on the next write)."""
+        state = self.__dict__.copy()
+        state["_spill_file"] = None
+        return state
 
     def __len__(self):
         """Returns the length of the message history.
@@ -62,7 +258,7 @@ class FlowHistory:
         :return: The length of the history.
         :rtype: int
         """
-        return len(self.messages)
+        return len(self._messages)
 
     def __str__(self):
         """Returns a string representation of the history.
@@ -73,4 +269,140 @@ class FlowHistory:
         return self.to_string()
 
     # def __repr__(self):
-    #     return repr(self.messages)
+    #     return repr(self._messages)
+
+
+class HistoryMessages(Sequence):
+    """
+    A list-like view of the messages kept in memory by a history (it reflects the later changes of the history).
+    The history used to expose its messages as a list: `append` and `extend` are kept for backward compatibility, they
+    are deprecated in favor of `FlowHistory.add_message`.
+
+    :param history: The history.
+    :type history: FlowHistory
+    """
+
+    def __init__(self, history: FlowHistory):
+        self.history = history
+
+    def __len__(self):
+        return len(self.history._messages)
+
+    def __getitem__(self, index: Any):
+        if isinstance(index, slice):
+            return list(self.history._messages)[index]
+        return self.history._messages[index]
+
+    def __iter__(self):
+        return iter(self.history._messages)
+
+    def __reversed__(self):
+        return reversed(self.history._messages)
+
+    def __eq__(self, other):
+        if isinstance(other, HistoryMessages):
+            other = list(other)
+        return list(self) == other
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __mul__(self, n: int):
+        return list(self) * n
+
+    def append(self, message: Message) -> None:
+        """Deprecated, use `FlowHistory.add_message` instead (the message is copied and indexed by the history).
+
+        :param message: The message to add.
+        :type message: Message
+        """
+        warnings.warn(
+            "`FlowHistory.messages.append` is deprecated, use `FlowHistory.add_message` instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        self.history.add_message(message)
+
+    def extend(self, messages: Iterable[Message]) -> None:
+        """Deprecated, use `FlowHistory.add_message` instead.
+
+        :param messages: The messages to add.
+        :type messages: Iterable[Message]
+        """
+        warnings.warn(
+            "`FlowHistory.messages.extend` is deprecated, use `FlowHistory.add_message` instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        for message in messages:
+            self.history.add_message(message)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class HistorySnapshot:
+    """
+    A lazy reference to the first messages of a history (the history is append-only, so they do not change).
+    It is materialized (as a list of the `to_dict` representations of the messages) only when it is read or serialized.
+    Copying it is O(1) and pickling it stores the materialized list.
+
+    :param history: The history.
+    :type history: FlowHistory
+    :param num_messages: The number of messages of the history referenced by the snapshot.
+    :type num_messages: int
+    """
+
+    def __init__(self, history: FlowHistory, num_messages: int):
+        self.history = history
+        self.num_messages = num_messages
+
+    def get_messages(self) -> List[Message]:
+        """
+        Returns the referenced messages (that are still kept in memory by the history).
+
+        :return: The messages.
+        :rtype: List[Message]
+        """
+        return self.history.get_messages_in_range(0, self.num_messages)
+
+    def to_list(self) -> List[Dict]:
+        """
+        Returns the list representation of the referenced messages.
+
+        :return: The list representation of the messages.
+        :rtype: List[Dict]
+        """
+        return [m.to_dict() for m in self.get_messages()]
+
+    def __len__(self):
+        return len(self.get_messages())
+
+    def __getitem__(self, index: Any):
+        if isinstance(index, slice):
+            return [m.to_dict() for m in self.get_messages()[index]]
+        return self.get_messages()[index].to_dict()
+
+    def __iter__(self):
+        for message in self.get_messages():
+            yield message.to_dict()
+
+    def __eq__(self, other):
+        if isinstance(other, HistorySnapshot):
+            other = other.to_list()
+        return self.to_list() == other
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (list, (self.to_list(),))
+
+    def __repr__(self):
+        return repr(self.to_list())
@@ -1,6 +1,9 @@
 from abc import ABC
+from collections.abc import Mapping
 from typing import Dict, Any
 
+from aiflows.data_transformations.abstract import Batch, rows_to_columns, columns_to_rows
+
 
 class Interface(ABC):
     """This class is the base class for all interfaces."""
@@ -22,3 +25,19 @@ class Interface(ABC):
         :raises NotImplementedError: This method must be implemented by a subclass.
         """
         raise NotImplementedError
+
+    def apply_batch(self, goal, src_flow, dst_flow, batch: Batch, **kwargs) -> Batch:
+        """
+        Applies the interface to a batch of data dictionaries, given as a list of rows or as columns (a dictionary of lists).
+        The result is returned in the same format. The default implementation applies the interface row by row.
+
+        :param goal: The goal of the operation.
+        :param src_flow: The source flow of the operation.
+        :param dst_flow: The destination flow of the operation.
+        :param batch: The batch of data dictionaries.
+        :param kwargs: Additional keyword arguments.
+        :return: The transformed batch.
+        """
+        rows = columns_to_rows(batch) if isinstance(batch, Mapping) else batch
+        rows = [self(goal=goal, src_flow=src_flow, dst_flow=dst_flow, data_dict=row, **kwargs) for row in rows]
+        return rows_to_columns(rows) if isinstance(batch, Mapping) else rows
@@ -1,14 +1,37 @@
-import copy
 from abc import ABC
-from typing import Dict, Any, List
+from collections.abc import Mapping
+from typing import Dict, Any, List, Optional, Set
 
 import hydra
 
-from aiflows.data_transformations import KeySelect, KeyRename, KeyCopy, KeySet, KeyDelete
+from aiflows.data_transformations import KeySelect, KeyRename, KeyCopy, KeySet, KeyDelete, KeyMatchInput
+from aiflows.data_transformations.abstract import Batch, rows_to_columns, columns_to_rows
+from aiflows.interfaces.key_interface_plan import KeyInterfacePlan
+
+
+# ~~~ The transformations whose bulk (columnar) implementation never modifies the values of the columns in place ~~~
+_COLUMNAR_TRANSFORMATIONS = (KeyRename, KeyCopy, KeySet, KeySelect, KeyDelete, KeyMatchInput)
+
+
+def _top_level_key(key: str, nested: bool) -> str:
+    """Returns the top-level key of a (nested) key, e.g. "a.b" -> "a"."""
+    return key.split(".")[0] if nested else key
+
+
+def _is_nested_key(key: str, nested: bool) -> bool:
+    """Returns whether a key designates a value nested in a top-level key (e.g. "a.b")."""
+    return nested and "." in key
 
 
 class KeyInterface(ABC):
     """This class is the base class for all key interfaces. It applies a list of transformations to a data dictionary.
+    The transformations are compiled into a single plan (see KeyInterfacePlan) on the first call, and recompiled if
+    the list of transformations changes.
+
+    The data dictionary is not copied: the given data dictionary is never modified, but the returned dictionary shares
+    the values (including the nested dictionaries and lists that are not written by the transformations) with it.
+    The callers handing the result to code that may mutate it are responsible for copying it (the flows and the launchers
+    deep-copy the data of the messages they build).
 
     :param keys_to_rename: A dictionary mapping old keys to new keys (used to instantiate the transformation defined in the KeyRename class)
     :type keys_to_rename: Dict[str, str], optional
@@ -66,6 +89,14 @@ class KeyInterface(ABC):
         if keys_to_delete:
             self.transformations.append(KeyDelete(keys_to_delete))
 
+        self._plan = None
+
+    def _get_plan(self) -> KeyInterfacePlan:
+        """Returns the plan compiled from the transformations (compiling it if the transformations have changed)."""
+        if self._plan is None or not self._plan.is_compiled_from(self.transformations):
+            self._plan = KeyInterfacePlan(self.transformations)
+        return self._plan
+
     def __call__(self, goal, src_flow, dst_flow, data_dict: Dict[str, Any], **kwargs) -> Dict[str, Any]:
         r"""Applies the all transformations to the given data dictionary.
 
@@ -78,17 +109,128 @@ class KeyInterface(ABC):
         :param data_dict: The data dictionary to apply the transformations to
         :type data_dict: Dict[str, Any]
         :param \**kwargs: Arbitrary keyword arguments (arguments that are passed to the transformations)
-        :return: The transformed data dictionary
+        :return: The transformed data dictionary (the given data dictionary is not modified, but its values are shared)
         :rtype: Dict[str, Any]
         """
-        data_dict = copy.deepcopy(data_dict)
         kwargs["goal"] = goal
         kwargs["src_flow"] = src_flow
         kwargs["dst_flow"] = dst_flow
-        # print(f"src_flow: {src_flow.name}, dst_flow: {dst_flow.name}")
-        for transformation in self.transformations:
-            # print(f"before transformation: {transformation}, data_dict: {data_dict}")
-            data_dict = transformation(data_dict=data_dict, **kwargs)
-            # print(f"after transformation: {transformation}, data_dict: {data_dict}")
+        return self._get_plan()(data_dict, **kwargs)
+
+    def apply_batch(self, goal, src_flow, dst_flow, batch: Batch, **kwargs) -> Batch:
+        r"""Applies all the transformations to a batch of data dictionaries, given as a list of rows or as columns
+        (a dictionary of lists). The batch is not modified and the result is returned in the same format.
+        Columns are transformed with the bulk implementations of the transformations when they are all built-in
+        key transformations, and row by row (with the compiled plan) otherwise.
+
+        :param goal: The goal of the flow
+        :type goal: str
+        :param src_flow: The source flow
+        :type src_flow: str
+        :param dst_flow: The destination flow
+        :type dst_flow: str
+        :param batch: The batch to apply the transformations to
+        :type batch: Union[List[Dict[str, Any]], Dict[str, List[Any]]]
+        :param \**kwargs: Arbitrary keyword arguments (arguments that are passed to the transformations)
+        :return: The transformed batch
+        :rtype: Union[List[Dict[str, Any]], Dict[str, List[Any]]]
+        """
+        kwargs["goal"] = goal
+        kwargs["src_flow"] = src_flow
+        kwargs["dst_flow"] = dst_flow
+
+        if not isinstance(batch, Mapping):
+            plan = self._get_plan()
+            return [plan(data_dict, **kwargs) for data_dict in batch]
+
+        if all(type(t) in _COLUMNAR_TRANSFORMATIONS for t in self.transformations):
+            columns = dict(batch)
+            for transformation in self.transformations:
+                columns = transformation.apply_batch(columns, **kwargs)
+            return columns
+
+        plan = self._get_plan()
+        return rows_to_columns([plan(data_dict, **kwargs) for data_dict in columns_to_rows(batch)])
+
+    def get_read_keys(self, dst_flow=None) -> Optional[Set[str]]:
+        """Returns the (top-level) keys of the data dictionary that the interface may read, i.e. the keys whose values may
+        end up in its output. The keys can only be inferred if the transformations are built-in key transformations and
+        restrict the output to some keys (with KeySelect or KeyMatchInput).
+
+        :param dst_flow: The destination flow (used to infer the keys read by KeyMatchInput)
+        :type dst_flow: Flow, optional
+        :return: The keys that may be read, or None if they cannot be inferred (i.e. any key may be read)
+        :rtype: Optional[Set[str]]
+        """
+        # ~~~ The keys of the input that the value of each (top-level) key may come from (by default, the key itself) ~~~
+        origins: Dict[str, Set[str]] = {}
+
+        def get_origins(key: str) -> Set[str]:
+            return origins.get(key, {key})
+
+        for t in self.transformations:
+            if type(t) is KeySelect:
+                return set().union(*[get_origins(_top_level_key(key, t.nested_keys)) for key in t.keys_to_select])
+            elif type(t) is KeyMatchInput:
+                if dst_flow is None:
+                    return None
+                return set().union(*[get_origins(key) for key in dst_flow.get_interface_description()["input"]])
+            elif type(t) in (KeyRename, KeyCopy):
+                nested = t.nested_keys if type(t) is KeyRename else t.flatten_data_dict
+                for old_key, new_key in t.old_key2new_key.items():
+                    old_top_key, new_top_key = _top_level_key(old_key, nested), _top_level_key(new_key, nested)
+                    # ~~~ a nested key only replaces a part of its top-level key ~~~
+                    new_origins = get_origins(old_top_key)
+                    if _is_nested_key(new_key, nested):
+                        new_origins = new_origins | get_origins(new_top_key)
+                    if type(t) is KeyRename and not _is_nested_key(old_key, nested):
+                        origins[old_top_key] = set()
+                    origins[new_top_key] = new_origins
+            elif type(t) is KeySet:
+                for key in t.key2value:
+                    if not _is_nested_key(key, t.flatten_data_dict):
+                        origins[key] = set()
+            elif type(t) is not KeyDelete:
+                return None
+
+        return None
+
+    def get_output_keys(self, input_keys: Optional[Set[str]], dst_flow=None) -> Optional[Set[str]]:
+        """Returns the (top-level) keys that the output of the interface may contain, given the keys of its input.
+
+        :param input_keys: The keys of the input data dictionary (None if they are unknown)
+        :type input_keys: Optional[Set[str]]
+        :param dst_flow: The destination flow (used to infer the keys selected by KeyMatchInput)
+        :type dst_flow: Flow, optional
+        :return: The keys that the output may contain, or None if they cannot be inferred
+        :rtype: Optional[Set[str]]
+        """
+        keys = None if input_keys is None else set(input_keys)
+
+        for t in self.transformations:
+            if type(t) is KeySelect:
+                keys = {_top_level_key(key, t.nested_keys) for key in t.keys_to_select}
+            elif type(t) is KeyMatchInput:
+                if dst_flow is None:
+                    return None
+                keys = set(dst_flow.get_interface_description()["input"])
+            elif type(t) in (KeyRename, KeyCopy, KeySet):
+                nested = t.nested_keys if type(t) is KeyRename else t.flatten_data_dict
+                if keys is None:
+                    continue
+                if type(t) is KeySet:
+                    keys.update(_top_level_key(key, nested) for key in t.key2value)
+                    continue
+                for old_key, new_key in t.old_key2new_key.items():
+                    keys.add(_top_level_key(new_key, nested))
+                    if type(t) is KeyRename and not _is_nested_key(old_key, nested):
+                        keys.discard(old_key)
+            elif type(t) is KeyDelete:
+                if keys is not None:
+                    keys.difference_update(
+                        key for key in t.keys_to_delete if not _is_nested_key(key, t.flatten_data_dict)
+                    )
+            else:
+                return None
 
-        return data_dict
+        return keys
@@ -0,0 +1,238 @@
+import copy
+from typing import Dict, Any, List, Tuple, Optional
+
+from aiflows.data_transformations import KeyRename, KeyCopy, KeySet, KeySelect, KeyDelete, KeyMatchInput
+from aiflows.utils.frozen import thaw
+
+_MISSING = object()
+
+
+def _split_key(key: str, nested: bool) -> Tuple[str, ...]:
+    """Returns the path of a (nested) key, e.g. "a.b" -> ("a", "b")."""
+    return tuple(key.split(".")) if nested else (key,)
+
+
+class _WorkingDict:
+    """The data dictionary being transformed by a plan. The dictionaries of the input are never modified: a dictionary
+    is (shallowly) copied the first time one of its keys is written (copy-on-write), the other values are shared.
+
+    :param data: The data dictionary
+    :type data: Dict[str, Any]
+    :param owned: Whether the (top-level) data dictionary belongs to the plan and can be modified in place
+    :type owned: bool
+    """
+
+    def __init__(self, data: Dict[str, Any], owned: bool = False):
+        self.data = data
+        # ~~~ The ids of the dictionaries created by the plan, which can be modified in place (None if they all can) ~~~
+        self._owned_ids = {id(data)} if owned else set()
+
+    def _own(self, d: Dict[str, Any]) -> Dict[str, Any]:
+        if self._owned_ids is None or id(d) in self._owned_ids:
+            return d
+        d = dict(d)
+        self._owned_ids.add(id(d))
+        return d
+
+    def get(self, path: Tuple[str, ...]) -> Any:
+        """Returns the value at the given path, or _MISSING if there is none."""
+        d = self.data
+        for key in path:
+            if not isinstance(d, dict) or key not in d:
+                return _MISSING
+            d = d[key]
+        return d
+
+    def _get_parent_for_write(self, path: Tuple[str, ...], create: bool) -> Optional[Dict[str, Any]]:
+        """Returns the (owned) dictionary containing the last key of the path, creating the missing dictionaries if `create`."""
+        self.data = parent = self._own(self.data)
+        for key in path[:-1]:
+            child = parent.get(key, _MISSING)
+            if child is _MISSING:
+                if not create:
+                    return None
+                child = {}
+                if self._owned_ids is not None:
+                    self._owned_ids.add(id(child))
+            elif isinstance(child, dict):
+                child = self._own(child)
+            else:
+                if not create:
+                    return None
+                raise TypeError(f"Cannot set the key {'.'.join(path)}: {key} is not a dictionary")
+            parent[key] = child
+            parent = child
+        return parent
+
+    def set(self, path: Tuple[str, ...], value: Any):
+        """Sets the value at the given path, creating the missing dictionaries."""
+        self._get_parent_for_write(path, create=True)[path[-1]] = value
+
+    def pop(self, path: Tuple[str, ...]) -> Any:
+        """Removes the value at the given path (if any) and returns it."""
+        if self.get(path) is _MISSING:
+            return _MISSING
+        return self._get_parent_for_write(path, create=False).pop(path[-1])
+
+
+class _RenameStep:
+    def __init__(self, transformation: KeyRename):
+        nested = transformation.nested_keys
+        self.renames = [
+            (_split_key(old_key, nested), _split_key(new_key, nested))
+            for old_key, new_key in transformation.old_key2new_key.items()
+            if old_key != new_key
+        ]
+
+    def __call__(self, working_dict: _WorkingDict, **kwargs):
+        for old_path, new_path in self.renames:
+            value = working_dict.get(old_path)
+            if value is not _MISSING:
+                working_dict.set(new_path, value)
+                working_dict.pop(old_path)
+
+
+class _CopyStep:
+    def __init__(self, transformation: KeyCopy):
+        nested = transformation.flatten_data_dict
+        self.copies = [
+            (_split_key(old_key, nested), _split_key(new_key, nested))
+            for old_key, new_key in transformation.old_key2new_key.items()
+        ]
+        # ~~~ With a flattened data dictionary, only the leaves (values that are not dictionaries) can be copied ~~~
+        self.leaves_only = nested
+
+    def __call__(self, working_dict: _WorkingDict, **kwargs):
+        for old_path, new_path in self.copies:
+            value = working_dict.get(old_path)
+            if value is _MISSING or (self.leaves_only and isinstance(value, dict)):
+                continue
+            working_dict.set(new_path, copy.deepcopy(value))
+
+
+class _SetStep:
+    def __init__(self, transformation: KeySet):
+        nested = transformation.flatten_data_dict
+        self.assignments = [(_split_key(key, nested), value) for key, value in transformation.key2value.items()]
+
+    def __call__(self, working_dict: _WorkingDict, **kwargs):
+        for path, value in self.assignments:
+            working_dict.set(path, value)
+
+
+class _SelectStep:
+    def __init__(self, transformation: KeySelect):
+        nested = transformation.nested_keys
+        self.selections = [(key, _split_key(key, nested)) for key in transformation.keys_to_select]
+
+    def __call__(self, working_dict: _WorkingDict, **kwargs):
+        selected = _WorkingDict({}, owned=True)
+        if working_dict._owned_ids is None:
+            selected._owned_ids = None
+        for key, path in self.selections:
+            value = working_dict.get(path)
+            if value is _MISSING:
+                raise KeyError(f"Key {key} not found in data_dict {working_dict.data}")
+            selected.set(path, value)
+
+        working_dict.data = selected.data
+        working_dict._owned_ids = selected._owned_ids
+
+
+class _DeleteStep:
+    def __init__(self, transformation: KeyDelete):
+        nested = transformation.flatten_data_dict
+        self.paths = [_split_key(key, nested) for key in transformation.keys_to_delete]
+        # ~~~ With a flattened data dictionary, only the leaves (values that are not dictionaries) can be deleted,
+        # and the dictionaries left empty by the deletion disappear ~~~
+        self.leaves_only = nested
+
+    def __call__(self, working_dict: _WorkingDict, **kwargs):
+        for path in self.paths:
+            value = working_dict.get(path)
+            if value is _MISSING or (self.leaves_only and isinstance(value, dict)):
+                continue
+            working_dict.pop(path)
+
+            if self.leaves_only:
+                parent_path = path[:-1]
+                while len(parent_path) > 0 and working_dict.get(parent_path) == {}:
+                    working_dict.pop(parent_path)
+                    parent_path = parent_path[:-1]
+
+
+class _MatchInputStep:
+    def __init__(self, transformation: KeyMatchInput):
+        pass
+
+    def __call__(self, working_dict: _WorkingDict, dst_flow=None, **kwargs):
+        input_keys = dst_flow.get_interface_description()["input"]
+        data = working_dict.data
+        working_dict.data = {key: data[key] for key in input_keys}
+        if working_dict._owned_ids is not None:
+            working_dict._owned_ids = {id(working_dict.data)}
+
+
+class _TransformationStep:
+    """A transformation that is not compiled: it is called on a mutable deep copy of the data dictionary
+    (as it may modify it in place)."""
+
+    def __init__(self, transformation):
+        self.transformation = transformation
+
+    def __call__(self, working_dict: _WorkingDict, **kwargs):
+        data = working_dict.data
+        if working_dict._owned_ids is not None:
+            data = thaw(data)
+        working_dict.data = self.transformation(data_dict=data, **kwargs)
+        # ~~~ The output of the transformation belongs to the plan ~~~
+        working_dict._owned_ids = None
+
+
+# ~~~ The compiled steps of the built-in transformations (subclasses are not compiled, they may override __call__) ~~~
+_COMPILED_STEPS = {
+    KeyRename: _RenameStep,
+    KeyCopy: _CopyStep,
+    KeySet: _SetStep,
+    KeySelect: _SelectStep,
+    KeyDelete: _DeleteStep,
+    KeyMatchInput: _MatchInputStep,
+}
+
+
+class KeyInterfacePlan:
+    """A list of transformations compiled into a single plan. The key paths of the built-in key transformations are split
+    once at compilation, and the plan only copies the dictionaries it modifies (copy-on-write) instead of deep-copying
+    the whole data dictionary. The other transformations are called on a deep copy of the data dictionary.
+
+    :param transformations: The transformations to compile
+    :type transformations: List
+    """
+
+    def __init__(self, transformations: List):
+        self.transformations = list(transformations)
+        self.steps = [_COMPILED_STEPS.get(type(t), _TransformationStep)(t) for t in self.transformations]
+
+    def is_compiled_from(self, transformations: List) -> bool:
+        """Returns whether the plan was compiled from the given transformations."""
+        return len(transformations) == len(self.transformations) and all(
+            t is compiled_t for t, compiled_t in zip(transformations, self.transformations)
+        )
+
+    def __call__(self, data_dict: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        r"""Applies the plan to the given data dictionary (which is not modified).
+
+        :param data_dict: The data dictionary to apply the plan to
+        :type data_dict: Dict[str, Any]
+        :param \**kwargs: Arbitrary keyword arguments (arguments that are passed to the transformations)
+        :return: The transformed data dictionary
+        :rtype: Dict[str, Any]
+        """
+        working_dict = _WorkingDict(data_dict)
+        for step in self.steps:
+            step(working_dict, **kwargs)
+
+        if working_dict.data is data_dict:
+            # ~~~ The result never shares its top-level dictionary with the input ~~~
+            return dict(data_dict)
+        return working_dict.data
@@ -1,18 +1,42 @@
+import os
 import copy
 import json
-from dataclasses import dataclass
+import time
+import uuid
+import random
 from typing import List, Any, Dict
 import colorama
 
-from aiflows.utils.general_helpers import create_unique_id, get_current_datetime_ns
-
 colorama.init()
 
 
-@dataclass
+# ~~~ Source of the random bits of the message ids (independent of the global seed, reseeded in forked processes) ~~~
+_random = random.Random()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_random.seed)
+
+
+def _format_message_id(id_int: int) -> str:
+    """Formats a 128-bit integer as a (version 4) UUID string."""
+    return str(uuid.UUID(int=id_int, version=4))
+
+
+def _format_created_at(created_at_ns: int) -> str:
+    """Formats a time in nanoseconds as returned by `get_current_datetime_ns`."""
+    formatted_created_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(created_at_ns // 1000000000))
+    return f"{formatted_created_at}.{created_at_ns % 1000000000:09d}"
+
+
+# ~~~ The names of the serialized attributes of each message class (in their serialization order) ~~~
+_field_names_per_class: Dict[type, List[str]] = {}
+
+
 class Message:
     """This class represents a message that is passed between nodes in a flow.
 
+    Messages are slotted: their id is stored as a 128-bit integer and their creation time as an integer number of
+    nanoseconds, both are only formatted when they are read (`message_id`, `created_at`).
+
     :param data: The data content of the message
     :type data: Dict[str, Any]
     :param created_by: The name of the flow that created the message
@@ -21,25 +45,26 @@ class Message:
     :type private_keys: List[str], optional
     """
 
-    # ~~~ Message unique identification ~~~
-    message_id: str
-    created_at: str
-
-    # ~~~ Contextual information about the message ~~~
-    created_by: str
-    message_type: str
-
-    # ~~~ Data content ~~~
-    data: Dict[str, Any]
-
-    # ~~~ Private keys that should not be serialized or logged ~~~
-    private_keys: List[str]
+    __slots__ = (
+        # ~~~ Message unique identification ~~~
+        "_id_int",
+        "_message_id",
+        "created_at_ns",
+        "_created_at",
+        # ~~~ Contextual information about the message ~~~
+        "message_type",
+        "created_by",
+        # ~~~ Data content ~~~
+        "data",
+        # ~~~ Private keys that should not be serialized or logged ~~~
+        "private_keys",
+        "__weakref__",
+    )
 
     def __init__(self, data: Dict[str, Any], created_by: str, private_keys: List[str] = None):
 
         # ~~~ Initialize message identifiers ~~~
-        self.message_id = create_unique_id()
-        self.created_at = get_current_datetime_ns()
+        self._reset_message_id()
 
         # ~~~ Initialize contextual information ~~~
         self.message_type = self.__class__.__name__
@@ -51,14 +76,86 @@ class Message:
         # ~~~ Initialize private keys ~~~
         self.private_keys = [] if private_keys is None else private_keys
 
+    @property
+    def message_id(self) -> str:
+        """The unique identifier of the message (a UUID string, formatted on first access)."""
+        if self._message_id is None:
+            self._message_id = _format_message_id(self._id_int)
+        return self._message_id
+
+    @message_id.setter
+    def message_id(self, message_id: str):
+        self._message_id = message_id
+
+    @property
+    def created_at(self) -> str:
+        """The creation time of the message (formatted as `get_current_datetime_ns` on first access)."""
+        if self._created_at is None:
+            self._created_at = _format_created_at(self.created_at_ns)
+        return self._created_at
+
+    @created_at.setter
+    def created_at(self, created_at: str):
+        self._created_at = created_at
+
     def _reset_message_id(self):
         """Resets the message's unique identification (message_id,created_at)"""
-        self.message_id = create_unique_id()
-        self.created_at = get_current_datetime_ns()
+        self._id_int = _random.getrandbits(128)
+        self._message_id = None
+        self.created_at_ns = time.time_ns()
+        self._created_at = None
+
+    @classmethod
+    def _get_field_names(cls) -> List[str]:
+        """Returns the names of the serialized attributes of the message class: the attributes of the Message class
+        followed by the public slots of the subclasses (in the order of the class hierarchy)."""
+        field_names = _field_names_per_class.get(cls, None)
+        if field_names is None:
+            field_names = ["message_id", "created_at", "message_type", "created_by", "data", "private_keys"]
+            for klass in reversed(cls.__mro__):
+                if klass is Message or not issubclass(klass, Message):
+                    continue
+                for name in klass.__dict__.get("__slots__", ()):
+                    if not name.startswith("_") and name not in field_names:
+                        field_names.append(name)
+            _field_names_per_class[cls] = field_names
+        return field_names
+
+    def _get_fields(self) -> Dict[str, Any]:
+        """Returns the serialized attributes of the message (including the attributes of subclasses that are not slotted)."""
+        fields = {}
+        for name in self._get_field_names():
+            try:
+                fields[name] = getattr(self, name)
+            except AttributeError:
+                continue
+        fields.update(getattr(self, "__dict__", {}))
+        return fields
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.message_id, self.created_at, self.created_by, self.message_type, self.data, self.private_keys) == (
+            other.message_id,
+            other.created_at,
+            other.created_by,
+            other.message_type,
+            other.data,
+            other.private_keys,
+        )
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__qualname__}(message_id={self.message_id!r}, created_at={self.created_at!r}, "
+            f"created_by={self.created_by!r}, message_type={self.message_type!r}, data={self.data!r}, "
+            f"private_keys={self.private_keys!r})"
+        )
 
     def __sanitized__dict__(self):
         """Removes any private_keys potentially present in the __dict__ object or the data dictionary"""
-        __sanitized__dict__ = copy.deepcopy(self.__dict__)
+        __sanitized__dict__ = copy.deepcopy(self._get_fields())
 
         for private_key in self.private_keys:
             if private_key in __sanitized__dict__:
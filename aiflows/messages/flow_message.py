@@ -1,4 +1,3 @@
-from dataclasses import dataclass
 from typing import List, Any, Dict, Optional
 import colorama
 
@@ -10,7 +9,6 @@ colorama.init()
 # ToDo: When logging the "\n" in the nested messages is not mapped to a new line which makes it hard to debug. Fix that.
 
 
-@dataclass
 class InputMessage(Message):
     """This class represents an input message that is passed from one flow to another.
 
@@ -26,6 +24,8 @@ class InputMessage(Message):
     :type private_keys: List[str], optional
     """
 
+    __slots__ = ("src_flow", "dst_flow")
+
     def __init__(
         self,
         data_dict: Dict[str, Any],
@@ -92,7 +92,6 @@ class InputMessage(Message):
         return input_message
 
 
-@dataclass
 class UpdateMessage_Generic(Message):
     r"""Updates the message of a flow.
 
@@ -101,6 +100,8 @@ class UpdateMessage_Generic(Message):
     :param \**kwargs: arguments that are passed to the Message constructor
     """
 
+    __slots__ = ("updated_flow",)
+
     def __init__(self, updated_flow: str, **kwargs):
         super().__init__(**kwargs)
         self.updated_flow = updated_flow
@@ -121,7 +122,6 @@ class UpdateMessage_Generic(Message):
         return message
 
 
-@dataclass
 class UpdateMessage_ChatMessage(UpdateMessage_Generic):
     r"""Updates the chat message of a flow.
 
@@ -134,6 +134,8 @@ class UpdateMessage_ChatMessage(UpdateMessage_Generic):
     :param \**kwargs: arguments that are passed to the UpdateMessage_Generic constructor
     """
 
+    __slots__ = ()
+
     def __init__(self, content: str, role: str, updated_flow: str, **kwargs):
         super().__init__(data={}, updated_flow=updated_flow, **kwargs)
         self.data["role"] = role
@@ -158,10 +160,11 @@ class UpdateMessage_ChatMessage(UpdateMessage_Generic):
         return message
 
 
-@dataclass
 class UpdateMessage_NamespaceReset(Message):
     """Resets the namespace of a flow's message."""
 
+    __slots__ = ("updated_flow",)
+
     def __init__(self, updated_flow: str, created_by: str, keys_deleted_from_namespace: List[str]):
         super().__init__(created_by=created_by, data={})
         self.updated_flow = updated_flow
@@ -183,7 +186,6 @@ class UpdateMessage_NamespaceReset(Message):
         return message
 
 
-@dataclass
 class UpdateMessage_FullReset(Message):
     """Resets the full message of a flow.
 
@@ -191,6 +193,8 @@ class UpdateMessage_FullReset(Message):
 
     """
 
+    __slots__ = ("updated_flow",)
+
     def __init__(self, updated_flow: str, created_by: str, keys_deleted_from_namespace: List[str]):
         super().__init__(created_by=created_by, data={})
         self.updated_flow = updated_flow
@@ -212,7 +216,6 @@ class UpdateMessage_FullReset(Message):
         return message
 
 
-@dataclass
 class OutputMessage(Message):
     r"""This class represents an output message that is passed from one flow to another.
 
@@ -226,13 +229,15 @@ class OutputMessage(Message):
     :type raw_response: Dict[str, Any]
     :param input_message_id: The unique identification of the input message
     :type input_message_id: str
-    :param history: The history of the flow
+    :param history: The history of the flow (the message holds a lazy reference to it, materialized when serialized)
     :type history: FlowHistory
     :param created_by: The name of the flow that created the message
     :type created_by: str
     :param \**kwargs: arguments that are passed to the Message constructor
     """
 
+    __slots__ = ("src_flow", "dst_flow", "input_message_id", "history")
+
     def __init__(
         self,
         src_flow: str,
@@ -257,7 +262,29 @@ class OutputMessage(Message):
         if raw_response is not None:
             self.data["raw_response"] = raw_response
         self.data["output_data"] = output_data
-        self.history = history.to_list()
+        self.history = history.snapshot()
+
+    def __sanitized__dict__(self, include_history: bool = True):
+        """Removes any private_keys potentially present in the __dict__ object or the data dictionary and materializes the history
+        (or replaces it by its length if `include_history` is False)"""
+        __sanitized__dict__ = super().__sanitized__dict__()
+        history = __sanitized__dict__.pop("history")
+        if not include_history:
+            __sanitized__dict__["history_length"] = len(history) if isinstance(history, list) else history.num_messages
+        elif isinstance(history, list):
+            __sanitized__dict__["history"] = history
+        else:
+            __sanitized__dict__["history"] = history.to_list()
+        return __sanitized__dict__
+
+    def to_dict(self, include_history: bool = True):
+        """Returns a dictionary representation of the message that can be serialized to JSON
+
+        :param include_history: Whether the history is included, otherwise it is replaced by the number of messages it
+            references (e.g. when the messages of the history are serialized separately). Default: True
+        :type include_history: bool, optional
+        """
+        return self.__sanitized__dict__(include_history=include_history)
 
     def to_string(self):
         """Returns a string representation of the message.
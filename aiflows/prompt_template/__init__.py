@@ -1 +1 @@
-from .jinja2_prompts import JinjaPrompt
+from .jinja2_prompts import JinjaPrompt, get_compiled_template
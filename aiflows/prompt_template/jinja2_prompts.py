@@ -1,10 +1,32 @@
-from jinja2 import Environment
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Any
+
+from jinja2 import Template
+from jinja2.sandbox import SandboxedEnvironment
+
+# ~~~ The environment shared by all the prompts of the process (templates are rendered in a sandbox) ~~~
+_environment = SandboxedEnvironment()
+
+
+@lru_cache(maxsize=1024)
+def get_compiled_template(template: str) -> Template:
+    """Returns the compiled version of a jinja template. The templates are compiled once per process (with the shared
+    sandboxed environment) and cached by their source.
+
+    :param template: The source of the jinja template
+    :type template: str
+    :return: The compiled template
+    :rtype: Template
+    """
+    return _environment.from_string(template)
 
 
 class JinjaPrompt:
     r"""This class can be used to generate prompts from jinja templates
 
+    The template is compiled once per process (see `get_compiled_template`) and rendered in a sandboxed environment shared
+    by all the prompts.
+
     :param \**kwargs:
         See below:
     :Keyword Arguments:
@@ -20,7 +42,12 @@ class JinjaPrompt:
         self.input_variables: set = set(kwargs.get("input_variables", []))
         self.partial_variables = kwargs.get("partial_variables", {})
         self.template: str = kwargs.get("template", "")
-        self.environment = Environment()
+        self.environment = _environment
+
+    @property
+    def compiled_template(self) -> Template:
+        """The compiled version of the current template (looked up in the process-wide cache, see `get_compiled_template`)."""
+        return get_compiled_template(self.template)
 
     def format(self, **kwargs):
         r"""format the template with the given input variables
@@ -29,9 +56,20 @@ class JinjaPrompt:
         :return: The rendered template
         :rtype: str
         """
-        template = self.environment.from_string(self.template)
-        merged_args = {**self.partial_variables, **kwargs}
-        return template.render(**merged_args)
+        # ~~~ The partial variables are overridden by the input variables ~~~
+        return self.compiled_template.render(self.partial_variables, **kwargs)
+
+    def format_batch(self, batch: List[Dict[str, Any]]) -> List[str]:
+        r"""format the template with each of the given sets of input variables
+
+        :param batch: The sets of input variables to render the template with
+        :type batch: List[Dict[str, Any]]
+        :return: The rendered templates (one per set of input variables)
+        :rtype: List[str]
+        """
+        render = self.compiled_template.render
+        partial_variables = self.partial_variables
+        return [render(partial_variables, **input_variables) for input_variables in batch]
 
     def partial(self, **kwargs):
         r"""Returns a new JinjaPrompt object, given some input variables (moves the given input variables from the input variables to the partial variables)
@@ -51,3 +89,13 @@ class JinjaPrompt:
         }
 
         return JinjaPrompt(**new_jinja_prompt_args)
+
+    def __getstate__(self):
+        """The shared environment is not copied (it is restored on unpickling)."""
+        state = self.__dict__.copy()
+        del state["environment"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.environment = _environment
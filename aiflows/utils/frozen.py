@@ -0,0 +1,107 @@
+import copy
+from typing import Any
+
+
+def _raise_frozen(self, *args, **kwargs):
+    raise TypeError(
+        f"'{type(self).__name__}' objects are frozen (the flow state is copy-on-write). "
+        f"Use `aiflows.utils.frozen.thaw` to get a mutable copy."
+    )
+
+
+class FrozenDict(dict):
+    """An immutable dictionary. Since it cannot be modified, copying it (with `copy.copy` or `copy.deepcopy`) returns
+    the dictionary itself, such that frozen values can be shared between the states of the flows and the messages in O(1).
+    """
+
+    __setitem__ = _raise_frozen
+    __delitem__ = _raise_frozen
+    __ior__ = _raise_frozen
+    clear = _raise_frozen
+    pop = _raise_frozen
+    popitem = _raise_frozen
+    setdefault = _raise_frozen
+    update = _raise_frozen
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+
+class FrozenList(list):
+    """An immutable list. Since it cannot be modified, copying it (with `copy.copy` or `copy.deepcopy`) returns
+    the list itself, such that frozen values can be shared between the states of the flows and the messages in O(1).
+    """
+
+    __setitem__ = _raise_frozen
+    __delitem__ = _raise_frozen
+    __iadd__ = _raise_frozen
+    __imul__ = _raise_frozen
+    append = _raise_frozen
+    extend = _raise_frozen
+    insert = _raise_frozen
+    remove = _raise_frozen
+    pop = _raise_frozen
+    clear = _raise_frozen
+    sort = _raise_frozen
+    reverse = _raise_frozen
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (type(self), (list(self),))
+
+
+_IMMUTABLE_TYPES = (str, bytes, int, float, complex, bool, type(None), frozenset, range)
+
+
+def freeze(value: Any) -> Any:
+    """Returns an immutable version of the given value. Dictionaries and lists are (recursively) converted to
+    FrozenDict and FrozenList, tuples and sets to tuples and frozensets of frozen values. Values that are already frozen are
+    returned as is, such that freezing them again is O(1). Other objects cannot be frozen and are deep-copied.
+
+    :param value: The value to freeze
+    :type value: Any
+    :return: The frozen value
+    :rtype: Any
+    """
+    if isinstance(value, (FrozenDict, FrozenList, _IMMUTABLE_TYPES)):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(item) for item in value)
+    if isinstance(value, tuple) and type(value) is tuple:
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+
+    return copy.deepcopy(value)
+
+
+def thaw(value: Any) -> Any:
+    """Returns a mutable (deep) copy of the given value, converting FrozenDict and FrozenList back to dict and list.
+
+    :param value: The value to thaw
+    :type value: Any
+    :return: The mutable copy
+    :rtype: Any
+    """
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return value
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [thaw(item) for item in value]
+    if isinstance(value, tuple) and type(value) is tuple:
+        return tuple(thaw(item) for item in value)
+    return copy.deepcopy(value)
@@ -350,12 +350,49 @@ def read_outputs(outputs_dir):
                 # due to potentially non-even splits across processes, inference with ddp might result in duplicates
                 # (i.e., the same datapoint might have been seen multiple times)
                 # however we will always consider only one prediction (the last one)
+                # a failed prediction never overrides a successful one (e.g., retried after resuming a run)
+                previous_element = items_dict.get(element["id"], None)
+                if previous_element is not None and previous_element.get("error", None) is None:
+                    if element.get("error", None) is not None:
+                        continue
                 items_dict[element["id"]] = element
 
     items = [items_dict[_id] for _id in sorted(items_dict.keys())]
     return items
 
 
+def read_outputs_status(outputs_dir):
+    """Reads the ids of the samples in the jsonlines output files and whether their prediction succeeded.
+    A sample is considered successful if at least one of its predictions has no error.
+
+    :param outputs_dir: The directory containing the output files
+    :type outputs_dir: str
+    :return: A dictionary mapping the id of each sample to whether its prediction succeeded
+    :rtype: Dict[Any, bool]
+    """
+    status = dict()
+
+    if not os.path.isdir(outputs_dir):
+        return status
+
+    for filename in os.listdir(outputs_dir):
+        if not filename.endswith(".jsonl"):
+            continue
+
+        input_file_path = os.path.join(outputs_dir, filename)
+        with open(input_file_path, "r") as fp:
+            for idx, line in enumerate(fp):
+                try:
+                    element = json.loads(line)
+                except json.decoder.JSONDecodeError:
+                    # e.g. the last line of a file written by a run that crashed
+                    log.error(f"Failed to decode line {idx} in file {input_file_path}")
+                    continue
+                status[element["id"]] = status.get(element["id"], False) or element.get("error", None) is None
+
+    return status
+
+
 def recursive_dictionary_update(d, u):
     """Performs a recursive update of the values in dictionary d with the values of dictionary u
 
@@ -409,6 +446,18 @@ def try_except_decorator(f):
     return wrapper
 
 
+def async_try_except_decorator(f):
+    """The coroutine counterpart of `try_except_decorator`. It wraps the passed in coroutine function in order to handle exceptions and log a message suggesting to get help or provide feedback on github."""
+
+    async def wrapper(*args, **kw):
+        try:
+            return await f(*args, **kw)
+        except Exception as e:
+            exception_handler(e)
+
+    return wrapper
+
+
 def read_yaml_file(path_to_file, resolve=True):
     """Reads a yaml file.
 
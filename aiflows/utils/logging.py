@@ -32,7 +32,7 @@ from logging import (
     WARN,  # NOQA
     WARNING,  # NOQA
 )
-from typing import Optional
+from typing import Any, Callable, Optional, Tuple
 
 _lock = threading.Lock()
 _default_handler: Optional[logging.Handler] = None
@@ -239,6 +239,57 @@ def remove_handler(handler: logging.Handler) -> None:
     _get_library_root_logger().removeHandler(handler)
 
 
+class LazyString:
+    """A string that is only rendered (by calling `render_fn`) when it is formatted, e.g. `log.debug("%s", LazyString(fn))`
+    only calls `fn` if the debug level is enabled and the record is emitted.
+
+    :param render_fn: The function rendering the string
+    :type render_fn: Callable[[], str]
+    """
+
+    __slots__ = ("render_fn",)
+
+    def __init__(self, render_fn: Callable[[], str]):
+        self.render_fn = render_fn
+
+    def __str__(self):
+        return self.render_fn()
+
+
+# ~~~ The structured trace sinks, called with every message logged to the history of a flow ~~~
+_trace_sinks: Tuple[Callable[[Any, Any], None], ...] = ()
+
+
+def add_trace_sink(sink: Callable[[Any, Any], None]) -> None:
+    """Adds a trace sink. A trace sink is called with the flow and the message (the objects, without any string formatting)
+    every time a message is logged to the history of a flow.
+
+    :param sink: The trace sink, called as `sink(flow, message)`
+    :type sink: Callable[[Flow, Message], None]
+    """
+    global _trace_sinks
+
+    with _lock:
+        _trace_sinks = _trace_sinks + (sink,)
+
+
+def remove_trace_sink(sink: Callable[[Any, Any], None]) -> None:
+    """Removes a trace sink.
+
+    :param sink: The trace sink
+    :type sink: Callable[[Flow, Message], None]
+    """
+    global _trace_sinks
+
+    with _lock:
+        _trace_sinks = tuple(s for s in _trace_sinks if s is not sink)
+
+
+def get_trace_sinks() -> Tuple[Callable[[Any, Any], None], ...]:
+    """Returns the trace sinks."""
+    return _trace_sinks
+
+
 def disable_propagation() -> None:
     """
     Disable propagation of the library log outputs. Note that log propagation is disabled by default.
@@ -59,22 +59,21 @@ if __name__ == "__main__":
     else:
         n_workers = launcher_config["n_workers"]
 
-    flow_instances = []
-    for _ in range(n_workers):
-        flow_with_interfaces = {
-            "flow": hydra.utils.instantiate(cfg["flow"], _recursive_=False, _convert_="partial"),
-            "input_interface": (
-                None
-                if getattr(cfg, "input_interface", None) is None
-                else hydra.utils.instantiate(cfg["input_interface"], _recursive_=False)
-            ),
-            "output_interface": (
-                None
-                if getattr(cfg, "output_interface", None) is None
-                else hydra.utils.instantiate(cfg["output_interface"], _recursive_=False)
-            ),
-        }
-        flow_instances.append(flow_with_interfaces)
+    # ~~~ The flow is instantiated once, and cloned for each worker ~~~
+    flow_with_interfaces = {
+        "flow": hydra.utils.instantiate(cfg["flow"], _recursive_=False, _convert_="partial"),
+        "input_interface": (
+            None
+            if getattr(cfg, "input_interface", None) is None
+            else hydra.utils.instantiate(cfg["input_interface"], _recursive_=False)
+        ),
+        "output_interface": (
+            None
+            if getattr(cfg, "output_interface", None) is None
+            else hydra.utils.instantiate(cfg["output_interface"], _recursive_=False)
+        ),
+    }
+    flow_instances = FlowLauncher.clone_flow_with_interfaces(flow_with_interfaces, n_clones=n_workers)
 
     # ~~~ Get the data ~~~
     data = [
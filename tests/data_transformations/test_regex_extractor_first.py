@@ -0,0 +1,30 @@
+from aiflows.data_transformations import RegexFirstOccurrenceExtractor
+
+
+def test_fallback_when_the_match_group_did_not_participate():
+    extractor = RegexFirstOccurrenceExtractor(
+        regex=r"Answer:\s*(\d+)?",
+        regex_fallback=r"(\d+)",
+        match_group=1,
+        output_key="answer",
+        input_key="text",
+        assert_unique=True,
+        strip=True,
+    )
+
+    data_dict = extractor({"text": "Answer: unknown, maybe 42"})
+    assert data_dict["answer"] == "42"
+
+
+def test_no_match_group_and_no_fallback():
+    extractor = RegexFirstOccurrenceExtractor(
+        regex=r"Answer:\s*(\d+)?",
+        match_group=1,
+        output_key="answer",
+        input_key="text",
+        assert_unique=True,
+        strip=True,
+    )
+
+    data_dict = extractor({"text": "Answer: unknown, maybe 42"})
+    assert data_dict["answer"] is None